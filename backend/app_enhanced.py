@@ -7,6 +7,7 @@ import base64
 import requests
 from datetime import datetime, timedelta
 import sqlite3
+import threading
 import pandas as pd
 import numpy as np
 
@@ -14,7 +15,9 @@ import numpy as np
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from backend.data_manager import DataManager
+from backend.sync_job_manager import SyncJobManager
 from backend.kline_processor_enhanced import KLineProcessorEnhanced
+from backend.rate_limiter import SourceRateLimiter
 from backend.trade_simulator_enhanced import TradeSimulatorEnhanced
 from backend.user_manager_enhanced import UserManagerEnhanced
 
@@ -40,9 +43,12 @@ data_dir_path = os.path.join(project_root, 'data')
 
 # 初始化管理器
 data_manager = DataManager(data_dir=data_dir_path)
+sync_job_manager = SyncJobManager(data_manager, os.path.join(data_dir_path, 'sync_jobs.db'))
 # user_manager = UserManager()
 user_manager = UserManagerEnhanced(users_dir=users_dir_path)
 active_trainings = {}  # 存储活跃的训练会话
+BAR_HISTORY_FLUSH_INTERVAL = 100  # 资金曲线每累积这么多根K线批量写入一次 bar_history
+TRADE_FLUSH_TIMEOUT = 5.0  # 结束训练时等待交易记录落盘的最长秒数，超时不阻塞请求
 
 @app.route('/')
 def index():
@@ -178,6 +184,7 @@ def _update_api_info(user=None, enable=None):
         "endpoints": {
             "start_training": "POST /api/training/start",
             "next_bar": "POST /api/training/{training_id}/next",
+            "tick": "POST /api/training/{training_id}/tick",
             "execute_trade": "POST /api/training/{training_id}/trade",
             "adjustment": "POST /api/training/{training_id}/adjustment",
             "get_data": "GET /api/training/{training_id}/data",
@@ -234,6 +241,9 @@ def analyze_report_with_ai(report):
 - 最终资金: {report.get('final_capital')}
 - 总收益率: {report.get('total_return')}%
 - 最大回撤: {report.get('max_drawdown', 0)}%
+- 夏普比率: {report.get('sharpe_ratio', 0):.2f}
+- 持仓时间占比: {report.get('exposure_time', 0):.1f}%
+- 平均持仓K线数: {report.get('avg_holding_period', 0):.1f}
 - 总交易次数: {report.get('total_trades')}
 - 交易胜率: {report.get('trade_win_rate')}%
 
@@ -324,19 +334,28 @@ def start_training():
             if not stock_code or not start_date:
                 return jsonify({'error': '股票代码和起始日期不能为空'}), 400
         
+        # 一次加载K线、复权因子与日期范围，校验和处理器共用
+        bundle = data_manager.load_bundle(stock_code, source=data_source, interval=period)
+        
         # 验证股票代码和日期
         validation_error = data_manager.get_training_validation_error(
             stock_code,
             start_date,
             source=data_source,
             interval=period,
+            bundle=bundle,
         )
         if validation_error:
             return jsonify({'error': validation_error}), 400
         
         # 创建增强版K线处理器和交易模拟器
-        kline_processor = KLineProcessorEnhanced(data_manager, stock_code, start_date, source=data_source, interval=period)
-        trade_simulator = TradeSimulatorEnhanced(user, initial_capital, stock_code)
+        kline_processor = KLineProcessorEnhanced(
+            data_manager, stock_code, start_date, source=data_source, interval=period, bundle=bundle
+        )
+        trade_simulator = TradeSimulatorEnhanced(user, initial_capital, stock_code, session_id=training_id)
+        trade_simulator.set_trading_calendar(kline_processor.full_data['date'])
+        trade_simulator.equity_curve.reserve(len(kline_processor.full_data))
+        _record_current_bar(kline_processor, trade_simulator)  # 资金曲线从第一根可见K线开始
         
         # 获取用户设置并应用到交易模拟器
         user_config = user_manager.get_user_config(user)
@@ -358,6 +377,8 @@ def start_training():
             'mode': mode,
             'data_source': data_source,
             'period': period,
+            'data_version': 1,  # 会话数据版本号，每次K线/复权/交易变化时递增
+            'base_version': 1,  # 最近一次需要整体重载（复权、重置）时的版本号
             'created_at': datetime.now()
         }
         
@@ -378,7 +399,12 @@ def start_training():
 
 @app.route('/api/training/<training_id>/data', methods=['GET'])
 def get_training_data(training_id):
-    """获取训练数据"""
+    """获取训练数据
+
+    可选参数 since_bar_id 与 version：客户端已持有 version 版本的数据时，
+    只返回 since_bar_id 之后的K线；版本未变化时返回 304。version 同时包含视图周期与均线参数，
+    切换周期或均线后旧版本号不再匹配，会返回全量数据。
+    """
     try:
         if training_id not in active_trainings:
             return jsonify({'error': '训练会话不存在'}), 404
@@ -386,19 +412,34 @@ def get_training_data(training_id):
         training = active_trainings[training_id]
         kline_processor = training['kline_processor']
         view_period = request.args.get('view_period', 'daily')
-        
-        # 获取当前可见的K线数据
-        kline_data = kline_processor.get_visible_data(view_period=view_period)
-        volume_data = kline_processor.get_volume_data(view_period=view_period)
-        
+        data_version = training.get('data_version', 1)
+
         # 获取均线周期参数
         ma_periods_str = request.args.get('ma_periods', '5,10,20')
         try:
             ma_periods = [int(p) for p in ma_periods_str.split(',') if p.strip()]
         except ValueError:
             ma_periods = [5, 10, 20]
-            
-        ma_data = kline_processor.get_ma_data(ma_periods, view_period=view_period)
+
+        version_key = _data_version_key(data_version, view_period, ma_periods)
+        client_key = request.args.get('version')
+        if client_key is not None and client_key == version_key:
+            return '', 304
+
+        # 客户端版本早于最近一次整体失效，或持有的是其他视图/均线参数下的数据时，增量无意义，退回全量
+        since_bar_id = request.args.get('since_bar_id', type=int)
+        client_version = _parse_data_version_key(client_key, view_period, ma_periods)
+        if client_version is None or client_version < training.get('base_version', 1) or client_version > data_version:
+            since_bar_id = None
+        elif since_bar_id is not None and view_period != 'daily':
+            # 聚合视图下客户端持有的最后一根K线可能仍在更新，需一并重发
+            since_bar_id -= 1
+        
+        # 获取当前可见的K线数据
+        kline_data = kline_processor.get_visible_data(view_period=view_period, since_bar_id=since_bar_id)
+        volume_data = kline_processor.get_volume_data(view_period=view_period, since_bar_id=since_bar_id)
+        
+        ma_data = kline_processor.get_ma_data(ma_periods, view_period=view_period, since_bar_id=since_bar_id)
         
         # 获取股票名称
         stock_name = data_manager.get_stock_name(training['stock_code'])
@@ -415,11 +456,118 @@ def get_training_data(training_id):
             'trade_markers': kline_processor.get_trade_markers() if view_period == 'daily' else [],
             'period': training.get('period', 'daily'),
             'view_period': view_period,
-            'data_source': training.get('data_source', 'akshare')
+            'data_source': training.get('data_source', 'akshare'),
+            'factor': kline_processor.get_current_factor(),
+            'version': version_key,
+            'delta': since_bar_id is not None,
+            'since_bar_id': since_bar_id
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _data_version_key(data_version, view_period, ma_periods):
+    """返回给客户端的版本号：会话数据版本 + 视图周期 + 均线参数，任一变化都视为不同版本"""
+    return f"{data_version}.{view_period}.{'-'.join(str(p) for p in ma_periods)}"
+
+def _parse_data_version_key(version_key, view_period, ma_periods):
+    """取出版本号中的会话数据版本；视图周期或均线参数与本次请求不一致（或格式无效）时返回 None"""
+    if not version_key:
+        return None
+    number = version_key.partition('.')[0]
+    if not number.isdigit() or version_key != _data_version_key(int(number), view_period, ma_periods):
+        return None
+    return int(number)
+
+def _bump_data_version(training, full_reload=False):
+    """递增会话数据版本号；full_reload 表示已下发的历史数据全部失效"""
+    training['data_version'] = training.get('data_version', 1) + 1
+    if full_reload:
+        training['base_version'] = training['data_version']
+    return training['data_version']
+
+def _flush_bar_history(training):
+    """把资金曲线中尚未落库的K线状态一次性写入 bar_history，写入失败的行留到下次"""
+    trade_simulator = training['trade_simulator']
+    rows = trade_simulator.equity_curve.pending_rows()
+    if user_manager.record_bar_states(training['user'], trade_simulator.session_id, rows):
+        trade_simulator.equity_curve.mark_flushed(len(rows))
+
+def _record_current_bar(kline_processor, trade_simulator):
+    """用当前K线更新交易模拟器的价格和bar ID，并把账户状态写入（或覆盖）资金曲线的当前K线"""
+    current_bar = kline_processor.get_current_bar()
+    current_date = kline_processor.get_current_date()
+    trade_simulator.update_current_price(current_bar['close'], current_bar['bar_id'], current_date)
+    trade_simulator.record_bar(current_bar, current_date)
+    return current_bar
+
+def _finish_training_session(training_id, training):
+    """训练走到最后一根K线时生成报告并保存训练记录"""
+    trade_simulator = training['trade_simulator']
+    kline_processor = training['kline_processor']
+    if not trade_simulator.flush(TRADE_FLUSH_TIMEOUT):
+        print(f"交易记录写入超时: {training_id}")
+    # 最后一根K线上的成交发生在记录之后，以成交后的状态覆盖该行
+    _record_current_bar(kline_processor, trade_simulator)
+    _flush_bar_history(training)
+    report = trade_simulator.generate_report(
+        training['stock_code'],
+        training['start_date'],
+        kline_processor.get_current_date(),
+        period=training.get('period', 'daily')
+    )
+
+    session_data = {
+        'session_id': training_id,
+        'stock_code': training['stock_code'],
+        'stock_name': data_manager.get_stock_name(training['stock_code']),
+        'start_date': training['start_date'],
+        'end_date': kline_processor.get_current_date(),
+        'mode': training['mode'],
+        'initial_capital': report['initial_capital'],
+        'final_capital': report['final_capital'],
+        'total_return': report['total_return'],
+        'max_drawdown': report['max_drawdown'],
+        'total_trades': report['total_trades'],
+        'trade_win_rate': report['trade_win_rate'],
+        'session_win_rate': report['session_win_rate'],
+        'status': 'completed'
+    }
+    user_manager.save_training_session(training['user'], session_data)
+    return report
+
+def _advance_training_bar(training):
+    """推进一根K线并同步交易模拟器，返回 (是否推进成功, 新K线, 新成交量)"""
+    kline_processor = training['kline_processor']
+    trade_simulator = training['trade_simulator']
+
+    if not kline_processor.next_bar():
+        return False, None, None
+
+    current_bar = _record_current_bar(kline_processor, trade_simulator)
+    if trade_simulator.equity_curve.pending >= BAR_HISTORY_FLUSH_INTERVAL:
+        _flush_bar_history(training)
+    current_bar['lastClose'] = kline_processor.get_previous_close()
+    _bump_data_version(training, full_reload=getattr(kline_processor, 'factor_changed', False))
+
+    new_volume = kline_processor.get_current_volume()
+    color = '#000000'
+    if current_bar['close'] > current_bar['open']:
+        color = '#ff4d4f'
+    elif current_bar['close'] < current_bar['open']:
+        color = '#008000'  # 红涨绿跌
+    new_volume['color'] = color
+    return True, current_bar, new_volume
+
+def _get_indicator_settings(user, indicator_type):
+    """读取用户自定义的技术指标参数"""
+    user_config = user_manager.get_user_config(user)
+    if user_config and 'settings' in user_config and 'indicators' in user_config['settings']:
+        ind_settings = user_config['settings']['indicators']
+        ind_type_lower = indicator_type.lower()
+        if ind_type_lower in ind_settings:
+            return ind_settings[ind_type_lower]
+    return {}
+
 @app.route('/api/training/<training_id>/next', methods=['POST'])
 def next_bar(training_id):
     """获取下一根K线"""
@@ -429,63 +577,116 @@ def next_bar(training_id):
         
         training = active_trainings[training_id]
         kline_processor = training['kline_processor']
-        trade_simulator = training['trade_simulator']
 
         # 推进到下一根K线
-        has_next = kline_processor.next_bar()
+        has_next, current_bar, new_volume = _advance_training_bar(training)
         
         if not has_next:
             # 训练结束，生成报告
-            report = trade_simulator.generate_report(
-                training['stock_code'],
-                training['start_date'],
-                kline_processor.get_current_date()
-            )
-            
-            # 保存训练记录
-            session_data = {
-                'session_id': training_id,
-                'stock_code': training['stock_code'],
-                'stock_name': data_manager.get_stock_name(training['stock_code']),
-                'start_date': training['start_date'],
-                'end_date': kline_processor.get_current_date(),
-                'mode': training['mode'],
-                'initial_capital': report['initial_capital'],
-                'final_capital': report['final_capital'],
-                'total_return': report['total_return'],
-                'total_trades': report['total_trades'],
-                'trade_win_rate': report['trade_win_rate'],
-                'session_win_rate': report['session_win_rate'],
-                'status': 'completed'
-            }
-            user_manager.save_training_session(training['user'], session_data)
-            
+            report = _finish_training_session(training_id, training)
             return jsonify({
                 'finished': True,
                 'report': report
             })
-        
-        # 更新交易模拟器的当前价格和bar ID
-        current_bar = kline_processor.get_current_bar()
-        trade_simulator.update_current_price(current_bar['close'], current_bar['bar_id'])
-
-        current_bar['lastClose'] = kline_processor.get_previous_close()
 
         res = {
             'finished': False,
             'new_bar': current_bar,
-            'new_volume': kline_processor.get_current_volume(),
+            'new_volume': new_volume,
             'progress': kline_processor.get_progress(),
             'requires_full_refresh': getattr(kline_processor, 'factor_changed', False)
         }
 
-        color = '#000000'
-        if res['new_bar']['close'] > res['new_bar']['open']:
-            color = '#ff4d4f'
-        elif res['new_bar']['close'] < res['new_bar']['open']:
-            color = '#008000'  # 红涨绿跌
+        return jsonify(res)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        res['new_volume']['color'] = color
+@app.route('/api/training/<training_id>/tick', methods=['POST'])
+def tick_training(training_id):
+    """推进 N 根K线，并一次性返回前端刷新所需的增量数据"""
+    try:
+        if training_id not in active_trainings:
+            return jsonify({'error': '训练会话不存在'}), 404
+
+        training = active_trainings[training_id]
+        kline_processor = training['kline_processor']
+        trade_simulator = training['trade_simulator']
+
+        data = request.get_json(silent=True) or {}
+        view_period = data.get('view_period', 'daily')
+        try:
+            steps = max(1, int(data.get('steps', 1)))
+        except (TypeError, ValueError):
+            steps = 1
+
+        ma_periods_value = data.get('ma_periods', '5,10,20')
+        try:
+            if isinstance(ma_periods_value, list):
+                ma_periods = [int(p) for p in ma_periods_value]
+            else:
+                ma_periods = [int(p) for p in str(ma_periods_value).split(',') if p.strip()]
+        except ValueError:
+            ma_periods = [5, 10, 20]
+
+        # 周K等聚合视图下当前周期会被新的日K线改写，因此从上一周期之后开始返回
+        since_bar_id = kline_processor.get_view_bar_id(view_period)
+        if view_period != 'daily':
+            since_bar_id -= 1
+
+        current_bar = None
+        new_volume = None
+        requires_full_refresh = False
+        new_period = False
+        advanced = 0
+        for _ in range(steps):
+            has_next, bar, volume = _advance_training_bar(training)
+            if not has_next:
+                break
+            current_bar, new_volume = bar, volume
+            requires_full_refresh = requires_full_refresh or getattr(kline_processor, 'factor_changed', False)
+            if view_period != 'daily':
+                new_period = new_period or kline_processor.is_new_period(view_period)
+            advanced += 1
+
+        if advanced == 0:
+            report = _finish_training_session(training_id, training)
+            return jsonify({
+                'finished': True,
+                'report': report
+            })
+
+        res = {
+            'finished': False,
+            'steps': advanced,
+            'view_period': view_period,
+            'new_bar': current_bar,
+            'new_volume': new_volume,
+            'progress': kline_processor.get_progress(),
+            'requires_full_refresh': requires_full_refresh,
+            'account': trade_simulator.get_account_info(kline_processor.get_current_date()),
+            'trade_count': len(trade_simulator.trade_history),
+            'version': _data_version_key(training.get('data_version', 1), view_period, ma_periods)
+        }
+        if view_period != 'daily':
+            # 聚合视图下告知前端是开启了新周期还是更新了当前周期
+            res['period_status'] = 'new_period' if new_period else 'updated'
+
+        # 复权因子变化时前端会整体刷新，不必再组装增量
+        if not requires_full_refresh:
+            res['kline_data'] = kline_processor.get_visible_data(view_period=view_period, since_bar_id=since_bar_id)
+            res['volume_data'] = kline_processor.get_volume_data(view_period=view_period, since_bar_id=since_bar_id)
+            res['ma_data'] = kline_processor.get_ma_data(ma_periods, view_period=view_period, since_bar_id=since_bar_id)
+
+            indicator_type = str(data.get('indicator') or '').upper()
+            if indicator_type:
+                kwargs = _get_indicator_settings(training['user'], indicator_type)
+                res['indicator'] = kline_processor.get_technical_indicators(
+                    indicator_type, view_period=view_period, since_bar_id=since_bar_id, **kwargs
+                )
+
+        if data.get('include_chip'):
+            bins = int(data.get('bins', 80))
+            res['chip_distribution'] = kline_processor.get_volume_profile(bins=bins, view_period=view_period)
 
         return jsonify(res)
     except Exception as e:
@@ -493,7 +694,11 @@ def next_bar(training_id):
 
 @app.route('/api/training/<training_id>/adjustment', methods=['POST'])
 def update_adjustment(training_id):
-    """更新复权设置"""
+    """更新复权设置
+
+    动态前复权下因子变化时，客户端可传 rescale_from（其持有数据对应的复权因子）
+    与 since_bar_id，此时只返回缩放比例和 since_bar_id 之后的增量，历史K线由客户端按比例缩放。
+    """
     try:
         if training_id not in active_trainings:
             return jsonify({'error': '训练会话不存在'}), 404
@@ -504,9 +709,11 @@ def update_adjustment(training_id):
         
         training = active_trainings[training_id]
         kline_processor = training['kline_processor']
+        previous_adjustment = kline_processor.adjustment_mode
         
         # 更新复权设置
         kline_processor.set_adjustment(adjustment)
+        data_version = _bump_data_version(training, full_reload=True)
         
         # 获取均线周期参数
         ma_periods_str = request.args.get('ma_periods', '5,10,20')
@@ -514,6 +721,34 @@ def update_adjustment(training_id):
             ma_periods = [int(p) for p in ma_periods_str.split(',') if p.strip()]
         except ValueError:
             ma_periods = [5, 10, 20]
+
+        rescale_from = data.get('rescale_from')
+        since_bar_id = data.get('since_bar_id')
+        if (
+            adjustment == 'dynamic_forward'
+            and previous_adjustment == 'dynamic_forward'
+            and rescale_from
+            and since_bar_id is not None
+        ):
+            since_bar_id = int(since_bar_id)
+            if view_period != 'daily':
+                since_bar_id -= 1
+            res = {
+                'rescale': True,
+                'ratio': kline_processor.get_rescale_ratio(float(rescale_from)),
+                'factor': kline_processor.get_current_factor(),
+                'kline_data': kline_processor.get_visible_data(view_period=view_period, since_bar_id=since_bar_id),
+                'volume_data': kline_processor.get_volume_data(view_period=view_period, since_bar_id=since_bar_id),
+                'ma_data': kline_processor.get_ma_data(ma_periods, view_period=view_period, since_bar_id=since_bar_id),
+                'version': _data_version_key(data_version, view_period, ma_periods)
+            }
+            indicator_type = str(data.get('indicator') or '').upper()
+            if indicator_type:
+                kwargs = _get_indicator_settings(training['user'], indicator_type)
+                res['indicator'] = kline_processor.get_technical_indicators(
+                    indicator_type, view_period=view_period, since_bar_id=since_bar_id, **kwargs
+                )
+            return jsonify(res)
             
         # 重新获取数据
         kline_data = kline_processor.get_visible_data(view_period=view_period)
@@ -521,9 +756,12 @@ def update_adjustment(training_id):
         ma_data = kline_processor.get_ma_data(ma_periods, view_period=view_period)
         
         return jsonify({
+            'rescale': False,
             'kline_data': kline_data,
             'volume_data': volume_data,
-            'ma_data': ma_data
+            'ma_data': ma_data,
+            'factor': kline_processor.get_current_factor(),
+            'version': _data_version_key(data_version, view_period, ma_periods)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -540,8 +778,10 @@ def get_full_data(training_id):
         training = active_trainings[training_id]
         kline_processor = training['kline_processor']
         view_period = request.args.get('view_period', 'daily')
+        # format=columns 时按列返回，适合一次性拉取长区间
+        layout = 'columns' if request.args.get('format') == 'columns' else 'rows'
         
-        kline_data = kline_processor.get_full_data(view_period=view_period)
+        kline_data = kline_processor.get_full_data(view_period=view_period, layout=layout)
         
         # 获取均线周期参数
         ma_periods_str = request.args.get('ma_periods', '5,10,20')
@@ -561,8 +801,8 @@ def get_full_data(training_id):
         kline_processor.current_index = kline_processor.max_index
         
         try:
-            volume_data = kline_processor.get_volume_data(view_period=view_period)
-            ma_data = kline_processor.get_ma_data(ma_periods, view_period=view_period)
+            volume_data = kline_processor.get_volume_data(view_period=view_period, layout=layout)
+            ma_data = kline_processor.get_ma_data(ma_periods, view_period=view_period, layout=layout)
         finally:
             # Restore state
             kline_processor.current_index = original_index
@@ -574,7 +814,8 @@ def get_full_data(training_id):
             'trade_markers': kline_processor.get_trade_markers() if view_period == 'daily' else [],
             'period': training.get('period', 'daily'),
             'view_period': view_period,
-            'data_source': training.get('data_source', 'akshare')
+            'data_source': training.get('data_source', 'akshare'),
+            'format': layout
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -612,8 +853,11 @@ def execute_trade(training_id):
             return jsonify({'error': '无效的交易操作'}), 400
         
         if result['success']:
+            # 资金曲线的当前K线改为成交后的状态
+            _record_current_bar(kline_processor, trade_simulator)
             # 添加交易标记到K线图
             kline_processor.add_trade_marker(action, current_price)
+            _bump_data_version(training)
             
             return jsonify({
                 'success': True,
@@ -669,16 +913,12 @@ def get_technical_indicators(training_id, indicator_type):
         view_period = request.args.get('view_period', 'daily')
         
         # 获取用户自定义的技术指标参数
-        user = training['user']
-        user_config = user_manager.get_user_config(user)
-        kwargs = {}
-        if user_config and 'settings' in user_config and 'indicators' in user_config['settings']:
-            ind_settings = user_config['settings']['indicators']
-            ind_type_lower = indicator_type.lower()
-            if ind_type_lower in ind_settings:
-                kwargs = ind_settings[ind_type_lower]
-                
-        indicators = kline_processor.get_technical_indicators(indicator_type.upper(), view_period=view_period, **kwargs)
+        kwargs = _get_indicator_settings(training['user'], indicator_type)
+        since_bar_id = request.args.get('since_bar_id', type=int)
+
+        indicators = kline_processor.get_technical_indicators(
+            indicator_type.upper(), view_period=view_period, since_bar_id=since_bar_id, **kwargs
+        )
         return jsonify(indicators)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -713,12 +953,18 @@ def end_training(training_id):
         
         # Inject session_id into trade_simulator before generating report
         trade_simulator.session_id = training_id
+        # 结束训练前等待本局交易记录全部写入数据库
+        if not trade_simulator.flush(TRADE_FLUSH_TIMEOUT):
+            print(f"交易记录写入超时: {training_id}")
+        _record_current_bar(kline_processor, trade_simulator)
+        _flush_bar_history(training)
         
         # 生成报告
         report = trade_simulator.generate_report(
             training['stock_code'],
             training['start_date'],
-            kline_processor.get_current_date()
+            kline_processor.get_current_date(),
+            period=training.get('period', 'daily')
         )
         
         # 保存训练记录
@@ -732,6 +978,7 @@ def end_training(training_id):
             'initial_capital': report['initial_capital'],
             'final_capital': report['final_capital'],
             'total_return': report['total_return'],
+            'max_drawdown': report['max_drawdown'],
             'total_trades': report['total_trades'],
             'trade_win_rate': report['trade_win_rate'],
             'session_win_rate': report['session_win_rate'],
@@ -773,6 +1020,9 @@ def reset_training(training_id):
         
         # 重置交易模拟器
         training['trade_simulator'].reset()
+        user_manager.clear_bar_states(training['user'], training['trade_simulator'].session_id)
+        _record_current_bar(training['kline_processor'], training['trade_simulator'])
+        _bump_data_version(training, full_reload=True)
         
         return jsonify({'message': '训练已重置'})
     except Exception as e:
@@ -815,7 +1065,13 @@ def get_chip_distribution(training_id):
         
         # 可选增加 bins 参数，如果前端要求更精细的分布
         bins = int(request.args.get('bins', 80))
-        chip_dist = kline_processor.get_volume_profile(bins=bins, view_period=view_period)
+        # 可选 as_of_bar_id：查看历史某根日K线收盘时的筹码分布
+        as_of_bar_id = request.args.get('as_of_bar_id', type=int)
+        if as_of_bar_id is not None and as_of_bar_id > kline_processor.get_current_bar_id():
+            return jsonify({'error': '不能查看未来K线的筹码分布'}), 400
+        chip_dist = kline_processor.get_volume_profile(bins=bins, view_period=view_period, as_of_bar_id=as_of_bar_id)
+        if as_of_bar_id is not None:
+            chip_dist['as_of_bar_id'] = as_of_bar_id
         
         return jsonify(chip_dist)
     except Exception as e:
@@ -843,6 +1099,22 @@ def get_stock_universe():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/data/cache_stats', methods=['GET'])
+def get_data_cache_stats():
+    """返回行情内存缓存的命中、未命中与淘汰计数。"""
+    try:
+        return jsonify(data_manager.get_cache_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/data/source_limits', methods=['GET'])
+def get_source_limits():
+    """返回各在线数据源当前的请求速率、熔断状态与失败统计。"""
+    try:
+        return jsonify(SourceRateLimiter.all_stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/data/sync', methods=['POST'])
 def sync_offline_data():
     """使用在线数据源增量补充离线数据。"""
@@ -870,6 +1142,101 @@ def sync_offline_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+_sync_jobs_resumed = False
+_sync_jobs_resume_lock = threading.Lock()
+
+@app.before_request
+def resume_sync_jobs_once():
+    """在实际提供服务的进程中恢复上次退出前未完成的补数任务（调试模式的重载父进程不会处理请求）。"""
+    global _sync_jobs_resumed
+    if _sync_jobs_resumed:
+        return
+    with _sync_jobs_resume_lock:
+        if _sync_jobs_resumed:
+            return
+        _sync_jobs_resumed = True
+        try:
+            resumed = sync_job_manager.resume_interrupted_jobs()
+            if resumed:
+                print(f"已恢复 {len(resumed)} 个未完成的补数任务")
+        except Exception as e:
+            print(f"恢复补数任务失败: {e}")
+
+@app.route('/api/data/sync_jobs', methods=['POST'])
+def create_sync_job():
+    """创建服务端批量补数任务，按市场范围在后台线程池中逐只补齐离线数据。"""
+    try:
+        data = request.get_json() or {}
+        scope = data.get('scope', 'all')
+        source = data.get('source', 'akshare')
+
+        if source == 'offline':
+            return jsonify({'error': '请先选择在线数据源'}), 400
+
+        stock_codes = data.get('stock_codes')
+        if not stock_codes:
+            stock_codes = data_manager.get_stock_universe(market=scope)
+        if not stock_codes:
+            return jsonify({'error': '当前市场没有可补数的股票列表'}), 400
+
+        job = sync_job_manager.create_job(
+            stock_codes,
+            scope=scope,
+            source=source,
+            start_date=data.get('start_date'),
+            end_date=data.get('end_date'),
+            force_full=bool(data.get('force_full', False)),
+        )
+        return jsonify(job)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/data/sync_jobs', methods=['GET'])
+def list_sync_jobs():
+    """返回最近的补数任务及进度。"""
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({'jobs': sync_job_manager.list_jobs(limit=limit)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/data/sync_jobs/<job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """查询补数任务进度。"""
+    try:
+        job = sync_job_manager.get_job(job_id)
+        if job is None:
+            return jsonify({'error': '补数任务不存在'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/data/sync_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_sync_job(job_id):
+    """取消补数任务，已开始的股票会补完当前这一只。"""
+    try:
+        job = sync_job_manager.cancel_job(job_id)
+        if job is None:
+            return jsonify({'error': '补数任务不存在'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/data/sync_jobs/<job_id>/resume', methods=['POST'])
+def resume_sync_job(job_id):
+    """从剩余股票继续已取消或中断的补数任务。"""
+    try:
+        job = sync_job_manager.resume_job(job_id)
+        if job is None:
+            return jsonify({'error': '补数任务不存在'}), 404
+        return jsonify(job)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/training/analyze_report', methods=['POST'])
 def analyze_report():
     """使用AI分析复盘报告"""
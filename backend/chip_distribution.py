@@ -0,0 +1,121 @@
+from typing import Dict, List
+
+import numpy as np
+
+
+class ChipDistribution:
+    """等距价格网格上的筹码分布（换手率衰减模型）。
+
+    每根K线先按换手率衰减已有筹码，再把成交量均匀分到最高价与最低价之间的若干价位。
+    换手率 = 成交量 / (截至当前K线的平均成交量 × turnover_window)，只依赖已揭示的K线，
+    因此状态可以逐根向前推进，每根K线的开销只与网格大小有关。
+    初始范围由调用方给定，之后K线价格越界时按当前格距向外扩展；格数超过 2 倍 grid_size
+    时相邻两格合并，网格大小始终有界。
+    """
+
+    def __init__(
+        self,
+        price_min: float,
+        price_max: float,
+        grid_size: int = 1000,
+        turnover_window: int = 120,
+        deposit_points: int = 10,
+        min_volume: float = 1e-5,
+    ):
+        if not price_max > price_min:
+            price_max = price_min + 1.0
+        self.price_min = float(price_min)
+        self.price_max = float(price_max)
+        self.grid = np.linspace(self.price_min, self.price_max, grid_size)
+        self.cell = (self.price_max - self.price_min) / (grid_size - 1)
+        self.grid_size = grid_size
+        self.turnover_window = turnover_window
+        self.deposit_points = deposit_points
+        self.min_volume = min_volume
+        self.volumes = np.zeros(grid_size, dtype=float)
+        self.bar_count = 0
+        self.volume_sum = 0.0
+
+    def _grid_index(self, prices: np.ndarray) -> np.ndarray:
+        index = np.rint((prices - self.price_min) / self.cell).astype(np.int64)
+        return np.clip(index, 0, len(self.grid) - 1)
+
+    def _extend_grid(self, low: float, high: float):
+        """把网格扩展到覆盖 [low, high]，两侧多留 grid_size / 8 格余量，避免逐根小幅扩展。"""
+        price_min = min(low, self.price_min)
+        price_max = max(high, self.price_max)
+        pad = max(self.grid_size // 8, 1)
+        while (price_max - price_min) / self.cell + 1 + 2 * pad > 2 * self.grid_size:
+            self._coarsen_grid()
+
+        below = int(np.ceil((self.price_min - low) / self.cell)) + pad if low < self.price_min else 0
+        above = int(np.ceil((high - self.price_max) / self.cell)) + pad if high > self.price_max else 0
+        self.volumes = np.concatenate([np.zeros(below), self.volumes, np.zeros(above)])
+        self.price_min -= below * self.cell
+        self._rebuild_grid()
+
+    def _coarsen_grid(self):
+        """相邻两格合并为一格，格距翻倍，网格起点不变。"""
+        if len(self.volumes) % 2:
+            self.volumes = np.append(self.volumes, 0.0)
+        self.volumes = self.volumes.reshape(-1, 2).sum(axis=1)
+        self.cell *= 2
+        self._rebuild_grid()
+
+    def _rebuild_grid(self):
+        self.grid = self.price_min + np.arange(len(self.volumes)) * self.cell
+        self.price_max = float(self.grid[-1])
+
+    def apply_bar(self, high: float, low: float, volume: float):
+        """推进一根K线：衰减已有筹码后沉积本根成交量。"""
+        if not np.isfinite(volume) or not np.isfinite(high) or not np.isfinite(low):
+            return
+        if low < self.price_min or high > self.price_max:
+            self._extend_grid(low, high)
+        self.bar_count += 1
+        self.volume_sum += volume
+        avg_volume = self.volume_sum / self.bar_count
+        virtual_total_shares = avg_volume * self.turnover_window if avg_volume > 0 else 1
+        turnover_ratio = min(volume / virtual_total_shares, 1.0)
+
+        self.volumes *= 1 - turnover_ratio
+        self.volumes[self.volumes < self.min_volume] = 0.0
+
+        if high == low:
+            self.volumes[self._grid_index(np.array([high]))] += volume
+        else:
+            prices = np.linspace(low, high, num=self.deposit_points)
+            np.add.at(self.volumes, self._grid_index(prices), volume / self.deposit_points)
+
+    def apply_bars(self, highs: np.ndarray, lows: np.ndarray, volumes: np.ndarray):
+        for high, low, volume in zip(highs.tolist(), lows.tolist(), volumes.tolist()):
+            self.apply_bar(high, low, volume)
+
+    def copy(self) -> "ChipDistribution":
+        clone = ChipDistribution.__new__(ChipDistribution)
+        clone.__dict__.update(self.__dict__)
+        clone.volumes = self.volumes.copy()
+        return clone
+
+    def to_profile(self, bins: int = 80, price_scale: float = 1.0) -> List[Dict]:
+        """把网格上的筹码重新分箱为前端使用的价格/数量列表，price_scale 用于换算复权价格。"""
+        occupied = self.volumes > 0
+        if not occupied.any():
+            return []
+
+        prices = self.grid[occupied] * price_scale
+        volumes = self.volumes[occupied]
+        min_price = float(prices.min())
+        max_price = float(prices.max())
+        if min_price == max_price or not bins:
+            return [{"price": round(min_price, 2), "volume": round(float(volumes.sum()), 2)}]
+
+        step = (max_price - min_price) / bins
+        bin_index = np.minimum(((prices - min_price) / step).astype(np.int64), bins - 1)
+        binned = np.bincount(bin_index, weights=volumes, minlength=bins)
+        centers = min_price + (np.arange(bins) + 0.5) * step
+        return [
+            {"price": round(price, 2), "volume": round(volume, 2)}
+            for price, volume in zip(centers.tolist(), binned.tolist())
+            if volume > 0
+        ]
@@ -2,12 +2,23 @@ import csv
 import json
 import os
 import random
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
 import akshare as ak
+import numpy as np
 import pandas as pd
 
+from backend.frame_cache import FrameCache
+from backend.rate_limiter import SourceRateLimiter
+from backend.stock_catalog import StockCatalog
+from backend.timeframe_engine import TimeframeEngine
+
 try:
     from xtquant import xtdata
 
@@ -26,12 +37,16 @@ except ImportError:
 class DataManager:
     """管理股票数据下载、缓存、周K合成以及离线增量补数。"""
 
-    def __init__(self, data_dir: str = "./data"):
+    PREFETCH_BATCH_SIZE = 8
+    FACTOR_OVERLAP_DAYS = 5
+
+    def __init__(self, data_dir: str = "./data", cache_max_bytes: int = 256 * 1024 * 1024):
         self.data_dir = data_dir
         self.kline_dir = os.path.join(data_dir, "kline_raw")
         self.factor_dir = os.path.join(data_dir, "factor")
         self.dividend_dir = os.path.join(data_dir, "ex_dividend")
         self.offline_dir = os.path.join(data_dir, "a_market_offline")
+        self.columnar_dir = os.path.join(data_dir, "columnar")
 
         os.makedirs(self.kline_dir, exist_ok=True)
         os.makedirs(self.factor_dir, exist_ok=True)
@@ -42,6 +57,16 @@ class DataManager:
         self.stock_names: Dict[str, str] = {}
         self._offline_stock_codes_cache: Optional[List[str]] = None
         self._offline_date_range_cache: Dict[str, Optional[Tuple[pd.Timestamp, pd.Timestamp]]] = {}
+        # 规范化后的数据包按 (代码, 数据源, 周期) 缓存在内存中，多个训练会话共享
+        self.frame_cache = FrameCache(max_bytes=cache_max_bytes)
+        # 离线目录的日期范围索引，随机选股时按索引筛选而不逐个打开 CSV
+        self.catalog = StockCatalog(os.path.join(data_dir, "stock_catalog.db"))
+        self._catalog_ready: Dict[str, bool] = {}
+        # 在线模式随机选股时未覆盖的候选股票交给后台线程下载，不阻塞请求
+        self._prefetch_queue: List[Tuple[str, str]] = []
+        self._prefetch_pending = set()
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_thread: Optional[threading.Thread] = None
 
     def download_stock_list(self) -> bool:
         """下载 A 股股票列表。"""
@@ -303,16 +328,21 @@ class DataManager:
             self._offline_date_range_cache[stock_code] = None
             return None
 
+        date_range = self._read_csv_date_range(offline_path)
+        self._offline_date_range_cache[stock_code] = date_range
+        return date_range
+
+    def _read_csv_date_range(self, path: str) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """只读取表头、首行与末行得到 CSV 的日期范围。"""
         last_error = None
         for encoding in ("utf-8", "utf-8-sig", "gbk"):
             try:
-                with open(offline_path, "r", encoding=encoding, newline="") as file:
+                with open(path, "r", encoding=encoding, newline="") as file:
                     reader = csv.reader(file)
                     header = next(reader, None)
                     first_row = next(reader, None)
 
                 if not header or not first_row:
-                    self._offline_date_range_cache[stock_code] = None
                     return None
 
                 normalized_header = [col.lstrip("\ufeff") for col in header]
@@ -321,31 +351,165 @@ class DataManager:
                     None,
                 )
                 if date_index is None:
-                    self._offline_date_range_cache[stock_code] = None
                     return None
 
                 first_date = first_row[date_index] if date_index < len(first_row) else None
-                last_line = self._read_last_nonempty_line(offline_path, encoding)
+                last_line = self._read_last_nonempty_line(path, encoding)
                 last_date = self._extract_csv_field(last_line, date_index) if last_line else None
-                candidate_dates = [value for value in (first_date, last_date) if value]
-                parsed_dates = self._parse_date_series(pd.Series(candidate_dates)).dropna()
-                if parsed_dates.empty:
-                    self._offline_date_range_cache[stock_code] = None
+                parsed_dates = [self._parse_date_value(value) for value in (first_date, last_date) if value]
+                parsed_dates = [value for value in parsed_dates if value is not None]
+                if not parsed_dates:
                     return None
 
-                date_range = (parsed_dates.min(), parsed_dates.max())
-                self._offline_date_range_cache[stock_code] = date_range
-                return date_range
+                return min(parsed_dates), max(parsed_dates)
             except UnicodeDecodeError as exc:
                 last_error = exc
                 continue
 
         if last_error is not None:
             raise last_error
-
-        self._offline_date_range_cache[stock_code] = None
         return None
 
+    def _parse_date_value(self, value: str) -> Optional[pd.Timestamp]:
+        """单个日期的解析，规则与 _parse_date_series 相同，避免为两个值构造 Series。"""
+        value = str(value).strip()
+        if not value or value in {"nan", "NaT", "None"}:
+            return None
+        if len(value) == 8 and value.isdigit():
+            parsed = pd.to_datetime(value, format="%Y%m%d", errors="coerce")
+        else:
+            parsed = pd.to_datetime(value, errors="coerce")
+        return None if pd.isna(parsed) else parsed
+
+    def _count_csv_rows(self, path: str) -> int:
+        line_count = 0
+        last_byte = b"\n"
+        with open(path, "rb") as file:
+            while True:
+                chunk = file.read(1024 * 1024)
+                if not chunk:
+                    break
+                line_count += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+        if last_byte != b"\n":
+            line_count += 1
+        return max(0, line_count - 1)
+
+    def _get_board(self, stock_code: str) -> str:
+        """与 _filter_stock_codes_by_sector 一致的板块划分：main / gem / sme / other。"""
+        if stock_code.startswith("30"):
+            return "gem"
+        if stock_code.startswith("002"):
+            return "sme"
+        if stock_code.startswith(("60", "000", "001", "003")):
+            return "main"
+        return "other"
+
+    def _build_catalog_entry(self, stock_code: str, path: str) -> Dict:
+        stat = os.stat(path)
+        entry = {
+            "stock_code": stock_code,
+            "first_date": None,
+            "last_date": None,
+            "row_count": 0,
+            "mtime_ns": stat.st_mtime_ns,
+            "file_size": stat.st_size,
+            "board": self._get_board(stock_code),
+        }
+        try:
+            date_range = self._read_csv_date_range(path)
+            if date_range is not None:
+                entry["first_date"] = date_range[0].strftime("%Y-%m-%d")
+                entry["last_date"] = date_range[1].strftime("%Y-%m-%d")
+                entry["row_count"] = self._count_csv_rows(path)
+        except Exception as e:
+            print(f"登记离线文件 {path} 失败: {e}")
+        return entry
+
+    def _get_catalog_dir(self, dataset: str) -> str:
+        """目录索引覆盖的数据集：offline 对应 a_market_offline，kline_raw 为在线数据源共用的日线缓存。"""
+        if dataset == "offline":
+            return self.offline_dir
+        if dataset == "kline_raw":
+            return self.kline_dir
+        raise ValueError(f"未知的目录索引数据集: {dataset}")
+
+    def refresh_catalog(self, dataset: str = "offline", max_workers: int = 8) -> Dict[str, int]:
+        """按文件签名增量刷新目录索引，新增或变化的文件并行解析，已删除的文件移出索引。"""
+        directory = self._get_catalog_dir(dataset)
+        files: Dict[str, Tuple[str, int, int]] = {}
+        for filename in os.listdir(directory):
+            if not filename.lower().endswith(".csv"):
+                continue
+            stock_code = self._normalize_stock_code(os.path.splitext(filename)[0])
+            if not stock_code:
+                continue
+            path = os.path.join(directory, filename)
+            stat = os.stat(path)
+            files[stock_code] = (path, stat.st_mtime_ns, stat.st_size)
+
+        known = self.catalog.get_signatures(dataset)
+        changed = [
+            (stock_code, path)
+            for stock_code, (path, mtime_ns, file_size) in files.items()
+            if known.get(stock_code) != (mtime_ns, file_size)
+        ]
+        removed = [stock_code for stock_code in known if stock_code not in files]
+
+        if changed:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                entries = list(executor.map(lambda item: self._build_catalog_entry(*item), changed))
+            self.catalog.upsert(dataset, entries)
+        self.catalog.remove(dataset, removed)
+
+        self._catalog_ready[dataset] = True
+        return {"scanned": len(files), "updated": len(changed), "removed": len(removed)}
+
+    def _update_catalog_entry(self, dataset: str, stock_code: str):
+        if dataset == "offline":
+            path = self._get_offline_file(stock_code)
+        else:
+            path = os.path.join(self.kline_dir, f"{stock_code}.csv")
+        try:
+            if path and os.path.exists(path):
+                self.catalog.upsert(dataset, [self._build_catalog_entry(stock_code, path)])
+            else:
+                self.catalog.remove(dataset, [stock_code])
+        except Exception as e:
+            print(f"更新目录索引 {dataset}/{stock_code} 失败: {e}")
+
+    def _schedule_prefetch(self, stock_codes: List[str], source: str) -> int:
+        """把尚未缓存的股票加入后台下载队列，返回新加入的数量。"""
+        added = 0
+        with self._prefetch_lock:
+            for stock_code in stock_codes:
+                if stock_code in self._prefetch_pending:
+                    continue
+                self._prefetch_pending.add(stock_code)
+                self._prefetch_queue.append((stock_code, source))
+                added += 1
+
+            if added and (self._prefetch_thread is None or not self._prefetch_thread.is_alive()):
+                self._prefetch_thread = threading.Thread(target=self._run_prefetch, daemon=True)
+                self._prefetch_thread.start()
+        return added
+
+    def _run_prefetch(self):
+        while True:
+            with self._prefetch_lock:
+                if not self._prefetch_queue:
+                    self._prefetch_thread = None
+                    return
+                stock_code, source = self._prefetch_queue.pop(0)
+
+            try:
+                self.download_stock_data(stock_code, start_date="2010-01-01", source=source)
+            except Exception as e:
+                print(f"后台下载 {stock_code} 失败: {e}")
+            finally:
+                with self._prefetch_lock:
+                    self._prefetch_pending.discard(stock_code)
+
     def _get_stock_date_range(
         self,
         stock_code: str,
@@ -547,35 +711,18 @@ class DataManager:
         df = df.sort_values("date").drop_duplicates(subset=["date"], keep="last").reset_index(drop=True)
         return df
 
-    def _resample_to_weekly(self, data: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    def _resample_to_interval(self, data: Optional[pd.DataFrame], interval: str) -> Optional[pd.DataFrame]:
+        """把日K或复权因子聚合到 interval 周期，分组规则与训练视图共用 TimeframeEngine。"""
         if data is None or data.empty:
             return data
 
         df = data.copy()
-        df = df.sort_values("date").set_index("date")
-        if set(df.columns) == {"factor"}:
-            weekly_factor = df.resample("W-FRI").last().dropna().reset_index()
-            return weekly_factor
-
-        aggregations = {
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum",
-        }
-
-        if "amount" in df.columns:
-            aggregations["amount"] = "sum"
-        if "turnover_rate" in df.columns:
-            aggregations["turnover_rate"] = "sum"
-        if "factor" in df.columns:
-            aggregations["factor"] = "last"
-
-        weekly = df.resample("W-FRI").agg(aggregations)
-        weekly = weekly.dropna(subset=["open", "high", "low", "close"])
-        weekly = weekly.reset_index()
-        return weekly
+        df["date"] = pd.to_datetime(df["date"])
+        df = df.sort_values("date").reset_index(drop=True)
+        resampled = TimeframeEngine(df["date"]).resample(df, interval)
+        if "open" in resampled.columns:
+            return resampled.dropna(subset=["open", "high", "low", "close"]).reset_index(drop=True)
+        return resampled.dropna().reset_index(drop=True)
 
     def _slice_date_range(
         self,
@@ -608,6 +755,10 @@ class DataManager:
     def _supports_factor_refresh(self, source: str) -> bool:
         return source in {"akshare", "xtdata"}
 
+    def _call_source(self, source: str, func, *args, **kwargs):
+        """所有在线数据源请求都经过该数据源共享的限速器（令牌桶、重试退避与熔断）。"""
+        return SourceRateLimiter.for_source(source).call(func, *args, **kwargs)
+
     def _fetch_stock_bundle(
         self,
         stock_code: str,
@@ -628,7 +779,9 @@ class DataManager:
         end_date: Optional[str] = None,
     ) -> Dict[str, Optional[pd.DataFrame]]:
         end_date = (end_date or datetime.now().strftime("%Y-%m-%d")).replace("-", "")
-        raw_daily = ak.stock_zh_a_hist(
+        raw_daily = self._call_source(
+            "akshare",
+            ak.stock_zh_a_hist,
             symbol=stock_code,
             period="daily",
             start_date=start_date.replace("-", ""),
@@ -641,7 +794,9 @@ class DataManager:
 
         factor_df = None
         try:
-            raw_qfq = ak.stock_zh_a_hist(
+            raw_qfq = self._call_source(
+                "akshare",
+                ak.stock_zh_a_hist,
                 symbol=stock_code,
                 period="daily",
                 start_date=start_date.replace("-", ""),
@@ -667,7 +822,14 @@ class DataManager:
         start_time = start_date.replace("-", "")
         end_time = (end_date or datetime.now().strftime("%Y-%m-%d")).replace("-", "")
 
-        xtdata.download_history_data2(stock_list=[xt_code], period="1d", start_time=start_time, end_time=end_time)
+        self._call_source(
+            "xtdata",
+            xtdata.download_history_data2,
+            stock_list=[xt_code],
+            period="1d",
+            start_time=start_time,
+            end_time=end_time,
+        )
 
         raw_dict = xtdata.get_market_data(
             field_list=["time", "open", "close", "high", "low", "volume", "amount"],
@@ -748,7 +910,7 @@ class DataManager:
 
             if hasattr(client, "get_k_data"):
                 try:
-                    bars_df = client.get_k_data(stock_code, start_day, end_day)
+                    bars_df = self._call_source("mootdx", client.get_k_data, stock_code, start_day, end_day)
                 except Exception:
                     bars_df = None
 
@@ -764,7 +926,7 @@ class DataManager:
                 last_error = None
                 for kwargs in attempts:
                     try:
-                        candidate = client.bars(**kwargs)
+                        candidate = self._call_source("mootdx", client.bars, **kwargs)
                         if candidate is not None and not candidate.empty:
                             bars_df = candidate
                             break
@@ -818,7 +980,14 @@ class DataManager:
             xt_code = self._format_xt_code(stock_code)
             start_time = start_dt.strftime("%Y%m%d")
             end_time = end_dt.strftime("%Y%m%d")
-            xtdata.download_history_data2(stock_list=[xt_code], period="1d", start_time=start_time, end_time=end_time)
+            self._call_source(
+                "xtdata",
+                xtdata.download_history_data2,
+                stock_list=[xt_code],
+                period="1d",
+                start_time=start_time,
+                end_time=end_time,
+            )
             adj_dict = xtdata.get_market_data(
                 field_list=["time", "close"],
                 stock_list=[xt_code],
@@ -841,7 +1010,9 @@ class DataManager:
             factor_df = self._normalize_factor_data(factor_raw, base_frame)
             return self._slice_date_range(factor_df, start_dt, end_dt)
 
-        raw_qfq = ak.stock_zh_a_hist(
+        raw_qfq = self._call_source(
+            "akshare",
+            ak.stock_zh_a_hist,
             symbol=stock_code,
             period="daily",
             start_date=start_dt.strftime("%Y%m%d"),
@@ -882,14 +1053,16 @@ class DataManager:
         kline_path = os.path.join(self.kline_dir, f"{stock_code}.csv")
         save_kline = kline_df.copy()
         save_kline["date"] = save_kline["date"].dt.strftime("%Y-%m-%d")
-        save_kline.to_csv(kline_path, index=False, encoding="utf-8")
+        self._write_csv_atomic(save_kline, kline_path)
 
         if factor_df is not None and not factor_df.empty:
             factor_path = os.path.join(self.factor_dir, f"{stock_code}.csv")
             save_factor = factor_df.copy()
             save_factor["date"] = save_factor["date"].dt.strftime("%Y-%m-%d")
-            save_factor.to_csv(factor_path, index=False, encoding="utf-8")
+            self._write_csv_atomic(save_factor, factor_path)
 
+        self.invalidate_stock_cache(stock_code)
+        self._update_catalog_entry("kline_raw", stock_code)
         return True
 
     def download_stock_data(self, stock_code: str, start_date: str = "2010-01-01", source: str = "akshare") -> bool:
@@ -902,19 +1075,175 @@ class DataManager:
             print(f"下载股票 {stock_code} 数据失败: {e}")
             return False
 
+    def _get_columnar_path(self, csv_path: str) -> str:
+        """CSV 对应的列式缓存目录：data/columnar/<原目录名>/<文件名>/。"""
+        folder = os.path.basename(os.path.dirname(os.path.abspath(csv_path)))
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+        return os.path.join(self.columnar_dir, folder, name)
+
+    def _get_source_signature(self, csv_path: str) -> Dict:
+        stat = os.stat(csv_path)
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def _load_columnar_cache(self, csv_path: str) -> Optional[pd.DataFrame]:
+        """读取与 CSV 签名一致的列式缓存，每列一个 .npy 文件并以内存映射方式打开。
+
+        以 copy=False 构造 DataFrame，不合并成二维块，各列直接引用映射内存，只有实际访问的
+        页才会读入；映射用写时复制模式（mmap_mode="c"），对返回结果的原地修改不会写回缓存文件。
+        """
+        cache_path = self._get_columnar_path(csv_path)
+        meta_path = os.path.join(cache_path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+            if meta.get("source") != self._get_source_signature(csv_path):
+                return None
+
+            # 旧版缓存没有 version，列文件直接放在缓存目录下
+            version_path = os.path.join(cache_path, meta["version"]) if meta.get("version") else cache_path
+            text_columns = set(meta.get("text_columns", []))
+            columns = {}
+            for column in meta["columns"]:
+                column_path = os.path.join(version_path, f"{column}.npy")
+                if column in text_columns:
+                    # 文本列存为定长字符串，空串还原为缺失值，与 read_csv 的结果一致
+                    values = np.load(column_path)
+                    columns[column] = pd.Series(values).mask(values == "")
+                else:
+                    columns[column] = np.load(column_path, mmap_mode="c")
+            return pd.DataFrame(columns, copy=False)
+        except Exception as e:
+            print(f"读取列式缓存 {cache_path} 失败: {e}")
+            return None
+
+    def _save_columnar_cache(self, csv_path: str, data: pd.DataFrame, signature: Dict) -> bool:
+        """把规范化后的数据按列写成 .npy，meta.json 最后写入，作为缓存有效的标志。
+
+        signature 是读取 CSV 之前取得的文件签名：读取期间文件若被追加，缓存会因签名不符而失效，
+        不会把旧内容登记在新签名下。数值列与日期列以内存映射读取，其余列按定长字符串保存。
+
+        每次保存写入新的版本子目录，写完后替换 meta.json 指向新版本。已加载的 DataFrame
+        仍映射着旧版本文件（Windows 下映射中的文件不能被替换或删除），旧版本目录在之后的
+        保存中尽量清理，删不掉的留待下次。
+        """
+        cache_path = self._get_columnar_path(csv_path)
+        meta_path = os.path.join(cache_path, "meta.json")
+        version = f"v{time.time_ns()}.{os.getpid()}.{threading.get_ident()}"
+        version_path = os.path.join(cache_path, version)
+        try:
+            os.makedirs(version_path, exist_ok=True)
+
+            columns: List[str] = []
+            text_columns: List[str] = []
+            for column in data.columns:
+                series = data[column]
+                if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+                    values = series.to_numpy()
+                    if values.dtype.kind == "M":
+                        values = values.astype("datetime64[ns]")
+                else:
+                    values = series.fillna("").astype(str).to_numpy(dtype=str)
+                    text_columns.append(column)
+                np.save(os.path.join(version_path, f"{column}.npy"), values, allow_pickle=False)
+                columns.append(column)
+
+            meta = {
+                "source": signature,
+                "version": version,
+                "columns": columns,
+                "text_columns": text_columns,
+                "rows": len(data),
+            }
+            temp_path = self._get_temp_path(meta_path)
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(meta, file)
+            os.replace(temp_path, meta_path)
+        except Exception as e:
+            print(f"写入列式缓存 {cache_path} 失败: {e}")
+            shutil.rmtree(version_path, ignore_errors=True)
+            return False
+
+        self._remove_stale_columnar_versions(cache_path, version)
+        return True
+
+    def _remove_stale_columnar_versions(self, cache_path: str, current_version: str):
+        for name in os.listdir(cache_path):
+            if name in (current_version, "meta.json") or name.endswith(".tmp"):
+                continue
+            path = os.path.join(cache_path, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif name.endswith(".npy"):
+                    os.remove(path)
+            except OSError:
+                # 仍被内存映射占用（Windows），下次保存时再删
+                pass
+
+    def _load_normalized_csv(self, csv_path: str, reader, normalizer) -> Optional[pd.DataFrame]:
+        """优先命中列式缓存；缓存缺失或 CSV 已变化时重新解析并回写缓存。"""
+        if not os.path.exists(csv_path):
+            return None
+
+        cached = self._load_columnar_cache(csv_path)
+        if cached is not None:
+            return cached
+
+        signature = self._get_source_signature(csv_path)
+        normalized = normalizer(reader(csv_path))
+        if normalized is None or normalized.empty:
+            return normalized
+        if self._save_columnar_cache(csv_path, normalized, signature):
+            # 与缓存命中时返回同样的列类型；读取期间文件已变化时缓存无效，直接返回解析结果
+            cached = self._load_columnar_cache(csv_path)
+            if cached is not None:
+                return cached
+        return normalized
+
     def _load_cached_kline(self, stock_code: str) -> Optional[pd.DataFrame]:
         kline_path = os.path.join(self.kline_dir, f"{stock_code}.csv")
-        if not os.path.exists(kline_path):
-            return None
-        data = pd.read_csv(kline_path)
-        return self._normalize_daily_kline(data)
+        return self._load_normalized_csv(kline_path, pd.read_csv, self._normalize_daily_kline)
 
     def _load_cached_factor(self, stock_code: str) -> Optional[pd.DataFrame]:
         factor_path = os.path.join(self.factor_dir, f"{stock_code}.csv")
-        if not os.path.exists(factor_path):
+        return self._load_normalized_csv(factor_path, pd.read_csv, self._normalize_factor_data)
+
+    def _load_offline_data(self, stock_code: str) -> Optional[pd.DataFrame]:
+        offline_path = self._get_offline_file(stock_code)
+        if not offline_path:
             return None
-        data = pd.read_csv(factor_path)
-        return self._normalize_factor_data(data)
+        return self._load_normalized_csv(offline_path, self._read_csv_with_fallback, self._normalize_offline_data)
+
+    def convert_to_columnar_cache(self, folders: Optional[List[str]] = None) -> Dict[str, int]:
+        """把已有的 kline_raw、factor、a_market_offline 目录批量转换为列式缓存，返回各目录转换成功的文件数。"""
+        targets = {
+            "kline_raw": (self.kline_dir, pd.read_csv, self._normalize_daily_kline),
+            "factor": (self.factor_dir, pd.read_csv, self._normalize_factor_data),
+            "a_market_offline": (self.offline_dir, self._read_csv_with_fallback, self._normalize_offline_data),
+        }
+        summary: Dict[str, int] = {}
+        for folder, (directory, reader, normalizer) in targets.items():
+            if folders and folder not in folders:
+                continue
+
+            filenames = sorted(name for name in os.listdir(directory) if name.lower().endswith(".csv"))
+            converted = 0
+            for index, filename in enumerate(filenames, start=1):
+                csv_path = os.path.join(directory, filename)
+                try:
+                    if self._load_normalized_csv(csv_path, reader, normalizer) is not None:
+                        converted += 1
+                except Exception as e:
+                    print(f"转换 {csv_path} 失败: {e}")
+                if index % 500 == 0:
+                    print(f"{folder} 转换进度: {index}/{len(filenames)}")
+
+            print(f"{folder} 转换完成，成功 {converted}/{len(filenames)}")
+            summary[folder] = converted
+        return summary
 
     def get_stock_data(
         self,
@@ -925,27 +1254,10 @@ class DataManager:
         """获取股票 K 线数据，支持日K与周K。"""
         stock_code = self._normalize_stock_code(stock_code)
         try:
-            if source == "offline":
-                offline_path = self._get_offline_file(stock_code)
-                if not offline_path:
-                    return None
-                data = self._read_csv_with_fallback(offline_path)
-                normalized = self._normalize_offline_data(data)
-            else:
-                normalized = self._load_cached_kline(stock_code)
-                if normalized is None:
-                    if not self.download_stock_data(stock_code, start_date="2010-01-01", source=source):
-                        return None
-                    normalized = self._load_cached_kline(stock_code)
-
-            if normalized is None:
+            bundle = self.load_bundle(stock_code, source=source, interval=interval)
+            if bundle is None:
                 return None
-
-            normalized = normalized.drop(columns=["factor"], errors="ignore")
-
-            if interval == "weekly":
-                return self._resample_to_weekly(normalized)
-            return normalized
+            return bundle["kline"].copy()
         except Exception as e:
             print(f"获取股票 {stock_code} 数据失败: {e}")
             return None
@@ -956,29 +1268,107 @@ class DataManager:
         source: str = "akshare",
         interval: str = "daily",
     ) -> Optional[pd.DataFrame]:
-        """获取复权因子数据，周K会按周最后一个交易日聚合。"""
+        """获取复权因子数据，周K等聚合周期取每个周期最后一个交易日的因子。"""
         stock_code = self._normalize_stock_code(stock_code)
+        try:
+            bundle = self.load_bundle(stock_code, source=source, interval=interval)
+            if bundle is None or bundle["factor"] is None:
+                return None
+            return bundle["factor"].copy()
+        except Exception as e:
+            print(f"获取复权因子 {stock_code} 失败: {e}")
+            return None
+
+    def _get_bundle_signature(self, stock_code: str, source: str) -> Optional[Tuple]:
+        """数据包对应源文件的 (路径, mtime, 大小)；K 线文件不存在时返回 None。"""
+        if source == "offline":
+            paths = [self._get_offline_file(stock_code)]
+        else:
+            paths = [
+                os.path.join(self.kline_dir, f"{stock_code}.csv"),
+                os.path.join(self.factor_dir, f"{stock_code}.csv"),
+            ]
+        if not paths[0] or not os.path.exists(paths[0]):
+            return None
+
+        signature = []
+        for path in paths:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def invalidate_stock_cache(self, stock_code: str) -> int:
+        """股票文件被改写后移除其所有内存缓存。"""
+        stock_code = self._normalize_stock_code(stock_code)
+        return self.frame_cache.invalidate(lambda key: key[0] == stock_code)
+
+    def get_cache_stats(self) -> Dict:
+        return self.frame_cache.stats()
+
+    def load_bundle(
+        self,
+        stock_code: str,
+        source: str = "akshare",
+        interval: str = "daily",
+    ) -> Optional[Dict]:
+        """一次解析同时得到 K 线、复权因子与日期范围，供训练校验和 K 线处理器共用。
+
+        离线数据的 K 线与因子位于同一文件，只读取、规范化一次；其他数据源各读一次缓存文件。
+        返回 {"kline", "factor", "date_range"}，没有可用 K 线时返回 None。
+        结果进入进程内 LRU 缓存并被多个会话共享，调用方不得原地修改其中的 DataFrame。
+        """
+        stock_code = self._normalize_stock_code(stock_code)
+        cache_key = (stock_code, source, interval)
+        signature = self._get_bundle_signature(stock_code, source)
+        if signature is not None:
+            cached = self.frame_cache.get(cache_key, signature)
+            if cached is not None:
+                return cached
+
+        bundle = self._read_bundle(stock_code, source, interval)
+        if bundle is not None:
+            if signature is None:
+                # 首次下载后才有源文件
+                signature = self._get_bundle_signature(stock_code, source)
+            if signature is not None:
+                self.frame_cache.put(cache_key, bundle, signature)
+        return bundle
+
+    def _read_bundle(self, stock_code: str, source: str, interval: str) -> Optional[Dict]:
         try:
             if source == "offline":
-                offline_path = self._get_offline_file(stock_code)
-                if not offline_path:
-                    return None
-                data = self._read_csv_with_fallback(offline_path)
-                normalized = self._normalize_offline_data(data)
-                if normalized is None or "factor" not in normalized.columns:
-                    return None
-                factor_df = normalized[["date", "factor"]].copy()
+                normalized = self._load_offline_data(stock_code)
+                factor_df = None
+                if normalized is not None and "factor" in normalized.columns:
+                    factor_df = normalized[["date", "factor"]].copy()
             else:
+                normalized = self._load_cached_kline(stock_code)
+                if normalized is None:
+                    if not self.download_stock_data(stock_code, start_date="2010-01-01", source=source):
+                        return None
+                    normalized = self._load_cached_kline(stock_code)
                 factor_df = self._load_cached_factor(stock_code)
 
-            if factor_df is None or factor_df.empty:
+            if normalized is None or normalized.empty:
                 return None
 
-            if interval == "weekly":
-                return self._resample_to_weekly(factor_df)
-            return factor_df
+            kline_df = normalized.drop(columns=["factor"], errors="ignore")
+            if factor_df is not None and factor_df.empty:
+                factor_df = None
+
+            if interval != "daily":
+                kline_df = self._resample_to_interval(kline_df, interval)
+                if factor_df is not None:
+                    factor_df = self._resample_to_interval(factor_df, interval)
+
+            return {
+                "kline": kline_df,
+                "factor": factor_df,
+                "date_range": (kline_df["date"].min(), kline_df["date"].max()),
+            }
         except Exception as e:
-            print(f"获取复权因子 {stock_code} 失败: {e}")
+            print(f"加载股票 {stock_code} 数据失败: {e}")
             return None
 
     def get_dividend_data(self, stock_code: str) -> Optional[pd.DataFrame]:
@@ -1005,7 +1395,9 @@ class DataManager:
         start_date: str,
         source: str = "akshare",
         interval: str = "daily",
+        bundle: Optional[Dict] = None,
     ) -> Optional[str]:
+        """校验股票与起始日期；传入 load_bundle 的结果时直接复用其日期范围，不再重复读取数据。"""
         stock_code = self._normalize_stock_code(stock_code)
         if not stock_code:
             return "股票代码不能为空"
@@ -1015,16 +1407,20 @@ class DataManager:
         except Exception:
             return "起始日期格式无效"
 
-        data = self.get_stock_data(stock_code, source=source, interval=interval)
-        if data is None or data.empty:
+        if bundle is not None:
+            date_range = bundle["date_range"]
+        else:
+            data = self.get_stock_data(stock_code, source=source, interval=interval)
+            date_range = None if data is None or data.empty else (data["date"].min(), data["date"].max())
+
+        if date_range is None:
             if source == "offline":
                 if self._get_offline_file(stock_code) is None:
                     return "指定股票在离线数据中不存在"
                 return "指定股票在离线数据中没有可用数据"
             return "指定股票暂无可用数据，请切换数据源或稍后重试"
 
-        min_date = data["date"].min()
-        max_date = data["date"].max()
+        min_date, max_date = date_range
         if start_dt < min_date or start_dt > max_date:
             if source == "offline":
                 return f"起始日期不在该股票离线数据范围内（{min_date:%Y-%m-%d} ~ {max_date:%Y-%m-%d}）"
@@ -1059,23 +1455,22 @@ class DataManager:
         range_start, range_end = self._resolve_training_range(date_start, date_end)
 
         if source == "offline":
-            stock_codes = self._filter_stock_codes_by_sector(self._get_offline_stock_codes(), sector)
-            candidates: List[Tuple[str, pd.Timestamp, pd.Timestamp]] = []
-
-            for stock_code in stock_codes:
-                date_range = self._get_offline_date_range(stock_code)
-                if date_range is None:
-                    continue
-                stock_start, stock_end = date_range
-                available_start = max(range_start, stock_start)
-                available_end = min(range_end, stock_end)
-                if available_start <= available_end:
-                    candidates.append((stock_code, available_start, available_end))
-
+            if not self._catalog_ready.get("offline"):
+                self.refresh_catalog("offline")
+
+            boards = [sector] if sector in {"main", "gem", "sme"} else None
+            candidates = self.catalog.find_candidates(
+                "offline",
+                range_start.strftime("%Y-%m-%d"),
+                range_end.strftime("%Y-%m-%d"),
+                boards=boards,
+            )
             if not candidates:
                 raise ValueError("离线数据中没有符合板块与日期范围的股票")
 
-            stock_code, available_start, available_end = random.choice(candidates)
+            stock_code, stock_start, stock_end = random.choice(candidates)
+            available_start = max(range_start, pd.Timestamp(stock_start))
+            available_end = min(range_end, pd.Timestamp(stock_end))
             return stock_code, self._random_date_in_range(available_start, available_end)
 
         if self.stock_list is None:
@@ -1089,19 +1484,30 @@ class DataManager:
         if not stock_codes:
             raise ValueError("所选板块下没有可用股票")
 
-        random.shuffle(stock_codes)
-        max_attempts = min(len(stock_codes), 80)
-        for stock_code in stock_codes[:max_attempts]:
-            date_range = self._get_stock_date_range(stock_code, source=source, interval=interval)
-            if date_range is None:
-                continue
-            stock_start, stock_end = date_range
-            available_start = max(range_start, stock_start)
-            available_end = min(range_end, stock_end)
-            if available_start <= available_end:
-                return stock_code, self._random_date_in_range(available_start, available_end)
+        # 只在本地日线缓存已覆盖所选区间的股票中抽取；未缓存的股票放到后台下载，供之后的抽取使用
+        if not self._catalog_ready.get("kline_raw"):
+            self.refresh_catalog("kline_raw")
 
-        raise ValueError("所选数据源中没有符合条件的股票，请调整板块或日期范围后重试")
+        candidates = self.catalog.find_candidates(
+            "kline_raw",
+            range_start.strftime("%Y-%m-%d"),
+            range_end.strftime("%Y-%m-%d"),
+            stock_codes=stock_codes,
+        )
+        cached_codes = set(self.catalog.get_signatures("kline_raw"))
+        uncovered = [code for code in stock_codes if code not in cached_codes]
+        random.shuffle(uncovered)
+        self._schedule_prefetch(uncovered[: self.PREFETCH_BATCH_SIZE], source)
+
+        if not candidates:
+            if uncovered:
+                raise ValueError("本地缓存中暂无符合条件的股票，已在后台下载候选数据，请稍后重试")
+            raise ValueError("所选数据源中没有符合条件的股票，请调整板块或日期范围后重试")
+
+        stock_code, stock_start, stock_end = random.choice(candidates)
+        available_start = max(range_start, pd.Timestamp(stock_start))
+        available_end = min(range_end, pd.Timestamp(stock_end))
+        return stock_code, self._random_date_in_range(available_start, available_end)
 
     def _build_offline_path(self, stock_code: str) -> str:
         stock_code = self._normalize_stock_code(stock_code)
@@ -1123,21 +1529,33 @@ class DataManager:
         if source == "offline":
             raise ValueError("离线数据不能作为在线补数源。")
 
-        existing = self.get_stock_data(stock_code, source="offline", interval="daily")
-        existing_factor = self.get_factor_data(stock_code, source="offline", interval="daily")
         request_start, request_end = self._normalize_sync_range(start_date=start_date, end_date=end_date)
         offline_path = self._build_offline_path(stock_code)
 
+        # 先只读目录索引与文件末尾几行；只有补头部、重叠区间、除权或全量重建时才加载整段历史
+        existing = None
+        existing_factor = None
+        offline_tail = None if force_full else self._read_offline_tail(stock_code, offline_path)
+        if offline_tail is None:
+            existing, existing_factor = self._load_offline_history(stock_code)
+
         range_before = None
         previous_rows = 0
         segments_to_fetch: List[Tuple[pd.Timestamp, pd.Timestamp]] = []
+        stored_dates = None
 
-        if existing is not None and not existing.empty:
-            existing = existing.copy()
-            existing["date"] = pd.to_datetime(existing["date"])
+        if offline_tail is not None:
+            previous_rows = offline_tail["row_count"]
+            local_start = offline_tail["first_date"]
+            local_end = offline_tail["last_date"]
+            stored_dates = offline_tail["tail"]["date"]
+        elif existing is not None and not existing.empty:
             previous_rows = len(existing)
             local_start = existing["date"].min().normalize()
             local_end = existing["date"].max().normalize()
+            stored_dates = existing["date"]
+
+        if previous_rows > 0:
             range_before = {
                 "start": local_start.strftime("%Y-%m-%d"),
                 "end": local_end.strftime("%Y-%m-%d"),
@@ -1156,15 +1574,30 @@ class DataManager:
         else:
             segments_to_fetch.append((request_start, request_end))
 
+        # 紧接本地末尾的尾段向前多取 FACTOR_OVERLAP_DAYS 个已存交易日，
+        # 同一次请求里的前复权数据即可用来比对重叠日因子，不必再单独请求一次
+        overlap_start = None
+        if (
+            not force_full
+            and stored_dates is not None
+            and segments_to_fetch
+            and segments_to_fetch[-1][0] == local_end + timedelta(days=1)
+            and self._supports_factor_refresh(source)
+        ):
+            overlap_start = pd.to_datetime(stored_dates).sort_values().iloc[-self.FACTOR_OVERLAP_DAYS:].min().normalize()
+
         planned_ranges: List[Dict[str, str]] = []
         fetched_ranges: List[Dict[str, str]] = []
         missing_ranges: List[Dict[str, str]] = []
         fetched_kline_parts: List[pd.DataFrame] = []
         fetched_factor_parts: List[pd.DataFrame] = []
+        tail_factor_window = None
 
         for segment_start, segment_end in segments_to_fetch:
             if segment_end < segment_start:
                 continue
+            is_tail_segment = overlap_start is not None and segment_start == local_end + timedelta(days=1)
+            fetch_start = overlap_start if is_tail_segment else segment_start
 
             planned_ranges.append(
                 {
@@ -1175,12 +1608,14 @@ class DataManager:
 
             bundle = self._fetch_stock_bundle(
                 stock_code,
-                segment_start.strftime("%Y-%m-%d"),
+                fetch_start.strftime("%Y-%m-%d"),
                 source,
                 end_date=segment_end.strftime("%Y-%m-%d"),
             )
             segment_kline = self._slice_date_range(bundle.get("kline"), segment_start, segment_end)
             segment_factor = self._slice_date_range(bundle.get("factor"), segment_start, segment_end)
+            if is_tail_segment:
+                tail_factor_window = self._slice_date_range(bundle.get("factor"), fetch_start, segment_end)
 
             if segment_kline is not None and not segment_kline.empty:
                 fetched_kline_parts.append(segment_kline)
@@ -1214,7 +1649,7 @@ class DataManager:
                 "rows_before": previous_rows,
                 "rows_after": previous_rows,
                 "total_rows": previous_rows,
-                "latest_date": existing["date"].max().strftime("%Y-%m-%d"),
+                "latest_date": range_before["end"],
                 "offline_path": offline_path,
                 "requested_range": {
                     "start": request_start.strftime("%Y-%m-%d"),
@@ -1229,36 +1664,76 @@ class DataManager:
                 "local_file_changed": False,
             }
 
-        if force_full:
-            merged = pd.concat(fetched_kline_parts, ignore_index=True) if fetched_kline_parts else pd.DataFrame()
-        elif existing is not None and not existing.empty:
-            merged = pd.concat([existing] + fetched_kline_parts, ignore_index=True) if (existing is not None or fetched_kline_parts) else pd.DataFrame()
+        # 只在末尾追加新交易日时走追加写入，不必重新规范化并重写整段历史
+        new_rows = None
+        if not force_full and previous_rows > 0 and fetched_rows > 0:
+            if all(pd.Timestamp(item["start"]) > local_end for item in fetched_ranges):
+                new_rows = self._normalize_daily_kline(pd.concat(fetched_kline_parts, ignore_index=True))
+                if new_rows is not None:
+                    new_rows = new_rows[new_rows["date"] > local_end].reset_index(drop=True)
+                if new_rows is not None and new_rows.empty:
+                    new_rows = None
+
+        if new_rows is None and offline_tail is not None:
+            existing, existing_factor = self._load_offline_history(stock_code)
+            offline_tail = None
+
+        merged = None
+        if new_rows is not None:
+            base = existing
+            if offline_tail is not None:
+                # 追加路径只需已存因子的末尾几行：重叠比对与新行沿用最后一个因子
+                base = offline_tail["tail"]
+                existing_factor = base[["date", "factor"]]
+            factor_base = pd.concat([base[["date", "close"]], new_rows[["date", "close"]]], ignore_index=True)
         else:
-            merged = pd.concat(fetched_kline_parts, ignore_index=True) if fetched_kline_parts else pd.DataFrame()
-
-        merged = self._normalize_daily_kline(merged) if merged is not None and not merged.empty else None
-
-        if merged is None or merged.empty:
-            if existing is not None and not existing.empty and not force_full:
-                snapshot = self._attach_factor_column(existing, existing_factor)
-                snapshot["source"] = source
-                snapshot["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                save_snapshot = snapshot.copy()
-                save_snapshot["date"] = save_snapshot["date"].dt.strftime("%Y-%m-%d")
-                save_snapshot.to_csv(offline_path, index=False, encoding="utf-8")
-                self._offline_stock_codes_cache = None
-                self._offline_date_range_cache.pop(stock_code, None)
+            merged = self._merge_sync_kline(existing, fetched_kline_parts, force_full)
+
+            if merged is None or merged.empty:
+                if existing is not None and not existing.empty and not force_full:
+                    snapshot = self._attach_factor_column(existing, existing_factor)
+                    snapshot["source"] = source
+                    snapshot["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+                    save_snapshot = snapshot.copy()
+                    save_snapshot["date"] = save_snapshot["date"].dt.strftime("%Y-%m-%d")
+                    self._write_csv_atomic(save_snapshot, offline_path)
+                    self._offline_stock_codes_cache = None
+                    self._offline_date_range_cache.pop(stock_code, None)
+                    self.invalidate_stock_cache(stock_code)
+                    self._update_catalog_entry("offline", stock_code)
+
+                    return {
+                        "success": True,
+                        "stock_code": stock_code,
+                        "source": source,
+                        "message": "本地数据已覆盖所选区间，无需新增请求。",
+                        "added_rows": 0,
+                        "fetched_rows": 0,
+                        "total_rows": len(snapshot),
+                        "latest_date": snapshot["date"].max().strftime("%Y-%m-%d"),
+                        "offline_path": offline_path,
+                        "requested_range": {
+                            "start": request_start.strftime("%Y-%m-%d"),
+                            "end": request_end.strftime("%Y-%m-%d"),
+                        },
+                        "range_before": range_before,
+                        "range_after": range_before,
+                        "planned_ranges": planned_ranges,
+                        "fetched_ranges": fetched_ranges,
+                        "missing_ranges": missing_ranges,
+                        "factor_refresh_mode": "unchanged",
+                        "local_file_changed": False,
+                    }
 
                 return {
                     "success": True,
                     "stock_code": stock_code,
                     "source": source,
-                    "message": "本地数据已覆盖所选区间，无需新增请求。",
+                    "message": "没有获取到符合日期区间的在线数据。",
                     "added_rows": 0,
                     "fetched_rows": 0,
-                    "total_rows": len(snapshot),
-                    "latest_date": snapshot["date"].max().strftime("%Y-%m-%d"),
+                    "latest_date": existing["date"].max().strftime("%Y-%m-%d") if existing is not None and not existing.empty else None,
                     "offline_path": offline_path,
                     "requested_range": {
                         "start": request_start.strftime("%Y-%m-%d"),
@@ -1269,45 +1744,36 @@ class DataManager:
                     "planned_ranges": planned_ranges,
                     "fetched_ranges": fetched_ranges,
                     "missing_ranges": missing_ranges,
-                    "factor_refresh_mode": "unchanged",
+                    "factor_refresh_mode": "none",
                     "local_file_changed": False,
                 }
 
-            return {
-                "success": True,
-                "stock_code": stock_code,
-                "source": source,
-                "message": "没有获取到符合日期区间的在线数据。",
-                "added_rows": 0,
-                "fetched_rows": 0,
-                "latest_date": existing["date"].max().strftime("%Y-%m-%d") if existing is not None and not existing.empty else None,
-                "offline_path": offline_path,
-                "requested_range": {
-                    "start": request_start.strftime("%Y-%m-%d"),
-                    "end": request_end.strftime("%Y-%m-%d"),
-                },
-                "range_before": range_before,
-                "range_after": range_before,
-                "planned_ranges": planned_ranges,
-                "fetched_ranges": fetched_ranges,
-                "missing_ranges": missing_ranges,
-                "factor_refresh_mode": "none",
-                "local_file_changed": False,
-            }
+            factor_base = merged
 
         factor_refresh_mode = "carried_forward"
         merged_factor = None
         if self._supports_factor_refresh(source):
             try:
-                merged_factor = self._fetch_factor_range(
-                    stock_code=stock_code,
-                    source=source,
-                    start_date=merged["date"].min().strftime("%Y-%m-%d"),
-                    end_date=merged["date"].max().strftime("%Y-%m-%d"),
-                    base_df=merged,
-                )
-                if merged_factor is not None and not merged_factor.empty:
-                    factor_refresh_mode = "full_range_refreshed"
+                if new_rows is not None and existing_factor is not None and not existing_factor.empty:
+                    merged_factor = self._refresh_factor_tail(existing_factor, tail_factor_window)
+                    if merged_factor is not None:
+                        factor_refresh_mode = "tail_refreshed"
+
+                if merged_factor is None:
+                    if offline_tail is not None:
+                        # 重叠日因子不一致（除权）或无法比对，全量刷新需要整段收盘价
+                        existing, existing_factor = self._load_offline_history(stock_code)
+                        offline_tail = None
+                        factor_base = pd.concat([existing[["date", "close"]], new_rows[["date", "close"]]], ignore_index=True)
+                    merged_factor = self._fetch_factor_range(
+                        stock_code=stock_code,
+                        source=source,
+                        start_date=factor_base["date"].min().strftime("%Y-%m-%d"),
+                        end_date=factor_base["date"].max().strftime("%Y-%m-%d"),
+                        base_df=factor_base,
+                    )
+                    if merged_factor is not None and not merged_factor.empty:
+                        factor_refresh_mode = "full_range_refreshed"
             except Exception as exc:
                 print(f"刷新 {stock_code} 全量复权因子失败: {exc}")
                 merged_factor = None
@@ -1323,22 +1789,57 @@ class DataManager:
             else:
                 factor_refresh_mode = "default_ones"
 
-        merged = self._attach_factor_column(merged, merged_factor)
-
-        merged["source"] = source
-        merged["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        write_mode = "rewrite"
+        if new_rows is not None:
+            # 刷新后的因子与已存因子不一致说明期间发生了除权，需要整体重写
+            factors_unchanged = factor_refresh_mode != "full_range_refreshed" or self._factors_consistent(existing_factor, merged_factor)
+            columnar_cache = self._load_columnar_cache(offline_path) if factors_unchanged else None
+            appended = None
+            if factors_unchanged:
+                appended = self._append_offline_rows(offline_path, existing_factor, new_rows, merged_factor, source)
+            if appended is not None:
+                write_mode = "append"
+                rows_after = previous_rows + len(new_rows)
+                range_after = {
+                    "start": range_before["start"],
+                    "end": new_rows["date"].max().strftime("%Y-%m-%d"),
+                }
+                self._extend_columnar_cache(offline_path, columnar_cache, *appended)
+            else:
+                if offline_tail is not None:
+                    # 只读了末尾几行，重写前补回整段历史与已存因子
+                    existing, stored_factor = self._load_offline_history(stock_code)
+                    factor_parts = [part for part in (stored_factor, merged_factor) if part is not None and not part.empty]
+                    if factor_parts:
+                        merged_factor = pd.concat(factor_parts, ignore_index=True)
+                        merged_factor["date"] = pd.to_datetime(merged_factor["date"])
+                        merged_factor = merged_factor.sort_values("date").drop_duplicates(subset=["date"], keep="last").reset_index(drop=True)
+                merged = self._merge_sync_kline(existing, fetched_kline_parts, force_full)
+
+        if write_mode == "rewrite":
+            merged = self._attach_factor_column(merged, merged_factor)
+
+            merged["source"] = source
+            merged["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            save_df = merged.copy()
+            save_df["date"] = save_df["date"].dt.strftime("%Y-%m-%d")
+            self._write_csv_atomic(save_df, offline_path)
+            rows_after = len(merged)
+            range_after = {
+                "start": merged["date"].min().strftime("%Y-%m-%d"),
+                "end": merged["date"].max().strftime("%Y-%m-%d"),
+            }
 
-        save_df = merged.copy()
-        save_df["date"] = save_df["date"].dt.strftime("%Y-%m-%d")
-        save_df.to_csv(offline_path, index=False, encoding="utf-8")
         self._offline_stock_codes_cache = None
         self._offline_date_range_cache.pop(stock_code, None)
+        self.invalidate_stock_cache(stock_code)
+        if write_mode == "append" and offline_tail is not None:
+            self._advance_catalog_entry("offline", offline_tail["entry"], offline_path, range_after["end"], len(new_rows))
+        else:
+            self._update_catalog_entry("offline", stock_code)
 
-        added_rows = max(0, len(merged) - previous_rows)
-        range_after = {
-            "start": merged["date"].min().strftime("%Y-%m-%d"),
-            "end": merged["date"].max().strftime("%Y-%m-%d"),
-        }
+        added_rows = max(0, rows_after - previous_rows)
 
         if force_full:
             message = "已按所选日期区间全量重建离线数据。"
@@ -1355,9 +1856,9 @@ class DataManager:
             "added_rows": added_rows,
             "fetched_rows": fetched_rows,
             "rows_before": previous_rows,
-            "rows_after": len(merged),
-            "total_rows": len(merged),
-            "latest_date": merged["date"].max().strftime("%Y-%m-%d"),
+            "rows_after": rows_after,
+            "total_rows": rows_after,
+            "latest_date": range_after["end"],
             "offline_path": offline_path,
             "requested_range": {
                 "start": request_start.strftime("%Y-%m-%d"),
@@ -1369,9 +1870,272 @@ class DataManager:
             "fetched_ranges": fetched_ranges,
             "missing_ranges": missing_ranges,
             "factor_refresh_mode": factor_refresh_mode,
+            "write_mode": write_mode,
             "local_file_changed": True,
         }
 
+    def _load_offline_history(self, stock_code: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        """加载整段离线日线与已存复权因子，用于需要重写文件的同步路径。"""
+        existing = self.get_stock_data(stock_code, source="offline", interval="daily")
+        existing_factor = self.get_factor_data(stock_code, source="offline", interval="daily")
+        if existing is not None and not existing.empty:
+            existing = existing.copy()
+            existing["date"] = pd.to_datetime(existing["date"])
+        return existing, existing_factor
+
+    def _read_offline_tail(self, stock_code: str, offline_path: str) -> Optional[Dict]:
+        """追加同步所需的本地状态：目录索引中的日期范围与行数，加上文件末尾 FACTOR_OVERLAP_DAYS 行。
+
+        只处理同步写出的 UTF-8 离线文件（表头含 date/close/factor）；索引与文件签名不一致时
+        重新登记该文件。表头不兼容或末尾行无法解析时返回 None，由调用方加载整段历史。
+        """
+        if not os.path.exists(offline_path):
+            return None
+        header = self._read_utf8_csv_header(offline_path)
+        if not header or not {"date", "close", "factor"}.issubset(header):
+            return None
+
+        try:
+            stat = os.stat(offline_path)
+            entry = self.catalog.get_entry("offline", stock_code)
+            if entry is None or (entry["mtime_ns"], entry["file_size"]) != (stat.st_mtime_ns, stat.st_size):
+                entry = self._build_catalog_entry(stock_code, offline_path)
+            if not entry.get("first_date") or not entry.get("row_count"):
+                return None
+            lines = self._read_last_lines(offline_path, min(self.FACTOR_OVERLAP_DAYS, entry["row_count"]))
+        except Exception as e:
+            print(f"读取离线文件 {offline_path} 末尾失败: {e}")
+            return None
+
+        rows = list(csv.reader(lines))
+        if not rows or any(len(row) != len(header) for row in rows):
+            return None
+        raw = pd.DataFrame(rows, columns=header)
+        tail = pd.DataFrame(
+            {
+                "date": self._parse_date_series(raw["date"]),
+                "close": pd.to_numeric(raw["close"], errors="coerce"),
+                "factor": pd.to_numeric(raw["factor"], errors="coerce"),
+            }
+        )
+        if tail.isna().any().any() or not tail["date"].is_monotonic_increasing:
+            return None
+        last_date = tail["date"].iloc[-1].normalize()
+        if last_date.strftime("%Y-%m-%d") != entry.get("last_date"):
+            return None
+
+        return {
+            "entry": entry,
+            "tail": tail,
+            "row_count": int(entry["row_count"]),
+            "first_date": pd.Timestamp(entry["first_date"]),
+            "last_date": last_date,
+        }
+
+    def _read_last_lines(self, path: str, count: int, encoding: str = "utf-8") -> List[str]:
+        """从文件末尾按块向前读取，返回最后 count 个非空行（保持文件中的顺序）。"""
+        with open(path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            position = file.tell()
+            buffer = b""
+
+            while position > 0:
+                read_size = min(4096, position)
+                position -= read_size
+                file.seek(position)
+                buffer = file.read(read_size) + buffer
+                lines = [line for line in buffer.splitlines() if line.strip()]
+                # 块首的一行可能不完整，多读出一行或读到文件开头才返回
+                if len(lines) > count or position == 0:
+                    return [line.decode(encoding) for line in lines[-count:]]
+
+        return []
+
+    def _advance_catalog_entry(self, dataset: str, entry: Dict, path: str, last_date: str, added_rows: int):
+        """追加写入后直接更新目录索引的末日、行数与文件签名，不再重新扫描文件。"""
+        try:
+            stat = os.stat(path)
+            updated = dict(entry)
+            updated.update(
+                last_date=last_date,
+                row_count=int(entry["row_count"]) + added_rows,
+                mtime_ns=stat.st_mtime_ns,
+                file_size=stat.st_size,
+            )
+            self.catalog.upsert(dataset, [updated])
+        except Exception as e:
+            print(f"更新目录索引 {dataset}/{entry.get('stock_code')} 失败: {e}")
+
+    def _extend_columnar_cache(
+        self,
+        csv_path: str,
+        cached: Optional[pd.DataFrame],
+        appended: pd.DataFrame,
+        signature: Dict,
+    ) -> bool:
+        """把追加的行接到追加前仍有效的列式缓存末尾，下次读取不必重新解析整份 CSV。
+
+        新行按读取 CSV 时相同的规则规范化；列或类型与缓存不一致时放弃，由下次读取整体重建。
+        """
+        if cached is None:
+            return False
+        rows = self._normalize_offline_data(appended)
+        if rows is None or len(rows) != len(appended) or any(column not in rows.columns for column in cached.columns):
+            return False
+        extended = pd.concat([cached, rows[list(cached.columns)]], ignore_index=True)
+        if not extended.dtypes.equals(cached.dtypes):
+            return False
+        return self._save_columnar_cache(csv_path, extended, signature)
+
+    def _merge_sync_kline(
+        self,
+        existing: Optional[pd.DataFrame],
+        fetched_kline_parts: List[pd.DataFrame],
+        force_full: bool,
+    ) -> Optional[pd.DataFrame]:
+        if force_full or existing is None or existing.empty:
+            merged = pd.concat(fetched_kline_parts, ignore_index=True) if fetched_kline_parts else pd.DataFrame()
+        else:
+            merged = pd.concat([existing] + fetched_kline_parts, ignore_index=True)
+        return self._normalize_daily_kline(merged) if not merged.empty else None
+
+    def _refresh_factor_tail(
+        self,
+        existing_factor: pd.DataFrame,
+        window: Optional[pd.DataFrame],
+    ) -> Optional[pd.DataFrame]:
+        """用尾段请求取得的因子（向前重叠 FACTOR_OVERLAP_DAYS 个已存交易日）接续已存因子。
+
+        前复权在除权后会整体改写历史比例，重叠日一致时直接在已存因子后接上新区间；
+        不一致或没有重叠时返回 None，由调用方全量刷新。
+        """
+        if window is None or window.empty:
+            return None
+        stored = existing_factor[["date", "factor"]].copy()
+        stored["date"] = pd.to_datetime(stored["date"])
+        stored = stored.sort_values("date").reset_index(drop=True)
+        window = window[["date", "factor"]].copy()
+        window["date"] = pd.to_datetime(window["date"])
+        if window["date"].max() <= stored["date"].iloc[-1] or not self._factors_consistent(stored, window):
+            return None
+
+        additions = window[window["date"] > stored["date"].iloc[-1]]
+        return pd.concat([stored, additions[["date", "factor"]]], ignore_index=True)
+
+    def _factors_consistent(self, stored: Optional[pd.DataFrame], refreshed: Optional[pd.DataFrame]) -> bool:
+        """比较重叠日期上的已存因子与新取得的因子，一致说明没有新的除权除息。"""
+        if stored is None or stored.empty or refreshed is None or refreshed.empty:
+            return False
+        overlap = pd.merge(
+            stored[["date", "factor"]],
+            refreshed[["date", "factor"]].assign(date=lambda df: pd.to_datetime(df["date"])),
+            on="date",
+            how="inner",
+            suffixes=("_stored", "_refreshed"),
+        )
+        if overlap.empty:
+            return False
+        return bool(np.allclose(
+            overlap["factor_stored"].to_numpy(dtype=float),
+            overlap["factor_refreshed"].to_numpy(dtype=float),
+            rtol=1e-6,
+            atol=1e-9,
+            equal_nan=True,
+        ))
+
+    def _read_utf8_csv_header(self, path: str) -> Optional[List[str]]:
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as file:
+                header = next(csv.reader(file), None)
+        except (OSError, UnicodeDecodeError):
+            return None
+        if not header:
+            return None
+        return [col.lstrip("\ufeff").strip() for col in header]
+
+    def _append_offline_rows(
+        self,
+        offline_path: str,
+        existing_factor: Optional[pd.DataFrame],
+        new_rows: pd.DataFrame,
+        factor_df: Optional[pd.DataFrame],
+        source: str,
+    ) -> Optional[Tuple[pd.DataFrame, Dict]]:
+        """把新交易日追加到离线文件末尾，返回 (按文件列顺序写入的行, 写入后的文件签名)；
+        列不兼容时返回 None，由调用方整体重写。"""
+        header = self._read_utf8_csv_header(offline_path)
+        if not header or "date" not in header or "factor" not in header:
+            return None
+
+        tail = new_rows.copy()
+        if factor_df is not None and not factor_df.empty:
+            factors = factor_df[["date", "factor"]].copy()
+            factors["date"] = pd.to_datetime(factors["date"])
+            tail = pd.merge(tail, factors, on="date", how="left")
+        else:
+            tail["factor"] = np.nan
+
+        # 新交易日缺失的因子沿用已存的最后一个因子，与整体合并后 ffill 的结果一致
+        last_factor = 1.0
+        if existing_factor is not None and not existing_factor.empty:
+            stored = pd.to_numeric(existing_factor["factor"], errors="coerce").dropna()
+            if not stored.empty:
+                last_factor = float(stored.iloc[-1])
+        tail["factor"] = pd.to_numeric(tail["factor"], errors="coerce").ffill().fillna(last_factor)
+        tail["source"] = source
+        tail["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        if any(column not in header for column in tail.columns):
+            return None
+        for column in header:
+            if column not in tail.columns:
+                tail[column] = np.nan
+
+        tail["date"] = tail["date"].dt.strftime("%Y-%m-%d")
+        tail = tail[header]
+        signature = self._append_csv_atomic(offline_path, tail.to_csv(index=False, header=False))
+        return tail, signature
+
+    def _get_temp_path(self, path: str) -> str:
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _write_csv_atomic(self, data: pd.DataFrame, path: str):
+        """先写同目录临时文件再替换，读取方不会看到写了一半的 CSV。"""
+        temp_path = self._get_temp_path(path)
+        try:
+            data.to_csv(temp_path, index=False, encoding="utf-8")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _append_csv_atomic(self, path: str, text: str) -> Dict:
+        """复制原文件字节并追加新行，fsync 后整体替换，不解析已有内容。
+
+        读取方与崩溃恢复只会看到追加前或追加后的完整文件；返回替换后文件的签名。
+        """
+        temp_path = self._get_temp_path(path)
+        try:
+            shutil.copyfile(path, temp_path)
+            with open(temp_path, "rb") as file:
+                file.seek(0, os.SEEK_END)
+                needs_newline = file.tell() > 0
+                if needs_newline:
+                    file.seek(-1, os.SEEK_END)
+                    needs_newline = file.read(1) not in (b"\n", b"\r")
+            with open(temp_path, "a", encoding="utf-8", newline="") as file:
+                if needs_newline:
+                    file.write(os.linesep)
+                file.write(text)
+                file.flush()
+                os.fsync(file.fileno())
+            signature = self._get_source_signature(temp_path)
+            os.replace(temp_path, path)
+            return signature
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
     def batch_download_data(self, stock_codes: List[str] = None, start_date: str = "2010-01-01"):
         """批量下载股票数据。"""
         if stock_codes is None:
@@ -1400,4 +2164,11 @@ def download_all_data():
 
 
 if __name__ == "__main__":
-    download_all_data()
+    if len(sys.argv) > 1 and sys.argv[1] == "convert":
+        DataManager().convert_to_columnar_cache(sys.argv[2:] or None)
+    elif len(sys.argv) > 1 and sys.argv[1] == "catalog":
+        manager = DataManager()
+        for dataset in sys.argv[2:] or ["offline", "kline_raw"]:
+            print(dataset, manager.refresh_catalog(dataset))
+    else:
+        download_all_data()
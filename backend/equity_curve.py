@@ -0,0 +1,109 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class EquityCurve:
+    """训练会话的逐K线资金曲线，保存在预分配的 NumPy 结构化数组中。
+
+    每根K线只占一行，不访问数据库；同一根K线再次写入（成交后、会话结束时）覆盖该行，
+    使每行都是该K线收盘时的最终账户状态。pending_rows 返回尚未落库的行，由调用方
+    每隔若干根K线或在会话结束时一次性 executemany 写入 bar_history，写入成功后再调用
+    mark_flushed，失败的行留到下一次继续写入。
+    """
+
+    DTYPE = np.dtype([
+        ("bar_id", "i8"),
+        ("date", "U10"),
+        ("open", "f8"),
+        ("high", "f8"),
+        ("low", "f8"),
+        ("close", "f8"),
+        ("volume", "f8"),
+        ("total_assets", "f8"),
+        ("available_cash", "f8"),
+        ("position_value", "f8"),
+        ("floating_pnl", "f8"),
+        ("total_shares", "i8"),
+        ("average_cost", "f8"),
+    ])
+
+    def __init__(self, capacity: int = 256):
+        self._rows = np.zeros(max(1, capacity), dtype=self.DTYPE)
+        self.size = 0
+        self.flushed = 0
+
+    def reserve(self, capacity: int):
+        """按会话K线数量预先分配，避免推进过程中扩容。"""
+        if capacity > len(self._rows):
+            rows = np.zeros(capacity, dtype=self.DTYPE)
+            rows[: self.size] = self._rows[: self.size]
+            self._rows = rows
+
+    def append(
+        self,
+        bar_id: int,
+        date: str,
+        bar: Dict,
+        total_assets: float,
+        available_cash: float,
+        position_value: float,
+        floating_pnl: float,
+        total_shares: int,
+        average_cost: float,
+    ):
+        if self.size and self._rows[self.size - 1]["bar_id"] == bar_id:
+            # 覆盖当前K线；若该行已落库，退回 flushed 使其随下一批重新写入
+            index = self.size - 1
+            self.flushed = min(self.flushed, index)
+        else:
+            if self.size >= len(self._rows):
+                self.reserve(len(self._rows) * 2)
+            index = self.size
+            self.size += 1
+        self._rows[index] = (
+            bar_id,
+            date,
+            bar.get("open", 0.0),
+            bar.get("high", 0.0),
+            bar.get("low", 0.0),
+            bar.get("close", 0.0),
+            bar.get("volume", 0.0),
+            total_assets,
+            available_cash,
+            position_value,
+            floating_pnl,
+            total_shares,
+            average_cost,
+        )
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows[: self.size]
+
+    @property
+    def pending(self) -> int:
+        return self.size - self.flushed
+
+    def pending_rows(self) -> List[Tuple]:
+        """返回尚未落库的行（按 bar_history 的列顺序），不改变落库位置。"""
+        return self._rows[self.flushed : self.size].tolist()
+
+    def mark_flushed(self, count: int):
+        """pending_rows 返回的前 count 行已提交到数据库。"""
+        self.flushed = min(self.size, self.flushed + count)
+
+    def to_series(self) -> Dict[str, List]:
+        """报告用的资金曲线，按列返回以减小 JSON 体积。"""
+        rows = self.rows
+        return {
+            "bar_id": rows["bar_id"].tolist(),
+            "date": rows["date"].tolist(),
+            "total_assets": rows["total_assets"].tolist(),
+            "available_cash": rows["available_cash"].tolist(),
+            "position_value": rows["position_value"].tolist(),
+        }
+
+    def reset(self):
+        self.size = 0
+        self.flushed = 0
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+
+class FrameCache:
+    """进程内共享的 LRU 缓存，按字节预算淘汰，保存规范化后的 K 线/因子数据。
+
+    每个条目记录写入时源文件的签名（mtime、大小），读取时签名不一致即视为失效；
+    所有操作都在同一把锁内完成，可被多个训练会话线程同时使用。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def estimate_bytes(value: Dict) -> int:
+        """估算一个数据包中所有 DataFrame 占用的内存。"""
+        total = 0
+        for item in value.values():
+            if isinstance(item, pd.DataFrame):
+                total += int(item.memory_usage(index=True, deep=True).sum())
+        return total
+
+    def get(self, key: Hashable, signature) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["signature"] != signature:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def put(self, key: Hashable, value: Dict, signature) -> bool:
+        size = self.estimate_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return False
+
+            self._entries[key] = {"value": value, "signature": signature, "size": size}
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """移除所有满足 predicate(key) 的条目，返回移除数量。"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry["size"]
@@ -72,6 +72,10 @@ class HistoryManager:
                 FOREIGN KEY (session_id) REFERENCES training_sessions (session_id)
             )
         ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bar_history_session_bar
+            ON bar_history (session_id, bar_id)
+        ''')
         
         # 创建交易历史表（记录每笔交易）
         cursor.execute('''
@@ -185,6 +189,57 @@ class HistoryManager:
             print(f"记录bar状态失败: {e}")
             return False
     
+    def record_bar_states(self, username: str, session_id: str, rows: List[tuple]) -> bool:
+        """批量记录bar状态，rows 为 EquityCurve.pending_rows() 返回的行（按 bar_id 递增）。
+
+        第一行可能是已落库后又被覆盖的当前K线，先删除本会话从该 bar_id 起的旧记录再写入。
+        """
+        if not rows:
+            return True
+        try:
+            self._init_user_history_db(username)
+            db_path = self._get_user_db_path(username)
+            
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                'DELETE FROM bar_history WHERE session_id = ? AND bar_id >= ?',
+                (session_id, rows[0][0])
+            )
+            cursor.executemany('''
+                INSERT INTO bar_history 
+                (session_id, bar_id, date, open_price, high_price, low_price, close_price, volume,
+                 total_assets, available_cash, position_value, floating_pnl, total_shares, average_cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(session_id,) + tuple(row) for row in rows])
+            
+            conn.commit()
+            conn.close()
+            
+            return True
+        except Exception as e:
+            print(f"批量记录bar状态失败: {e}")
+            return False
+    
+    def clear_bar_states(self, username: str, session_id: str) -> bool:
+        """删除会话已记录的bar状态（重置训练时调用）"""
+        try:
+            db_path = self._get_user_db_path(username)
+            if not os.path.exists(db_path):
+                return True
+            
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM bar_history WHERE session_id = ?', (session_id,))
+            conn.commit()
+            conn.close()
+            
+            return True
+        except Exception as e:
+            print(f"删除bar状态失败: {e}")
+            return False
+    
     def record_trade(self, username: str, session_id: str, trade_data: Dict) -> bool:
         """记录交易"""
         try:
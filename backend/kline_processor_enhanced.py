@@ -3,9 +3,30 @@ from typing import Dict, List, Optional
 import numpy as np
 import pandas as pd
 
+from backend.chip_distribution import ChipDistribution
+from backend.timeframe_engine import TimeframeEngine
+
 
 class KLineProcessorEnhanced:
-    """负责训练视图中的 K 线、复权、指标与筹码分布计算。"""
+    """负责训练视图中的 K 线、复权、指标与筹码分布计算。
+
+    日K视图的均线和技术指标在会话开始时按全区间一次性算好，之后每根K线只做数组截取。
+    不复权、前复权、后复权的 OHLC 在构造时算成连续数组，动态前复权按当前因子缓存一份。
+    周/月/季/N日视图由 TimeframeEngine 预先算好的分组偏移聚合：已结束的周期整体缓存，
+    只有当前周期随每根日K线滚动更新。
+    筹码分布在固定价格网格上随K线推进增量更新，复权模式只影响输出时的价格换算；
+    每 CHIP_CHECKPOINT_INTERVAL 根K线保存一次快照，查询历史筹码最多重放这么多根。
+    """
+
+    PRICE_COLUMNS = ("open", "high", "low", "close")
+    CHIP_CHECKPOINT_INTERVAL = 50  # 每推进多少根K线保存一次筹码快照
+
+    INDICATOR_DEFAULTS = {
+        "MACD": {"fast": 12, "slow": 26, "signal": 9},
+        "KDJ": {"n": 9, "m1": 3, "m2": 3},
+        "RSI": {"periods": (6, 12, 24)},
+        "BOLL": {"period": 20, "std_dev": 2},
+    }
 
     def __init__(
         self,
@@ -14,6 +35,7 @@ class KLineProcessorEnhanced:
         start_date: str,
         source: str = "akshare",
         interval: str = "daily",
+        bundle: Optional[Dict] = None,
     ):
         self.data_manager = data_manager
         self.stock_code = stock_code
@@ -23,8 +45,11 @@ class KLineProcessorEnhanced:
         self.adjustment_mode = "forward"
         self.factor_changed = False
 
-        self.raw_data = data_manager.get_stock_data(stock_code, source=source, interval=interval)
-        self.factor_data = data_manager.get_factor_data(stock_code, source=source, interval=interval)
+        # 训练开始时校验阶段已加载过的数据包直接复用，避免同一文件被重复解析
+        if bundle is None:
+            bundle = data_manager.load_bundle(stock_code, source=source, interval=interval)
+        self.raw_data = bundle["kline"] if bundle else None
+        self.factor_data = bundle["factor"] if bundle else None
         self.dividend_data = data_manager.get_dividend_data(stock_code)
 
         if self.raw_data is None or self.raw_data.empty:
@@ -49,6 +74,21 @@ class KLineProcessorEnhanced:
 
         self._prepare_adjustment_data()
 
+        self._factors = self.full_data["factor"].to_numpy(dtype=float)
+        self._bar_times = self.full_data["date"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+        self._bar_ids = np.arange(len(self.full_data), dtype=np.int64) + self.bar_id_offset
+        self._volumes = self.full_data["volume"].to_numpy(dtype=float)
+        self._raw_prices = {col: self.full_data[col].to_numpy(dtype=float) for col in self.PRICE_COLUMNS}
+        self._adjusted_prices: Dict = {mode: self._calculate_adjusted_prices(mode) for mode in ("none", "forward", "backward")}
+        self._full_adjusted_cache: Dict = {}
+        self._timeframes = TimeframeEngine(self.full_data["date"])
+        self._period_cache: Dict[tuple, Dict[str, np.ndarray]] = {}
+        self._chip_sources: Dict[tuple, Dict[str, np.ndarray]] = {}
+        self._chip_trackers: Dict[tuple, Dict] = {}
+        self._ma_cache: Dict[tuple, np.ndarray] = {}
+        self._indicator_cache: Dict[tuple, Dict[str, np.ndarray]] = {}
+        self._warm_indicator_cache()
+
     def _prepare_adjustment_data(self):
         if self.factor_data is not None and not self.factor_data.empty:
             factor_df = self.factor_data[["date", "factor"]].copy()
@@ -58,163 +98,173 @@ class KLineProcessorEnhanced:
         else:
             self.full_data["factor"] = 1.0
 
-    def _calculate_adjusted_prices(self, data: pd.DataFrame, mode: str) -> pd.DataFrame:
-        if data is None or data.empty:
-            return pd.DataFrame(columns=["date", "open", "high", "low", "close", "volume"])
-
-        result = data.copy()
+    def _calculate_adjusted_prices(self, mode: str) -> Dict[str, np.ndarray]:
+        """计算全区间复权后的 OHLC 数组。"""
         if mode == "none":
-            return result[[col for col in ["date", "open", "high", "low", "close", "volume", "amount"] if col in result.columns]].copy()
+            return self._raw_prices
 
         if mode == "forward":
-            latest_factor = self.full_data.iloc[-1]["factor"]
-            result["adj_ratio"] = result["factor"] / latest_factor
+            adj_ratio = self._factors / self._factors[-1]
         elif mode == "backward":
-            base_factor = result.iloc[0]["factor"]
-            result["adj_ratio"] = result["factor"] / base_factor
+            adj_ratio = self._factors / self._factors[0]
         elif mode == "dynamic_forward":
-            current_factor = self.full_data.iloc[self.current_index]["factor"]
-            result["adj_ratio"] = result["factor"] / current_factor
+            adj_ratio = self._factors / self._factors[self.current_index]
         else:
             raise ValueError(f"无效的复权模式: {mode}")
 
-        for col in ["open", "high", "low", "close"]:
-            result[col] = (result[col] * result["adj_ratio"]).round(2)
-
-        keep_cols = [col for col in ["date", "open", "high", "low", "close", "volume", "amount"] if col in result.columns]
-        return result[keep_cols].copy()
+        return {col: np.round(values * adj_ratio, 2) for col, values in self._raw_prices.items()}
 
     def set_adjustment(self, mode: str):
         if mode not in {"none", "forward", "backward", "dynamic_forward"}:
             raise ValueError(f"无效的复权模式: {mode}")
         self.adjustment_mode = mode
 
+    def get_current_factor(self) -> float:
+        return float(self._factors[self.current_index])
+
+    def get_rescale_ratio(self, from_factor: float) -> float:
+        """动态前复权下，把按 from_factor 复权的历史价格换算到当前因子的比例。
+
+        价格、均线、BOLL、MACD 都与价格成正比，KDJ 和 RSI 与价格尺度无关，
+        因此因子变化后已下发的历史数据乘以该比例即可，无需重新下发。
+        """
+        return float(from_factor) / self.get_current_factor()
+
     def get_current_bar_id(self) -> int:
         return self.current_index + self.bar_id_offset
 
-    def _resample_view_frame(self, data: pd.DataFrame, view_period: str = "daily") -> pd.DataFrame:
-        if data is None or data.empty or view_period != "weekly":
-            return data.reset_index(drop=True) if data is not None else pd.DataFrame()
-
-        frame = data.copy().sort_values("date").set_index("date")
-        aggregations = {
-            "open": "first",
-            "high": "max",
-            "low": "min",
-            "close": "last",
-            "volume": "sum",
-        }
-        if "amount" in frame.columns:
-            aggregations["amount"] = "sum"
+    def _is_daily_view(self, view_period: str) -> bool:
+        return TimeframeEngine.normalize(view_period) == "daily"
+
+    def _period_source_columns(self) -> Dict[str, np.ndarray]:
+        columns = dict(self._get_adjusted_prices())
+        columns["volume"] = self._volumes
+        if "amount" in self.full_data.columns:
+            columns["amount"] = self.full_data["amount"].to_numpy(dtype=float)
+        return columns
+
+    def _get_period_frame(self, view_period: str, full: bool = False) -> pd.DataFrame:
+        """按周期聚合的K线。已结束的周期按（周期, 复权键）缓存，当前周期只聚合已揭示的日K线。"""
+        view_period = TimeframeEngine.normalize(view_period)
+        index = self._timeframes.get_index(view_period)
+        cache_key = (view_period, self._adjustment_key())
+        if cache_key not in self._period_cache:
+            self._period_cache[cache_key] = index.aggregate(self._period_source_columns())
+        completed = self._period_cache[cache_key]
+
+        if full:
+            count = len(index)
+            columns = completed
+        else:
+            count = index.count_until(self.current_index)
+            running = index.aggregate(self._period_source_columns(), first_bucket=count - 1, end=self.current_index + 1)
+            columns = {name: np.append(values[: count - 1], running[name]) for name, values in completed.items()}
 
-        weekly = frame.resample("W-FRI").agg(aggregations)
-        weekly = weekly.dropna(subset=["open", "high", "low", "close"])
-        return weekly.reset_index()
+        frame = pd.DataFrame({"date": index.labels[:count]})
+        for name, values in columns.items():
+            frame[name] = values
+        return frame
 
-    def _build_bar_meta(self, data: pd.DataFrame) -> List[Dict]:
+    def is_new_period(self, view_period: str = "weekly") -> bool:
+        """当前日K线是否开启了 view_period 下的新周期。"""
+        return self._timeframes.get_index(view_period).is_bucket_start(self.current_index)
+
+    def _frame_bar_index(self, data: pd.DataFrame):
+        """返回图表时间戳与 bar ID 数组，bar ID 以第一根非预览K线为 1。"""
         if data is None or data.empty:
-            return []
-
-        dates = pd.to_datetime(data["date"])
-        preview_count = int((dates < self.start_date).sum())
-        meta: List[Dict] = []
-        for index, current_date in enumerate(dates):
-            bar_id = index - preview_count + 1
-            meta.append(
-                {
-                    "time": int(pd.Timestamp(current_date).timestamp()),
-                    "bar_id": bar_id,
-                    "is_preview": bar_id <= 0,
-                }
-            )
-        return meta
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
 
-    def _get_adjusted_frame(self, view_period: str = "daily", full: bool = False) -> pd.DataFrame:
-        source_frame = self.full_data.copy() if full else self.full_data.iloc[: self.current_index + 1].copy()
-        adjusted = self._calculate_adjusted_prices(source_frame, self.adjustment_mode)
-        return self._resample_view_frame(adjusted, view_period=view_period)
-
-    def _to_chart_rows(self, data: pd.DataFrame) -> List[Dict]:
-        meta = self._build_bar_meta(data)
-        chart_data = []
-        for index, (_, row) in enumerate(data.iterrows()):
-            current_meta = meta[index]
-            chart_data.append(
-                {
-                    "time": current_meta["time"],
-                    "open": float(row["open"]),
-                    "high": float(row["high"]),
-                    "low": float(row["low"]),
-                    "close": float(row["close"]),
-                    "volume": float(row["volume"]),
-                    "bar_id": current_meta["bar_id"],
-                    "is_preview": current_meta["is_preview"],
-                }
-            )
-        return chart_data
+        dates = pd.to_datetime(data["date"]).to_numpy(dtype="datetime64[s]")
+        preview_count = int((dates < np.datetime64(self.start_date, "s")).sum())
+        times = dates.astype(np.int64)
+        bar_ids = np.arange(len(dates), dtype=np.int64) - preview_count + 1
+        return times, bar_ids
 
-    def get_visible_data(self, view_period: str = "daily") -> List[Dict]:
+    def _get_adjusted_frame(self, view_period: str = "daily", full: bool = False) -> pd.DataFrame:
+        if not self._is_daily_view(view_period):
+            return self._get_period_frame(view_period, full=full)
+        adjusted = self._get_full_adjusted_frame()
+        if not full:
+            adjusted = adjusted.iloc[: self.current_index + 1]
+        return adjusted.reset_index(drop=True)
+
+    def _tail_start(self, bar_ids: np.ndarray, since_bar_id: Optional[int] = None) -> int:
+        """since_bar_id 之后第一行的位置；不传时从头开始。"""
+        if since_bar_id is None:
+            return 0
+        return int(np.searchsorted(bar_ids, since_bar_id, side="right"))
+
+    def _to_chart_rows(self, data: pd.DataFrame, since_bar_id: Optional[int] = None, layout: str = "rows"):
+        times, bar_ids = self._frame_bar_index(data)
+        start = self._tail_start(bar_ids, since_bar_id)
+        columns = {col: data[col].to_numpy(dtype=float)[start:] for col in ["open", "high", "low", "close", "volume"]}
+        return self._serialize_series(times[start:], bar_ids[start:], columns, layout=layout)
+
+    def get_visible_data(self, view_period: str = "daily", since_bar_id: Optional[int] = None, layout: str = "rows"):
         adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
-        return self._to_chart_rows(adjusted)
+        return self._to_chart_rows(adjusted, since_bar_id=since_bar_id, layout=layout)
 
-    def get_volume_data(self, view_period: str = "daily") -> List[Dict]:
+    def get_volume_data(self, view_period: str = "daily", since_bar_id: Optional[int] = None, layout: str = "rows"):
         adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
-        meta = self._build_bar_meta(adjusted)
-        volume_data = []
-        for index, (_, row) in enumerate(adjusted.iterrows()):
-            current_meta = meta[index]
-            if row["close"] > row["open"]:
-                color = "#ff4d4f"
-            elif row["close"] < row["open"]:
-                color = "#008000"
-            else:
-                color = "#000000"
-            volume_data.append(
-                {
-                    "time": current_meta["time"],
-                    "value": float(row["volume"]),
-                    "color": color,
-                    "bar_id": current_meta["bar_id"],
-                    "is_preview": current_meta["is_preview"],
-                }
-            )
-        return volume_data
+        times, bar_ids = self._frame_bar_index(adjusted)
+        start = self._tail_start(bar_ids, since_bar_id)
+        open_prices = adjusted["open"].to_numpy(dtype=float)[start:]
+        close_prices = adjusted["close"].to_numpy(dtype=float)[start:]
+        colors = np.where(close_prices > open_prices, "#ff4d4f", np.where(close_prices < open_prices, "#008000", "#000000"))
+        columns = {"value": adjusted["volume"].to_numpy(dtype=float)[start:], "color": colors}
+        return self._serialize_series(times[start:], bar_ids[start:], columns, layout=layout)
+
+    def get_ma_data(
+        self,
+        periods: List[int] = [5, 10, 20],
+        view_period: str = "daily",
+        since_bar_id: Optional[int] = None,
+        layout: str = "rows",
+    ) -> Dict:
+        if not self._is_daily_view(view_period):
+            adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
+            times, bar_ids = self._frame_bar_index(adjusted)
+            start = self._tail_start(bar_ids, since_bar_id)
+            return {
+                period: self._serialize_series(
+                    times[start:],
+                    bar_ids[start:],
+                    {"value": adjusted["close"].rolling(window=period).mean().to_numpy(dtype=float)[start:]},
+                    require_all=True,
+                    layout=layout,
+                )
+                for period in periods
+            }
 
-    def get_ma_data(self, periods: List[int] = [5, 10, 20], view_period: str = "daily") -> Dict[int, List[Dict]]:
-        adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
-        meta = self._build_bar_meta(adjusted)
+        end = self.current_index + 1
+        start = self._tail_start(self._bar_ids[:end], since_bar_id)
         result = {}
         for period in periods:
-            series = []
-            ma_values = adjusted["close"].rolling(window=period).mean()
-            for index, value in enumerate(ma_values):
-                if pd.isna(value):
-                    continue
-                current_meta = meta[index]
-                series.append(
-                    {
-                        "time": current_meta["time"],
-                        "value": float(value),
-                        "bar_id": current_meta["bar_id"],
-                        "is_preview": current_meta["is_preview"],
-                    }
-                )
-            result[period] = series
+            values = self._get_ma_column(period)[start:end]
+            result[period] = self._serialize_series(
+                self._bar_times[start:end], self._bar_ids[start:end], {"value": values}, require_all=True, layout=layout
+            )
         return result
 
+    def get_view_bar_id(self, view_period: str = "daily") -> int:
+        """当前视图中最后一根K线的 bar ID，周K等聚合视图下即当前所在周期。"""
+        if not self._is_daily_view(view_period):
+            _, bar_ids = self._frame_bar_index(self._get_adjusted_frame(view_period=view_period, full=False))
+            return int(bar_ids[-1]) if len(bar_ids) else 0
+        return self.get_current_bar_id()
+
     def get_current_bar(self) -> Optional[Dict]:
         if self.current_index >= len(self.full_data):
             return None
-        current_row = self.full_data.iloc[self.current_index]
-        adjusted = self._calculate_adjusted_prices(self.full_data.iloc[[self.current_index]].copy(), self.adjustment_mode)
-        adjusted_row = adjusted.iloc[0]
+        prices = self._get_adjusted_prices()
+        index = self.current_index
         return {
-            "time": int(current_row["date"].timestamp()),
-            "open": float(adjusted_row["open"]),
-            "high": float(adjusted_row["high"]),
-            "low": float(adjusted_row["low"]),
-            "close": float(adjusted_row["close"]),
-            "volume": float(current_row["volume"]),
+            "time": int(self._bar_times[index]),
+            "open": float(prices["open"][index]),
+            "high": float(prices["high"][index]),
+            "low": float(prices["low"][index]),
+            "close": float(prices["close"][index]),
+            "volume": float(self._volumes[index]),
             "bar_id": self.get_current_bar_id(),
             "is_preview": self.get_current_bar_id() <= 0,
         }
@@ -222,10 +272,9 @@ class KLineProcessorEnhanced:
     def get_current_volume(self) -> Optional[Dict]:
         if self.current_index >= len(self.full_data):
             return None
-        current_row = self.full_data.iloc[self.current_index]
         return {
-            "time": int(current_row["date"].timestamp()),
-            "value": float(current_row["volume"]),
+            "time": int(self._bar_times[self.current_index]),
+            "value": float(self._volumes[self.current_index]),
             "bar_id": self.get_current_bar_id(),
             "is_preview": self.get_current_bar_id() <= 0,
         }
@@ -233,15 +282,12 @@ class KLineProcessorEnhanced:
     def get_current_date(self) -> Optional[str]:
         if self.current_index >= len(self.full_data):
             return None
-        return self.full_data.iloc[self.current_index]["date"].strftime("%Y-%m-%d")
+        return self.full_data["date"].iat[self.current_index].strftime("%Y-%m-%d")
 
     def get_previous_close(self) -> Optional[float]:
         if self.current_index <= 0:
             return None
-        prev = self._calculate_adjusted_prices(self.full_data.iloc[[self.current_index - 1]].copy(), self.adjustment_mode)
-        if prev.empty:
-            return None
-        return float(prev.iloc[0]["close"])
+        return float(self._get_adjusted_prices()["close"][self.current_index - 1])
 
     def add_trade_marker(self, action: str, price: float):
         self.trade_markers.append(
@@ -249,7 +295,7 @@ class KLineProcessorEnhanced:
                 "bar_id": self.get_current_bar_id(),
                 "type": "B" if action == "buy" else "S",
                 "price": price,
-                "time": int(self.full_data.iloc[self.current_index]["date"].timestamp()),
+                "time": int(self._bar_times[self.current_index]),
             }
         )
 
@@ -261,9 +307,9 @@ class KLineProcessorEnhanced:
         if self.current_index >= self.max_index:
             return False
 
-        old_factor = self.full_data.iloc[self.current_index]["factor"]
+        old_factor = self._factors[self.current_index]
         self.current_index += 1
-        new_factor = self.full_data.iloc[self.current_index]["factor"]
+        new_factor = self._factors[self.current_index]
         if self.adjustment_mode == "dynamic_forward" and old_factor != new_factor:
             self.factor_changed = True
         return True
@@ -303,198 +349,327 @@ class KLineProcessorEnhanced:
             "period": self.interval,
         }
 
-    def get_full_data(self, view_period: str = "daily") -> List[Dict]:
+    def get_full_data(self, view_period: str = "daily", layout: str = "rows"):
         adjusted = self._get_adjusted_frame(view_period=view_period, full=True)
-        return self._to_chart_rows(adjusted)
+        return self._to_chart_rows(adjusted, layout=layout)
+
+    def _adjustment_key(self):
+        """预计算缓存的复权键。动态前复权只在复权因子变化时才需要重算，因此以当前因子区分。"""
+        if self.adjustment_mode == "dynamic_forward":
+            return ("dynamic_forward", float(self._factors[self.current_index]))
+        return self.adjustment_mode
+
+    def _get_adjusted_prices(self) -> Dict[str, np.ndarray]:
+        cache_key = self._adjustment_key()
+        if cache_key not in self._adjusted_prices:
+            self._drop_stale_dynamic_cache()
+            self._adjusted_prices[cache_key] = self._calculate_adjusted_prices(self.adjustment_mode)
+        return self._adjusted_prices[cache_key]
+
+    def _get_full_adjusted_frame(self) -> pd.DataFrame:
+        cache_key = self._adjustment_key()
+        if cache_key not in self._full_adjusted_cache:
+            prices = self._get_adjusted_prices()
+            frame = pd.DataFrame({"date": self.full_data["date"]})
+            for col in self.PRICE_COLUMNS:
+                frame[col] = prices[col]
+            for col in ("volume", "amount"):
+                if col in self.full_data.columns:
+                    frame[col] = self.full_data[col]
+            self._full_adjusted_cache[cache_key] = frame
+        return self._full_adjusted_cache[cache_key]
+
+    def _drop_stale_dynamic_cache(self):
+        self._adjusted_prices = {key: value for key, value in self._adjusted_prices.items() if not isinstance(key, tuple)}
+        self._full_adjusted_cache = {key: value for key, value in self._full_adjusted_cache.items() if not isinstance(key, tuple)}
+        self._period_cache = {key: value for key, value in self._period_cache.items() if not isinstance(key[1], tuple)}
+        self._ma_cache = {key: value for key, value in self._ma_cache.items() if not isinstance(key[0], tuple)}
+        self._indicator_cache = {key: value for key, value in self._indicator_cache.items() if not isinstance(key[1], tuple)}
+
+    def _freeze_params(self, params: Dict) -> tuple:
+        return tuple(sorted((key, tuple(value) if isinstance(value, (list, tuple)) else value) for key, value in params.items()))
+
+    def _get_ma_column(self, period: int) -> np.ndarray:
+        cache_key = (self._adjustment_key(), int(period))
+        if cache_key not in self._ma_cache:
+            close_prices = self._get_full_adjusted_frame()["close"]
+            self._ma_cache[cache_key] = close_prices.rolling(window=int(period)).mean().to_numpy(dtype=float)
+        return self._ma_cache[cache_key]
+
+    def _get_indicator_columns(self, indicator_type: str, params: Dict) -> Dict[str, np.ndarray]:
+        """按（复权模式, 指标, 参数）缓存全区间指标，所有指标都只依赖历史K线，可直接按当前位置截取。"""
+        cache_key = (indicator_type, self._adjustment_key(), self._freeze_params(params))
+        if cache_key not in self._indicator_cache:
+            frame = self._get_full_adjusted_frame()
+            self._indicator_cache[cache_key] = self._compute_indicator(indicator_type, frame, params)
+        return self._indicator_cache[cache_key]
+
+    def _warm_indicator_cache(self):
+        for period in (5, 10, 20):
+            self._get_ma_column(period)
+        for indicator_type in self.INDICATOR_DEFAULTS:
+            try:
+                self._get_indicator_columns(indicator_type, dict(self.INDICATOR_DEFAULTS[indicator_type]))
+            except Exception as e:
+                print(f"预计算 {indicator_type} 失败: {e}")
+
+    def _serialize_series(
+        self,
+        times: np.ndarray,
+        bar_ids: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        require_all: bool = False,
+        layout: str = "rows",
+    ):
+        """把按列组织的序列一次性转换为图表数据。
+
+        layout="rows" 输出逐行字典（缺失值的字段省略），layout="columns" 输出
+        {"time": [...], "bar_id": [...], "is_preview": [...], 列名: [...]}，缺失值为 None。
+        require_all=True 时丢弃任一列缺失的行。
+        """
+        names = list(columns)
+        arrays = [np.asarray(columns[name]) for name in names]
+        valid = [~np.isnan(values) if values.dtype.kind == "f" else np.ones(len(values), dtype=bool) for values in arrays]
+
+        if require_all and names:
+            keep = np.logical_and.reduce(valid)
+            times, bar_ids = times[keep], bar_ids[keep]
+            arrays = [values[keep] for values in arrays]
+            valid = [mask[keep] for mask in valid]
+
+        is_preview = (bar_ids <= 0).tolist()
+        if layout == "columns":
+            payload = {"time": times.tolist(), "bar_id": bar_ids.tolist(), "is_preview": is_preview}
+            for name, values, mask in zip(names, arrays, valid):
+                column = values.astype(object)
+                column[~mask] = None
+                payload[name] = column.tolist()
+            return payload
+
+        keys = ["time", "bar_id", "is_preview"] + names
+        value_lists = [values.tolist() for values in arrays]
+        if all(mask.all() for mask in valid):
+            return [dict(zip(keys, row)) for row in zip(times.tolist(), bar_ids.tolist(), is_preview, *value_lists)]
+
+        valid_lists = [mask.tolist() for mask in valid]
+        rows: List[Dict] = []
+        for index, (time_value, bar_id, preview) in enumerate(zip(times.tolist(), bar_ids.tolist(), is_preview)):
+            item = {"time": time_value, "bar_id": bar_id, "is_preview": preview}
+            for name, values, mask in zip(names, value_lists, valid_lists):
+                if mask[index]:
+                    item[name] = values[index]
+            rows.append(item)
+        return rows
+
+    def _indicator_payload(self, indicator_type: str, times: np.ndarray, bar_ids: np.ndarray, columns: Dict[str, np.ndarray], params: Dict) -> Dict:
+        rows = self._serialize_series(times, bar_ids, columns, require_all=indicator_type == "MACD")
+        payload = {"type": indicator_type, "data": rows}
+        if indicator_type == "RSI":
+            payload["periods"] = params["periods"]
+        return payload
 
-    def get_technical_indicators(self, indicator_type: str = "MACD", view_period: str = "daily", **kwargs) -> Dict:
-        adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
-        if adjusted is None or adjusted.empty:
+    def get_technical_indicators(
+        self,
+        indicator_type: str = "MACD",
+        view_period: str = "daily",
+        since_bar_id: Optional[int] = None,
+        **kwargs,
+    ) -> Dict:
+        if indicator_type not in self.INDICATOR_DEFAULTS:
+            return {}
+
+        params = dict(self.INDICATOR_DEFAULTS[indicator_type])
+        params.update(kwargs)
+        try:
+            if not self._is_daily_view(view_period):
+                adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
+                if adjusted is None or adjusted.empty:
+                    return {"type": indicator_type, "data": []}
+                times, bar_ids = self._frame_bar_index(adjusted)
+                start = self._tail_start(bar_ids, since_bar_id)
+                columns = self._compute_indicator(indicator_type, adjusted, params)
+                visible = {name: values[start:] for name, values in columns.items()}
+                return self._indicator_payload(indicator_type, times[start:], bar_ids[start:], visible, params)
+
+            end = self.current_index + 1
+            start = self._tail_start(self._bar_ids[:end], since_bar_id)
+            columns = self._get_indicator_columns(indicator_type, params)
+            visible = {name: values[start:end] for name, values in columns.items()}
+            return self._indicator_payload(indicator_type, self._bar_times[start:end], self._bar_ids[start:end], visible, params)
+        except Exception as e:
+            print(f"计算 {indicator_type} 失败: {e}")
             return {"type": indicator_type, "data": []}
 
+    def _compute_indicator(self, indicator_type: str, frame: pd.DataFrame, params: Dict) -> Dict[str, np.ndarray]:
         if indicator_type == "MACD":
-            return self._calculate_macd(adjusted, **kwargs)
+            return self._calculate_macd(frame, **params)
         if indicator_type == "KDJ":
-            return self._calculate_kdj(adjusted, **kwargs)
+            return self._calculate_kdj(frame, **params)
         if indicator_type == "RSI":
-            return self._calculate_rsi(adjusted, **kwargs)
+            return self._calculate_rsi(frame, **params)
         if indicator_type == "BOLL":
-            return self._calculate_boll(adjusted, **kwargs)
-        return {}
-
-    def _calculate_macd(self, frame: pd.DataFrame, fast=12, slow=26, signal=9) -> Dict:
-        try:
-            close_prices = frame["close"]
-            meta = self._build_bar_meta(frame)
-            ema_fast = close_prices.ewm(span=fast).mean()
-            ema_slow = close_prices.ewm(span=slow).mean()
-            dif = ema_fast - ema_slow
-            dea = dif.ewm(span=signal).mean()
-            histogram = (dif - dea) * 2
-
-            result_data = []
-            for index, (dif_val, dea_val, hist_val) in enumerate(zip(dif, dea, histogram)):
-                if pd.isna(dif_val) or pd.isna(dea_val) or pd.isna(hist_val):
-                    continue
-                current_meta = meta[index]
-                result_data.append(
-                    {
-                        "time": current_meta["time"],
-                        "dif": float(dif_val),
-                        "dea": float(dea_val),
-                        "histogram": float(hist_val),
-                        "bar_id": current_meta["bar_id"],
-                        "is_preview": current_meta["is_preview"],
-                    }
-                )
-            return {"type": "MACD", "data": result_data}
-        except Exception as e:
-            print(f"计算 MACD 失败: {e}")
-            return {"type": "MACD", "data": []}
+            return self._calculate_boll(frame, **params)
+        raise ValueError(f"未知指标类型: {indicator_type}")
+
+    def _calculate_macd(self, frame: pd.DataFrame, fast=12, slow=26, signal=9) -> Dict[str, np.ndarray]:
+        close_prices = frame["close"]
+        ema_fast = close_prices.ewm(span=fast).mean()
+        ema_slow = close_prices.ewm(span=slow).mean()
+        dif = ema_fast - ema_slow
+        dea = dif.ewm(span=signal).mean()
+        histogram = (dif - dea) * 2
+        return {
+            "dif": dif.to_numpy(dtype=float),
+            "dea": dea.to_numpy(dtype=float),
+            "histogram": histogram.to_numpy(dtype=float),
+        }
 
-    def _calculate_kdj(self, frame: pd.DataFrame, n=9, m1=3, m2=3) -> Dict:
-        try:
-            high_prices = frame["high"]
-            low_prices = frame["low"]
-            close_prices = frame["close"]
-            meta = self._build_bar_meta(frame)
-            lowest_low = low_prices.rolling(window=n).min()
-            highest_high = high_prices.rolling(window=n).max()
-            rsv = ((close_prices - lowest_low) / (highest_high - lowest_low) * 100).fillna(50)
-            k = rsv.rolling(window=m1).mean()
-            d = k.rolling(window=m2).mean()
-            j = 3 * k - 2 * d
-
-            result_data = []
-            for index in range(len(close_prices)):
-                current_meta = meta[index]
-                item = {
-                    "time": current_meta["time"],
-                    "bar_id": current_meta["bar_id"],
-                    "is_preview": current_meta["is_preview"],
-                }
-                if not pd.isna(k.iloc[index]):
-                    item["k"] = float(k.iloc[index])
-                if not pd.isna(d.iloc[index]):
-                    item["d"] = float(d.iloc[index])
-                if not pd.isna(j.iloc[index]):
-                    item["j"] = float(j.iloc[index])
-                result_data.append(item)
-            return {"type": "KDJ", "data": result_data}
-        except Exception as e:
-            print(f"计算 KDJ 失败: {e}")
-            return {"type": "KDJ", "data": []}
+    def _calculate_kdj(self, frame: pd.DataFrame, n=9, m1=3, m2=3) -> Dict[str, np.ndarray]:
+        high_prices = frame["high"]
+        low_prices = frame["low"]
+        close_prices = frame["close"]
+        lowest_low = low_prices.rolling(window=n).min()
+        highest_high = high_prices.rolling(window=n).max()
+        rsv = ((close_prices - lowest_low) / (highest_high - lowest_low) * 100).fillna(50)
+        k = rsv.rolling(window=m1).mean()
+        d = k.rolling(window=m2).mean()
+        j = 3 * k - 2 * d
+        return {
+            "k": k.to_numpy(dtype=float),
+            "d": d.to_numpy(dtype=float),
+            "j": j.to_numpy(dtype=float),
+        }
 
-    def _calculate_rsi(self, frame: pd.DataFrame, periods=(6, 12, 24)) -> Dict:
-        try:
-            close_prices = frame["close"]
-            meta = self._build_bar_meta(frame)
-            rsi_values = {}
-            for period in periods:
-                delta = close_prices.diff()
-                gain = delta.where(delta > 0, 0).ewm(alpha=1 / period, adjust=False).mean()
-                loss = -delta.where(delta < 0, 0).ewm(alpha=1 / period, adjust=False).mean()
-                rs = gain / loss
-                rsi_values[f"rsi{period}"] = 100 - (100 / (1 + rs))
-
-            result_data = []
-            for index in range(len(close_prices)):
-                current_meta = meta[index]
-                item = {
-                    "time": current_meta["time"],
-                    "bar_id": current_meta["bar_id"],
-                    "is_preview": current_meta["is_preview"],
-                }
-                for period in periods:
-                    value = rsi_values[f"rsi{period}"].iloc[index]
-                    if not pd.isna(value):
-                        item[f"rsi{period}"] = float(value)
-                result_data.append(item)
-            return {"type": "RSI", "periods": periods, "data": result_data}
-        except Exception as e:
-            print(f"计算 RSI 失败: {e}")
-            return {"type": "RSI", "data": []}
+    def _calculate_rsi(self, frame: pd.DataFrame, periods=(6, 12, 24)) -> Dict[str, np.ndarray]:
+        close_prices = frame["close"]
+        delta = close_prices.diff()
+        rsi_values = {}
+        for period in periods:
+            gain = delta.where(delta > 0, 0).ewm(alpha=1 / period, adjust=False).mean()
+            loss = -delta.where(delta < 0, 0).ewm(alpha=1 / period, adjust=False).mean()
+            rs = gain / loss
+            rsi_values[f"rsi{period}"] = (100 - (100 / (1 + rs))).to_numpy(dtype=float)
+        return rsi_values
+
+    def _calculate_boll(self, frame: pd.DataFrame, period=20, std_dev=2) -> Dict[str, np.ndarray]:
+        close_prices = frame["close"]
+        middle = close_prices.rolling(window=period).mean()
+        std = close_prices.rolling(window=period).std()
+        upper = middle + std * std_dev
+        lower = middle - std * std_dev
+        return {
+            "middle": middle.to_numpy(dtype=float),
+            "upper": upper.to_numpy(dtype=float),
+            "lower": lower.to_numpy(dtype=float),
+        }
 
-    def _calculate_boll(self, frame: pd.DataFrame, period=20, std_dev=2) -> Dict:
-        try:
-            close_prices = frame["close"]
-            meta = self._build_bar_meta(frame)
-            middle = close_prices.rolling(window=period).mean()
-            std = close_prices.rolling(window=period).std()
-            upper = middle + std * std_dev
-            lower = middle - std * std_dev
-
-            result_data = []
-            for index in range(len(close_prices)):
-                current_meta = meta[index]
-                item = {
-                    "time": current_meta["time"],
-                    "bar_id": current_meta["bar_id"],
-                    "is_preview": current_meta["is_preview"],
-                }
-                if not pd.isna(middle.iloc[index]):
-                    item["middle"] = float(middle.iloc[index])
-                if not pd.isna(upper.iloc[index]):
-                    item["upper"] = float(upper.iloc[index])
-                if not pd.isna(lower.iloc[index]):
-                    item["lower"] = float(lower.iloc[index])
-                result_data.append(item)
-            return {"type": "BOLL", "data": result_data}
-        except Exception as e:
-            print(f"计算 BOLL 失败: {e}")
-            return {"type": "BOLL", "data": []}
+    def _chip_key(self, view_period: str) -> tuple:
+        """筹码状态键。除不复权外，各复权模式只差一个常数比例，共用 原始价×因子 尺度下的状态。"""
+        return TimeframeEngine.normalize(view_period), "none" if self.adjustment_mode == "none" else "scaled"
+
+    def _chip_price_scale(self) -> float:
+        if self.adjustment_mode == "none":
+            return 1.0
+        if self.adjustment_mode == "forward":
+            return 1.0 / self._factors[-1]
+        if self.adjustment_mode == "backward":
+            return 1.0 / self._factors[0]
+        return 1.0 / self._factors[self.current_index]
+
+    def _chip_daily_columns(self, scale: str) -> Dict[str, np.ndarray]:
+        ratio = 1.0 if scale == "none" else self._factors
+        return {
+            "high": self._raw_prices["high"] * ratio,
+            "low": self._raw_prices["low"] * ratio,
+            "volume": self._volumes,
+        }
 
-    def get_volume_profile(self, bins=80, view_period: str = "daily") -> Dict:
+    def _get_chip_source(self, chip_key: tuple) -> Dict[str, np.ndarray]:
+        """筹码模型逐根消费的 最高/最低/成交量 数组，聚合视图下为已按周期聚合的结果。"""
+        if chip_key not in self._chip_sources:
+            timeframe, scale = chip_key
+            columns = self._chip_daily_columns(scale)
+            if timeframe != "daily":
+                columns = self._timeframes.get_index(timeframe).aggregate(columns)
+            self._chip_sources[chip_key] = columns
+        return self._chip_sources[chip_key]
+
+    def _new_chip_tracker(self, chip_key: tuple) -> Dict:
+        """网格初始范围只取训练起点及之前已揭示的K线，之后的价格越界时由网格自行扩展。"""
+        revealed = self._chip_daily_columns(chip_key[1])
+        lows = revealed["low"][: self.preview_bars + 1]
+        highs = revealed["high"][: self.preview_bars + 1]
+        finite = np.isfinite(lows) & np.isfinite(highs)
+        if finite.any():
+            chip = ChipDistribution(float(lows[finite].min()), float(highs[finite].max()))
+        else:
+            chip = ChipDistribution(0.0, 1.0)
+        return {"chip": chip, "applied": 0, "checkpoints": {0: chip.copy()}}
+
+    def _replay_chip(self, chip: ChipDistribution, source: Dict[str, np.ndarray], start: int, stop: int, checkpoints: Dict):
+        """从 start 推进到 stop，途经检查点位置时保存快照。"""
+        interval = self.CHIP_CHECKPOINT_INTERVAL
+        while start < stop:
+            step_stop = min(stop, (start // interval + 1) * interval)
+            chip.apply_bars(source["high"][start:step_stop], source["low"][start:step_stop], source["volume"][start:step_stop])
+            start = step_stop
+            if start % interval == 0 and start not in checkpoints:
+                checkpoints[start] = chip.copy()
+
+    def _chip_state_at(self, chip_key: tuple, target: int, rewind: bool = True) -> ChipDistribution:
+        """返回已消费 target 根（聚合视图下为 target 个完整周期）后的筹码状态。
+
+        向前推进直接更新持续状态；回看历史时从不晚于 target 的最近检查点恢复，最多重放
+        CHIP_CHECKPOINT_INTERVAL 根。rewind=True 时回看结果会成为新的持续状态（重置、跳转），
+        否则只返回副本，不影响当前训练进度下的状态。返回的对象调用方不能修改。
+        """
+        source = self._get_chip_source(chip_key)
+        tracker = self._chip_trackers.get(chip_key)
+        if tracker is None:
+            tracker = self._new_chip_tracker(chip_key)
+            self._chip_trackers[chip_key] = tracker
+
+        checkpoints = tracker["checkpoints"]
+        if target >= tracker["applied"]:
+            self._replay_chip(tracker["chip"], source, tracker["applied"], target, checkpoints)
+            tracker["applied"] = target
+            return tracker["chip"]
+
+        base = max(position for position in checkpoints if position <= target)
+        chip = checkpoints[base].copy()
+        self._replay_chip(chip, source, base, target, checkpoints)
+        if rewind:
+            tracker["chip"] = chip
+            tracker["applied"] = target
+        return chip
+
+    def get_volume_profile(self, bins=80, view_period: str = "daily", as_of_bar_id: Optional[int] = None) -> Dict:
+        """筹码分布。as_of_bar_id 指定日K bar ID 时返回该K线收盘时的分布（不能晚于当前K线）。"""
         try:
-            adjusted = self._get_adjusted_frame(view_period=view_period, full=False)
-            if adjusted is None or adjusted.empty:
-                return {"type": "CHIP", "data": []}
-            avg_vol = adjusted["volume"].mean()
-            virtual_total_shares = avg_vol * 120 if avg_vol > 0 else 1
-            chip_map = {}
-
-            for _, row in adjusted.iterrows():
-                vol = float(row["volume"])
-                high = float(row["high"])
-                low = float(row["low"])
-                turnover_ratio = min(vol / virtual_total_shares, 1.0)
-
-                stale_prices = []
-                for price in chip_map:
-                    chip_map[price] *= 1 - turnover_ratio
-                    if chip_map[price] < 1e-5:
-                        stale_prices.append(price)
-                for price in stale_prices:
-                    del chip_map[price]
-
-                if high == low:
-                    chip_map[high] = chip_map.get(high, 0) + vol
-                else:
-                    prices = np.linspace(low, high, num=10)
-                    volume_per_price = vol / 10
-                    for price in prices:
-                        chip_map[price] = chip_map.get(price, 0) + volume_per_price
-
-            if not chip_map:
+            chip_key = self._chip_key(view_period)
+            timeframe = chip_key[0]
+            source = self._get_chip_source(chip_key)
+            if len(source["volume"]) == 0:
                 return {"type": "CHIP", "data": []}
 
-            min_price = min(chip_map.keys())
-            max_price = max(chip_map.keys())
-            if min_price == max_price:
-                return {"type": "CHIP", "data": [{"price": round(min_price, 2), "volume": round(sum(chip_map.values()), 2)}]}
-
-            step = (max_price - min_price) / bins if bins else (max_price - min_price)
-            binned = {}
-            for price, volume in chip_map.items():
-                bin_idx = int((price - min_price) / step) if step else 0
-                if bin_idx >= bins:
-                    bin_idx = bins - 1
-                bin_price = min_price + (bin_idx + 0.5) * step if step else min_price
-                binned[bin_price] = binned.get(bin_price, 0) + volume
-
-            result = [{"price": round(price, 2), "volume": round(volume, 2)} for price, volume in binned.items() if volume > 0]
-            result.sort(key=lambda item: item["price"])
-            return {"type": "CHIP", "data": result}
+            as_of_index = self.current_index
+            if as_of_bar_id is not None:
+                as_of_index = min(max(int(as_of_bar_id) - self.bar_id_offset, 0), self.current_index)
+
+            running = None
+            if timeframe == "daily":
+                target = as_of_index + 1
+            else:
+                # 当前周期尚未走完，只在副本上叠加，不写入持续推进的状态
+                index = self._timeframes.get_index(timeframe)
+                target = index.count_until(as_of_index) - 1
+                running = index.aggregate(self._chip_daily_columns(chip_key[1]), first_bucket=target, end=as_of_index + 1)
+
+            chip = self._chip_state_at(chip_key, target, rewind=as_of_bar_id is None)
+            if running is not None:
+                chip = chip.copy()
+                chip.apply_bar(float(running["high"][0]), float(running["low"][0]), float(running["volume"][0]))
+            return {"type": "CHIP", "data": chip.to_profile(bins=bins, price_scale=self._chip_price_scale())}
         except Exception as e:
             print(f"计算筹码分布失败: {e}")
             return {"type": "CHIP", "data": []}
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class PerformanceAnalyzer:
+    """基于会话资金曲线（EquityCurve.rows）的复盘指标，全部用 NumPy 向量运算完成。
+
+    资金曲线第 i 行是第 i 根K线收盘、且当根成交之后的账户状态，持股数大于 0 的
+    连续区间即为一次完整的持仓（round trip）。
+    """
+
+    PERIODS_PER_YEAR = {"daily": 252, "weekly": 52, "monthly": 12}
+
+    def __init__(self, rows: np.ndarray, initial_capital: float, period: str = "daily"):
+        self.rows = rows
+        self.initial_capital = float(initial_capital)
+        self.periods_per_year = self.PERIODS_PER_YEAR.get(period, 252)
+
+    def analyze(self, traded_amount: float = 0.0) -> Dict:
+        rows = self.rows
+        if len(rows) == 0:
+            return self._empty_result()
+
+        assets = rows["total_assets"]
+        equity = np.concatenate(([self.initial_capital], assets))
+        peaks = np.maximum.accumulate(equity)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdowns = np.where(peaks > 0, (peaks - equity) / peaks, 0.0)
+            returns = np.where(equity[:-1] > 0, np.diff(equity) / equity[:-1], 0.0)
+
+        positions = np.arange(len(equity))
+        last_peak = np.maximum.accumulate(np.where(equity >= peaks, positions, 0))
+
+        held = rows["total_shares"] > 0
+        round_trips, holding_bars = self._round_trips(rows, equity, held)
+
+        return {
+            "max_drawdown": float(drawdowns.max() * 100),
+            "max_drawdown_duration": int((positions - last_peak).max()),
+            "drawdown_series": (drawdowns[1:] * 100).tolist(),
+            "sharpe_ratio": self._annualized_ratio(returns, np.std(returns, ddof=1) if len(returns) > 1 else 0.0),
+            "sortino_ratio": self._annualized_ratio(returns, np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))),
+            "exposure_time": float(held.mean() * 100),
+            "turnover": float(traded_amount / assets.mean()) if assets.mean() > 0 else 0.0,
+            "avg_holding_period": float(holding_bars.mean()) if len(holding_bars) else 0.0,
+            "round_trips": round_trips,
+        }
+
+    def _annualized_ratio(self, returns: np.ndarray, risk: float) -> float:
+        if len(returns) < 2 or not risk > 0:
+            return 0.0
+        return float(returns.mean() / risk * np.sqrt(self.periods_per_year))
+
+    def _round_trips(self, rows: np.ndarray, equity: np.ndarray, held: np.ndarray) -> Tuple[List[Dict], np.ndarray]:
+        """按持仓区间统计每次完整交易的持有K线数、盈亏与 MAE/MFE（相对持仓均价的百分比）。
+
+        成交发生在K线收盘，建仓K线的高低点出现在持仓之前，不计入；清仓K线在收盘前仍持有，
+        计入。因此 MAE/MFE 取 (建仓行, 清仓行] 区间，每行以上一行收盘后的持仓均价为成本。
+        """
+        edges = np.diff(np.concatenate(([0], held.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        holding_bars = ends - starts
+        if len(starts) == 0:
+            return [], holding_bars
+
+        held_before = np.concatenate(([False], held[:-1]))
+        cost = np.concatenate(([1.0], rows["average_cost"][:-1]))
+        cost = np.where(held_before & (cost > 0), cost, 1.0)
+        favorable = np.where(held_before, rows["high"] / cost - 1, -np.inf)
+        adverse = np.where(held_before, rows["low"] / cost - 1, np.inf)
+        # 最后一根K线才建仓的持仓没有可统计的区间，下标收在末行，结果不是有限值时记为 0
+        window_starts = np.minimum(starts + 1, len(rows) - 1)
+        mfe = np.maximum.reduceat(favorable, window_starts)
+        mae = np.minimum.reduceat(adverse, window_starts)
+        mfe = np.where(np.isfinite(mfe), mfe, 0.0) * 100
+        mae = np.where(np.isfinite(mae), mae, 0.0) * 100
+
+        # equity[k] 是第 k 行之前的资产，即建仓前；ends 指向清仓那一行，其资产已是卖出后的结果
+        exit_rows = np.minimum(ends, len(rows) - 1)
+        pnl = rows["total_assets"][exit_rows] - equity[starts]
+        is_open = ends >= len(rows)
+
+        bar_ids = rows["bar_id"]
+        trips = [
+            {
+                "start_bar_id": int(start_bar),
+                "end_bar_id": int(end_bar),
+                "bars": int(bars),
+                "pnl": float(trip_pnl),
+                "mae": float(trip_mae),
+                "mfe": float(trip_mfe),
+                "open": bool(trip_open),
+            }
+            for start_bar, end_bar, bars, trip_pnl, trip_mae, trip_mfe, trip_open in zip(
+                bar_ids[starts], bar_ids[ends - 1], holding_bars, pnl, mae, mfe, is_open
+            )
+        ]
+        return trips, holding_bars
+
+    def _empty_result(self) -> Dict:
+        return {
+            "max_drawdown": 0.0,
+            "max_drawdown_duration": 0,
+            "drawdown_series": [],
+            "sharpe_ratio": 0.0,
+            "sortino_ratio": 0.0,
+            "exposure_time": 0.0,
+            "turnover": 0.0,
+            "avg_holding_period": 0.0,
+            "round_trips": [],
+        }
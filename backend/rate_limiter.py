@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+
+class SourceCircuitOpenError(RuntimeError):
+    """数据源连续失败、熔断暂停期间的调用错误，retry_after 为距恢复试探的秒数。"""
+
+    def __init__(self, source: str, retry_after: float):
+        super().__init__(f"数据源 {source} 连续请求失败，已暂停 {retry_after:.0f} 秒")
+        self.source = source
+        self.retry_after = retry_after
+
+
+class SourceRateLimiter:
+    """单个在线数据源共享的令牌桶限速器，附带自适应速率、重试退避与熔断。
+
+    - 速率按 AIMD 调整：请求成功且延迟低于 target_latency 时每次加 increase_step，
+      遇到限流或网络错误（is_throttled）时减半，延迟偏高时乘 0.9，
+      始终限制在 [min_rate, max_rate] 之间；
+    - 可重试的异常按带抖动的指数退避重试（full jitter）；
+    - 一次 call 重试耗尽后只记一次失败，连续失败达到 failure_threshold 次后熔断
+      cooldown 秒，之后放行一次试探请求，试探成功即恢复，失败则冷却时间翻倍
+      （不超过 max_cooldown）。
+    参数错误、代码不存在等异常（NON_RETRYABLE）直接抛出，不重试也不计入失败。
+    """
+
+    SOURCE_LIMITS = {
+        "akshare": {"rate": 2.0, "min_rate": 0.2, "max_rate": 6.0, "burst": 3, "target_latency": 2.0},
+        "mootdx": {"rate": 4.0, "min_rate": 0.5, "max_rate": 12.0, "burst": 4, "target_latency": 1.0},
+        "xtdata": {"rate": 20.0, "min_rate": 2.0, "max_rate": 60.0, "burst": 10, "target_latency": 1.0},
+    }
+    NON_RETRYABLE = (ValueError, TypeError, NotImplementedError, KeyError, IndexError)
+    THROTTLE_ERRORS = (
+        ConnectionError,
+        TimeoutError,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )
+    THROTTLE_STATUS = (429, 503)
+    THROTTLE_MARKERS = ("429", "too many requests", "rate limit", "频繁", "限流")
+
+    _registry: Dict[str, "SourceRateLimiter"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        source: str,
+        rate: float = 2.0,
+        min_rate: float = 0.2,
+        max_rate: float = 6.0,
+        burst: int = 3,
+        target_latency: float = 2.0,
+        increase_step: float = 0.1,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        max_backoff: float = 20.0,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+    ):
+        self.source = source
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._open_until = 0.0
+        self._half_open_probe = False
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.circuit_opens = 0
+
+    @classmethod
+    def for_source(cls, source: str) -> "SourceRateLimiter":
+        """进程内按数据源共享同一个限速器，所有 DataManager 与补数任务共用。"""
+        with cls._registry_lock:
+            limiter = cls._registry.get(source)
+            if limiter is None:
+                limiter = cls(source, **cls.SOURCE_LIMITS.get(source, {}))
+                cls._registry[source] = limiter
+            return limiter
+
+    @classmethod
+    def all_stats(cls) -> Dict[str, Dict]:
+        with cls._registry_lock:
+            limiters = list(cls._registry.values())
+        return {limiter.source: limiter.stats() for limiter in limiters}
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.burst), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _check_circuit(self, now: float) -> bool:
+        """熔断期间抛错；冷却结束后只放行一个试探请求，返回本次调用是否为试探请求。"""
+        if now < self._open_until:
+            raise SourceCircuitOpenError(self.source, self._open_until - now)
+        if self._open_until and self.consecutive_failures >= self.failure_threshold:
+            if self._half_open_probe:
+                raise SourceCircuitOpenError(self.source, self.cooldown)
+            self._half_open_probe = True
+            return True
+        return False
+
+    def acquire(self) -> bool:
+        """取一个令牌，令牌不足时按当前速率等待；返回本次请求是否为熔断后的试探请求。"""
+        is_probe = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if not is_probe:
+                    is_probe = self._check_circuit(now)
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return is_probe
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._open_until = 0.0
+            self._half_open_probe = False
+            self.cooldown = self.base_cooldown
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            if self.latency_ewma <= self.target_latency:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            else:
+                self.rate = max(self.min_rate, self.rate * 0.9)
+
+    def is_throttled(self, error: Exception) -> bool:
+        """是否为限流或网络类错误，只有这类错误才说明需要降低请求速率。"""
+        if isinstance(error, self.THROTTLE_ERRORS):
+            return True
+        response = getattr(error, "response", None)
+        if getattr(response, "status_code", None) in self.THROTTLE_STATUS:
+            return True
+        message = str(error).lower()
+        return any(marker in message for marker in self.THROTTLE_MARKERS)
+
+    def record_throttle(self):
+        """数据源限流或网络异常：速率减半并清空令牌。"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            self._tokens = min(self._tokens, 0.0)
+
+    def record_failure(self):
+        """一次调用最终失败，计入熔断的连续失败次数。"""
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                if self._half_open_probe:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._half_open_probe = False
+                self._open_until = time.monotonic() + self.cooldown
+                self.circuit_opens += 1
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff_base * (2 ** attempt)))
+
+    def call(self, func: Callable, *args, **kwargs):
+        """在限速、重试与熔断保护下调用 func。
+
+        熔断后的试探请求不重试，失败即重新熔断；其余请求重试耗尽后才记一次失败。
+        """
+        attempt = 0
+        while True:
+            is_probe = self.acquire()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except self.NON_RETRYABLE:
+                with self._lock:
+                    self._half_open_probe = False
+                raise
+            except Exception as e:
+                if self.is_throttled(e):
+                    self.record_throttle()
+                if is_probe or attempt >= self.max_retries:
+                    self.record_failure()
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            self.record_success(time.monotonic() - started)
+            return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            if now < self._open_until:
+                state = "open"
+            elif self._open_until and self.consecutive_failures >= self.failure_threshold:
+                state = "half_open"
+            else:
+                state = "closed"
+            return {
+                "rate": round(self.rate, 3),
+                "state": state,
+                "retry_after": round(max(0.0, self._open_until - now), 1),
+                "latency_ewma": None if self.latency_ewma is None else round(self.latency_ewma, 3),
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "consecutive_failures": self.consecutive_failures,
+                "circuit_opens": self.circuit_opens,
+            }
@@ -0,0 +1,142 @@
+import os
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class StockCatalog:
+    """持久化的股票数据目录：记录每只股票本地文件的日期范围、行数、文件签名与板块。
+
+    dataset 区分不同的数据目录（如 offline 对应 a_market_offline），
+    随机选股时只需按板块与日期范围查询索引，无需逐个打开 CSV。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS stock_catalog (
+                    dataset TEXT NOT NULL,
+                    stock_code TEXT NOT NULL,
+                    first_date TEXT,
+                    last_date TEXT,
+                    row_count INTEGER DEFAULT 0,
+                    mtime_ns INTEGER,
+                    file_size INTEGER,
+                    board TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (dataset, stock_code)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stock_catalog_range
+                ON stock_catalog (dataset, board, first_date, last_date)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_signatures(self, dataset: str) -> Dict[str, Tuple[int, int]]:
+        """返回 {股票代码: (mtime_ns, 文件大小)}，用于判断哪些文件需要重新登记。"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT stock_code, mtime_ns, file_size FROM stock_catalog WHERE dataset = ?",
+                (dataset,),
+            ).fetchall()
+            return {code: (mtime_ns, file_size) for code, mtime_ns, file_size in rows}
+        finally:
+            conn.close()
+
+    def upsert(self, dataset: str, entries: Iterable[Dict]) -> int:
+        rows = [
+            (
+                dataset,
+                entry["stock_code"],
+                entry.get("first_date"),
+                entry.get("last_date"),
+                int(entry.get("row_count") or 0),
+                entry.get("mtime_ns"),
+                entry.get("file_size"),
+                entry.get("board"),
+            )
+            for entry in entries
+        ]
+        if not rows:
+            return 0
+
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO stock_catalog
+                (dataset, stock_code, first_date, last_date, row_count, mtime_ns, file_size, board, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', rows)
+            conn.commit()
+            return len(rows)
+        finally:
+            conn.close()
+
+    def remove(self, dataset: str, stock_codes: Iterable[str]) -> int:
+        codes = [(dataset, code) for code in stock_codes]
+        if not codes:
+            return 0
+
+        conn = self._connect()
+        try:
+            conn.executemany("DELETE FROM stock_catalog WHERE dataset = ? AND stock_code = ?", codes)
+            conn.commit()
+            return len(codes)
+        finally:
+            conn.close()
+
+    def get_entry(self, dataset: str, stock_code: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM stock_catalog WHERE dataset = ? AND stock_code = ?",
+                (dataset, stock_code),
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def find_candidates(
+        self,
+        dataset: str,
+        range_start: str,
+        range_end: str,
+        boards: Optional[List[str]] = None,
+        stock_codes: Optional[List[str]] = None,
+    ) -> List[Tuple[str, str, str]]:
+        """查询日期范围与 [range_start, range_end] 有交集的股票，返回 (代码, 首日, 末日)。
+
+        日期均为 YYYY-MM-DD 字符串；boards 为空表示不限板块，stock_codes 用于限定候选范围。
+        """
+        sql = '''
+            SELECT stock_code, first_date, last_date FROM stock_catalog
+            WHERE dataset = ? AND first_date IS NOT NULL AND first_date <= ? AND last_date >= ?
+        '''
+        params: List = [dataset, range_end, range_start]
+        if boards:
+            sql += f" AND board IN ({', '.join('?' for _ in boards)})"
+            params.extend(boards)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql + " ORDER BY stock_code", params).fetchall()
+        finally:
+            conn.close()
+
+        if stock_codes is not None:
+            allowed = set(stock_codes)
+            rows = [row for row in rows if row[0] in allowed]
+        return rows
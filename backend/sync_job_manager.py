@@ -0,0 +1,314 @@
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from backend.rate_limiter import SourceCircuitOpenError
+
+
+class SyncJobManager:
+    """服务端批量补数任务：按市场范围在线程池中逐只调用 DataManager.sync_offline_data。
+
+    任务与每只股票的完成状态保存在 SQLite 中，服务重启后未完成的任务从剩余股票继续；
+    同一数据源的并发数由共享信号量限制，多个任务同时运行也不会超过该数据源的上限。
+    """
+
+    SOURCE_CONCURRENCY = {
+        "akshare": 4,
+        "mootdx": 4,
+        "xtdata": os.cpu_count() or 4,
+    }
+    ACTIVE_STATUSES = ("pending", "running")
+
+    def __init__(self, data_manager, db_path: str):
+        self.data_manager = data_manager
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._source_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._runners: Dict[str, threading.Thread] = {}
+        self._runners_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    start_date TEXT,
+                    end_date TEXT,
+                    force_full INTEGER DEFAULT 0,
+                    status TEXT NOT NULL,
+                    total INTEGER DEFAULT 0,
+                    succeeded INTEGER DEFAULT 0,
+                    failed INTEGER DEFAULT 0,
+                    added_rows INTEGER DEFAULT 0,
+                    last_stock_code TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    finished_at TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sync_job_items (
+                    job_id TEXT NOT NULL,
+                    stock_code TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    added_rows INTEGER DEFAULT 0,
+                    message TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (job_id, stock_code)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sync_job_items_status
+                ON sync_job_items (job_id, status)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _now(self) -> str:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _get_source_slot(self, source: str) -> threading.BoundedSemaphore:
+        with self._runners_lock:
+            if source not in self._source_slots:
+                limit = self.SOURCE_CONCURRENCY.get(source, 2)
+                self._source_slots[source] = threading.BoundedSemaphore(limit)
+            return self._source_slots[source]
+
+    def create_job(
+        self,
+        stock_codes: List[str],
+        scope: str,
+        source: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        force_full: bool = False,
+    ) -> Dict:
+        """登记任务与全部待补股票后立即在后台开始执行。"""
+        if source == "offline":
+            raise ValueError("离线数据不能作为在线补数源。")
+        stock_codes = list(dict.fromkeys(code for code in stock_codes if code))
+        if not stock_codes:
+            raise ValueError("当前范围没有可补数的股票")
+
+        job_id = uuid.uuid4().hex[:12]
+        now = self._now()
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT INTO sync_jobs
+                    (job_id, scope, source, start_date, end_date, force_full, status, total, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+                ''', (job_id, scope, source, start_date, end_date, int(force_full), len(stock_codes), now, now))
+                conn.executemany(
+                    "INSERT INTO sync_job_items (job_id, stock_code, updated_at) VALUES (?, ?, ?)",
+                    [(job_id, code, now) for code in stock_codes],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+        self._start_runner(job_id)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM sync_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            errors = conn.execute('''
+                SELECT stock_code, message FROM sync_job_items
+                WHERE job_id = ? AND status = 'failed'
+                ORDER BY updated_at DESC LIMIT 10
+            ''', (job_id,)).fetchall()
+        finally:
+            conn.close()
+
+        job = dict(row)
+        job["force_full"] = bool(job["force_full"])
+        job["completed"] = job["succeeded"] + job["failed"]
+        job["percent"] = round(job["completed"] / job["total"] * 100, 2) if job["total"] else 0.0
+        job["concurrency"] = self.SOURCE_CONCURRENCY.get(job["source"], 2)
+        job["recent_errors"] = [dict(item) for item in errors]
+        return job
+
+    def list_jobs(self, limit: int = 20) -> List[Dict]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT job_id FROM sync_jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [self.get_job(row["job_id"]) for row in rows]
+
+    def cancel_job(self, job_id: str) -> Optional[Dict]:
+        """停止派发剩余股票，正在补数的股票完成后任务进入 cancelled 状态。"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        if job["status"] in self.ACTIVE_STATUSES:
+            event = self._cancel_events.get(job_id)
+            if event is not None:
+                event.set()
+            self._set_status(job_id, "cancelled", finished=True)
+        return self.get_job(job_id)
+
+    def resume_job(self, job_id: str) -> Optional[Dict]:
+        """从剩余待补的股票继续已取消或中断的任务。"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+        if job["status"] == "completed":
+            return job
+
+        runner = self._runners.get(job_id)
+        if runner is not None and runner.is_alive():
+            if job["status"] in self.ACTIVE_STATUSES:
+                return job
+            raise ValueError("任务仍在停止中，请稍后再试")
+
+        self._set_status(job_id, "pending")
+        self._start_runner(job_id)
+        return self.get_job(job_id)
+
+    def resume_interrupted_jobs(self) -> List[str]:
+        """服务启动时调用：把上次进程退出前仍在执行的任务重新拉起。"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT job_id FROM sync_jobs WHERE status IN ({', '.join('?' for _ in self.ACTIVE_STATUSES)})",
+                self.ACTIVE_STATUSES,
+            ).fetchall()
+        finally:
+            conn.close()
+
+        job_ids = [row["job_id"] for row in rows]
+        for job_id in job_ids:
+            self._start_runner(job_id)
+        return job_ids
+
+    def _start_runner(self, job_id: str):
+        with self._runners_lock:
+            runner = self._runners.get(job_id)
+            if runner is not None and runner.is_alive():
+                return
+            self._cancel_events[job_id] = threading.Event()
+            runner = threading.Thread(target=self._run_job, args=(job_id,), daemon=True)
+            self._runners[job_id] = runner
+            runner.start()
+
+    def _run_job(self, job_id: str):
+        job = self.get_job(job_id)
+        if job is None:
+            return
+
+        cancel_event = self._cancel_events[job_id]
+        conn = self._connect()
+        try:
+            pending = [
+                row["stock_code"]
+                for row in conn.execute(
+                    "SELECT stock_code FROM sync_job_items WHERE job_id = ? AND status = 'pending' ORDER BY stock_code",
+                    (job_id,),
+                ).fetchall()
+            ]
+        finally:
+            conn.close()
+
+        self._set_status(job_id, "running")
+        try:
+            workers = self.SOURCE_CONCURRENCY.get(job["source"], 2)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for stock_code in pending:
+                    executor.submit(self._sync_one, job, stock_code, cancel_event)
+        except Exception as e:
+            print(f"补数任务 {job_id} 执行失败: {e}")
+            self._set_status(job_id, "failed", finished=True, error=str(e))
+            return
+
+        if cancel_event.is_set():
+            self._set_status(job_id, "cancelled", finished=True)
+        else:
+            self._set_status(job_id, "completed", finished=True)
+
+    def _sync_one(self, job: Dict, stock_code: str, cancel_event: threading.Event):
+        if cancel_event.is_set():
+            return
+
+        with self._get_source_slot(job["source"]):
+            while not cancel_event.is_set():
+                try:
+                    result = self.data_manager.sync_offline_data(
+                        stock_code=stock_code,
+                        source=job["source"],
+                        start_date=job["start_date"],
+                        end_date=job["end_date"],
+                        force_full=job["force_full"],
+                    )
+                    if result.get("success"):
+                        self._record_item(job["job_id"], stock_code, "success", int(result.get("added_rows") or 0), result.get("message"))
+                    else:
+                        # sync_offline_data 以返回值报告的失败（如数据源不可用）同样计入失败
+                        message = result.get("message") or result.get("error") or "补数失败"
+                        print(f"补数任务 {job['job_id']} 同步 {stock_code} 失败: {message}")
+                        self._record_item(job["job_id"], stock_code, "failed", 0, message)
+                except SourceCircuitOpenError as e:
+                    # 数据源熔断时整体暂停，冷却结束后重试当前股票，而不是把剩余股票全部记为失败
+                    cancel_event.wait(max(1.0, e.retry_after))
+                    continue
+                except Exception as e:
+                    print(f"补数任务 {job['job_id']} 同步 {stock_code} 失败: {e}")
+                    self._record_item(job["job_id"], stock_code, "failed", 0, str(e))
+                return
+
+    def _record_item(self, job_id: str, stock_code: str, status: str, added_rows: int, message: Optional[str]):
+        now = self._now()
+        counter = "succeeded" if status == "success" else "failed"
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    UPDATE sync_job_items SET status = ?, added_rows = ?, message = ?, updated_at = ?
+                    WHERE job_id = ? AND stock_code = ?
+                ''', (status, added_rows, message, now, job_id, stock_code))
+                conn.execute(f'''
+                    UPDATE sync_jobs SET {counter} = {counter} + 1, added_rows = added_rows + ?,
+                    last_stock_code = ?, updated_at = ?
+                    WHERE job_id = ?
+                ''', (added_rows, stock_code, now, job_id))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _set_status(self, job_id: str, status: str, finished: bool = False, error: Optional[str] = None):
+        now = self._now()
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    UPDATE sync_jobs SET status = ?, updated_at = ?, finished_at = ?, error = COALESCE(?, error)
+                    WHERE job_id = ?
+                ''', (status, now, now if finished else None, error, job_id))
+                conn.commit()
+            finally:
+                conn.close()
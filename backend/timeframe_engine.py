@@ -0,0 +1,148 @@
+import re
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class TimeframeIndex:
+    """某一周期下的分组索引：每组第一根日K线的位置、组标签以及每根日K线所属的组。"""
+
+    def __init__(self, starts: np.ndarray, labels: np.ndarray, length: int):
+        self.starts = starts
+        self.labels = labels
+        self.length = length
+        self.bucket_of_bar = np.repeat(np.arange(len(starts), dtype=np.int64), np.diff(np.append(starts, length)))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def count_until(self, index: int) -> int:
+        """截至第 index 根日K线（含）已出现的组数。"""
+        return int(self.bucket_of_bar[index]) + 1
+
+    def is_bucket_start(self, index: int) -> bool:
+        return bool(self.starts[self.bucket_of_bar[index]] == index)
+
+    def aggregate(
+        self,
+        columns: Dict[str, np.ndarray],
+        first_bucket: int = 0,
+        end: Optional[int] = None,
+    ) -> Dict[str, np.ndarray]:
+        """聚合从 first_bucket 开始、截止到第 end 根日K线（不含）的各组。
+
+        columns 为全区间的日K线数组，聚合方式由 TimeframeEngine.AGGREGATIONS 决定，
+        最后一组只包含 end 之前的日K线，用于当前尚未走完的周期。
+        """
+        end = self.length if end is None else end
+        last_bucket = int(self.bucket_of_bar[end - 1]) + 1
+        starts = self.starts[first_bucket:last_bucket]
+        if len(starts) == 0:
+            return {name: np.empty(0, dtype=float) for name in columns}
+
+        offsets = starts - starts[0]
+        stops = np.append(starts[1:], end)
+        result = {}
+        for name, values in columns.items():
+            how = TimeframeEngine.AGGREGATIONS.get(name, "last")
+            if how == "first":
+                result[name] = values[starts]
+            elif how == "last":
+                result[name] = values[stops - 1]
+            else:
+                window = values[starts[0] : end]
+                if how == "max":
+                    result[name] = np.maximum.reduceat(window, offsets)
+                elif how == "min":
+                    result[name] = np.minimum.reduceat(window, offsets)
+                else:
+                    result[name] = np.add.reduceat(window, offsets)
+        return result
+
+
+class TimeframeEngine:
+    """由日K线日期一次性计算各周期的分组边界，周/月/季/N日视图都从同一组日K数组聚合。
+
+    周期写法：daily、weekly（W-FRI，以周五为标签）、monthly（以月末为标签）、
+    quarterly（以季末为标签），以及 N 日线如 "3d"（按交易日计数分组，以组内第一天为标签）。
+    """
+
+    AGGREGATIONS = {
+        "open": "first",
+        "high": "max",
+        "low": "min",
+        "close": "last",
+        "volume": "sum",
+        "amount": "sum",
+        "turnover_rate": "sum",
+        "factor": "last",
+    }
+
+    _N_DAY_PATTERN = re.compile(r"^(\d+)d$")
+
+    def __init__(self, dates):
+        self.dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype="datetime64[D]")
+        self._indexes: Dict[str, TimeframeIndex] = {}
+
+    @classmethod
+    def normalize(cls, timeframe: Optional[str]) -> str:
+        timeframe = (timeframe or "daily").strip().lower()
+        if timeframe in {"daily", "1d"}:
+            return "daily"
+        if timeframe in {"weekly", "monthly", "quarterly"}:
+            return timeframe
+        match = cls._N_DAY_PATTERN.match(timeframe)
+        if match and int(match.group(1)) > 0:
+            return timeframe
+        raise ValueError(f"不支持的K线周期: {timeframe}")
+
+    def get_index(self, timeframe: str) -> TimeframeIndex:
+        timeframe = self.normalize(timeframe)
+        if timeframe not in self._indexes:
+            self._indexes[timeframe] = self._build_index(timeframe)
+        return self._indexes[timeframe]
+
+    def _build_index(self, timeframe: str) -> TimeframeIndex:
+        length = len(self.dates)
+        if length == 0:
+            return TimeframeIndex(np.empty(0, dtype=np.int64), np.empty(0, dtype="datetime64[ns]"), 0)
+
+        days = self.dates.astype(np.int64)
+        if timeframe == "daily":
+            starts = np.arange(length, dtype=np.int64)
+            return TimeframeIndex(starts, self.dates.astype("datetime64[ns]"), length)
+
+        match = self._N_DAY_PATTERN.match(timeframe)
+        if match:
+            starts = np.arange(0, length, int(match.group(1)), dtype=np.int64)
+            return TimeframeIndex(starts, self.dates[starts].astype("datetime64[ns]"), length)
+
+        if timeframe == "weekly":
+            weekday = (days + 3) % 7  # 1970-01-01 为周四，周一记为 0
+            keys = days + (4 - weekday) % 7
+            labels = keys.astype("datetime64[D]")
+        else:
+            months = self.dates.astype("datetime64[M]").astype(np.int64)
+            if timeframe == "quarterly":
+                months = months - months % 3 + 2
+            keys = months
+            labels = (keys + 1).astype("datetime64[M]").astype("datetime64[D]") - np.timedelta64(1, "D")
+
+        is_start = np.ones(length, dtype=bool)
+        is_start[1:] = keys[1:] != keys[:-1]
+        starts = np.flatnonzero(is_start)
+        return TimeframeIndex(starts, labels[starts].astype("datetime64[ns]"), length)
+
+    def resample(self, data: Optional[pd.DataFrame], timeframe: str) -> Optional[pd.DataFrame]:
+        """把按日期排序的日K DataFrame 聚合到指定周期，日期列替换为组标签。"""
+        if data is None or data.empty:
+            return data
+
+        index = self.get_index(timeframe)
+        columns = {name: data[name].to_numpy(dtype=float) for name in self.AGGREGATIONS if name in data.columns}
+        aggregated = index.aggregate(columns)
+        frame = pd.DataFrame({"date": index.labels})
+        for name, values in aggregated.items():
+            frame[name] = values
+        return frame
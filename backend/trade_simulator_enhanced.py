@@ -1,11 +1,16 @@
+import bisect
 import sqlite3
 import os
 import json
 from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional
 import pandas as pd
 
+from backend.equity_curve import EquityCurve
+from backend.performance_analytics import PerformanceAnalyzer
+from backend.trade_store import TradeStore
+
 
 def calculate_trade_performance(trade_history):
     """
@@ -75,11 +80,46 @@ def calculate_trade_performance(trade_history):
     }
 
 
+class TradingCalendar:
+    """训练K线的交易日历：把 YYYY-MM-DD 日期映射为交易日序号，T+1 等日期运算都用整数比较。
+
+    未设置交易日时按自然日序号计算，与只按日期加一天的旧逻辑一致。
+    """
+    
+    def __init__(self, dates: Iterable = ()):
+        days = pd.DatetimeIndex(pd.to_datetime(pd.Index(dates)))
+        self.days: List[str] = list(days.normalize().unique().sort_values().strftime('%Y-%m-%d'))
+        self._index = {day: i for i, day in enumerate(self.days)}
+    
+    def index_of(self, date: str) -> int:
+        """交易日返回其序号；非交易日返回其后第一个交易日的序号"""
+        day = str(date)[:10]
+        index = self._index.get(day)
+        if index is not None:
+            return index
+        if not self.days:
+            return datetime.strptime(day, '%Y-%m-%d').toordinal()
+        return bisect.bisect_left(self.days, day)
+    
+    def date_at(self, index: int) -> str:
+        """序号对应的日期；超出日历范围时按自然日顺延"""
+        if not self.days:
+            return datetime.fromordinal(index).strftime('%Y-%m-%d')
+        if index < len(self.days):
+            return self.days[index]
+        last = datetime.strptime(self.days[-1], '%Y-%m-%d')
+        return (last + timedelta(days=index - len(self.days) + 1)).strftime('%Y-%m-%d')
+
+
 class TradeSimulatorEnhanced:
     """增强版交易模拟器，支持持仓汇总、佣金设置、bar ID记录等功能"""
     
-    def __init__(self, user: str, initial_capital: float, stock_code: str):
+    SCHEMA_VERSION = 1
+    FLUSH_TIMEOUT = 5.0  # 等待交易记录落盘的最长秒数
+    
+    def __init__(self, user: str, initial_capital: float, stock_code: str, session_id: str = ''):
         self.user = user
+        self.session_id = session_id
         self.stock_code = stock_code
         self.initial_capital = initial_capital
         self.current_capital = initial_capital
@@ -91,17 +131,25 @@ class TradeSimulatorEnhanced:
         self.min_commission = 5.0      # 最低佣金5元
         self.stamp_tax_rate = 0.001    # 千分之一印花税（仅卖出）
         
-        # 持仓信息（汇总模式）
+        # 持仓信息（汇总模式，只在成交与推进K线时更新，查询账户时直接读取）
         self.total_shares = 0          # 总持股数
         self.available_shares = 0      # 可卖出股数（T+1限制）
+        self.locked_shares = 0         # 当日买入、尚未解禁的股数
         self.average_cost = 0.0        # 平均成本价
         self.total_cost = 0.0          # 总成本
+        self.realized_pnl = 0.0        # 已实现盈亏（卖出净收入减去对应持仓成本）
+        self.traded_amount = 0.0       # 累计成交金额，用于计算换手率
         
         # 持仓明细（用于T+1计算）
         self.position_lots = []        # 持仓批次列表
+        self._lot_head = 0             # 第一个未卖完批次的位置，FIFO 卖出从这里开始
+        self._locked_by_index = {}     # 解禁交易日序号 -> 待解禁股数
+        self._settled_index = None     # 已处理解禁的最新交易日序号
+        self.calendar = TradingCalendar()  # 交易日历，由训练会话按加载的K线日期设置
         
         # 交易记录
         self.trade_history = []
+        self.equity_curve = EquityCurve()  # 逐K线资金曲线，定期批量写入 bar_history
         
         # 数据库连接
         self.db_path = f'../users/{user}/trade_records.db'
@@ -111,13 +159,32 @@ class TradeSimulatorEnhanced:
         """初始化数据库"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # 建表与迁移在独立连接上同步完成，不进写入队列：整批失败后的逐条重试不会重复执行 ALTER
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._migrate_schema(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        
+        # 之后的写操作交给后台写入器批量提交
+        self.store = TradeStore.for_path(self.db_path)
+    
+    def _migrate_schema(self, conn: sqlite3.Connection):
+        """建表并把旧库升级到 SCHEMA_VERSION：三张表增加 session_id 列与按会话的复合索引"""
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= self.SCHEMA_VERSION:
+            return
         
         # 创建交易记录表（增加bar_id字段）
-        cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS trades (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL DEFAULT '',
                 stock_code TEXT NOT NULL,
                 action TEXT NOT NULL,
                 quantity INTEGER NOT NULL,
@@ -133,9 +200,11 @@ class TradeSimulatorEnhanced:
         ''')
         
         # 创建持仓批次表
-        cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS position_lots (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL DEFAULT '',
+                lot_no INTEGER NOT NULL DEFAULT 0,
                 stock_code TEXT NOT NULL,
                 quantity INTEGER NOT NULL,
                 cost_price REAL NOT NULL,
@@ -147,9 +216,10 @@ class TradeSimulatorEnhanced:
         ''')
         
         # 创建账户记录表
-        cursor.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS account_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL DEFAULT '',
                 total_assets REAL NOT NULL,
                 available_cash REAL NOT NULL,
                 position_value REAL NOT NULL,
@@ -160,8 +230,22 @@ class TradeSimulatorEnhanced:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # 旧库的历史记录没有会话归属，session_id 记为空字符串
+        for table in ('trades', 'position_lots', 'account_history'):
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if 'session_id' not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN session_id TEXT NOT NULL DEFAULT ''")
+            if table == 'position_lots' and 'lot_no' not in columns:
+                conn.execute("ALTER TABLE position_lots ADD COLUMN lot_no INTEGER NOT NULL DEFAULT 0")
+        
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_trades_session_bar ON trades (session_id, bar_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_position_lots_session_bar ON position_lots (session_id, buy_bar_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_account_history_session_bar ON account_history (session_id, bar_id)')
+        conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+    
+    def set_trading_calendar(self, dates: Iterable):
+        """按训练K线的日期建立交易日历，T+1 以下一个交易日为准"""
+        self.calendar = TradingCalendar(dates)
     
     def set_commission_settings(self, commission_rate: float, min_commission: float, stamp_tax_rate: float):
         """设置佣金参数"""
@@ -169,11 +253,52 @@ class TradeSimulatorEnhanced:
         self.min_commission = min_commission
         self.stamp_tax_rate = stamp_tax_rate
     
-    def update_current_price(self, price: float, bar_id: int):
-        """更新当前股价和bar ID"""
+    def update_current_price(self, price: float, bar_id: int, trade_date: Optional[str] = None):
+        """更新当前股价和bar ID，传入日期时顺带解禁到期的持仓"""
         self.current_price = price
         self.current_bar_id = bar_id
-        self._update_position_pnl()
+        if trade_date:
+            self._settle_locked_shares(trade_date)
+    
+    def record_bar(self, bar: Dict, trade_date: str):
+        """把当前K线的账户状态写入资金曲线缓冲区（只写内存），同一根K线重复调用时覆盖"""
+        market_value = self.total_shares * self.current_price
+        self.equity_curve.append(
+            bar_id=self.current_bar_id,
+            date=trade_date,
+            bar=bar,
+            total_assets=self.current_capital + market_value,
+            available_cash=self.current_capital,
+            position_value=market_value,
+            floating_pnl=market_value - self.total_cost if self.total_shares > 0 else 0.0,
+            total_shares=self.total_shares,
+            average_cost=self.average_cost,
+        )
+    
+    def _sync_equity_tail(self):
+        """以当前账户状态覆盖资金曲线的当前K线，保证曲线终点、回撤与 final_capital 一致"""
+        rows = self.equity_curve.rows
+        if len(rows) == 0 or rows['bar_id'][-1] != self.current_bar_id:
+            return
+        last = rows[-1]
+        bar = {field: float(last[field]) for field in ('open', 'high', 'low', 'close', 'volume')}
+        self.record_bar(bar, str(last['date']))
+    
+    def _settle_locked_shares(self, current_date: str) -> int:
+        """把解禁日不晚于 current_date 的锁定股数转入可卖，返回当前交易日序号。
+
+        交易日只会前进，每个买入批次只解禁一次，均摊 O(1)。
+        """
+        current_index = self.calendar.index_of(current_date)
+        if self._settled_index is not None and current_index <= self._settled_index:
+            return current_index
+        
+        for available_index in [index for index in self._locked_by_index if index <= current_index]:
+            shares = self._locked_by_index.pop(available_index)
+            self.locked_shares -= shares
+            self.available_shares += shares
+        self._settled_index = current_index
+        return current_index
     
     def _calculate_commission(self, amount: float) -> float:
         """计算佣金"""
@@ -185,29 +310,30 @@ class TradeSimulatorEnhanced:
         return round(amount * self.stamp_tax_rate,2)
     
     def get_max_buyable_quantity(self) -> int:
-        """根据可用资金、佣金、股价动态计算最大可买数量（手数）"""
-        if self.current_price <= 0:
+        """根据可用资金、佣金、股价直接计算最大可买数量（手数）
+
+        总成本 = 金额 + max(金额 × 佣金率, 最低佣金)，两段分别要求
+        金额 ≤ 资金 - 最低佣金 与 金额 × (1 + 佣金率) ≤ 资金，取两者较小的手数；
+        佣金按分四舍五入，最后用实际成本向上下各校正一手。
+        """
+        if self.current_price <= 0 or self.current_capital <= 0:
             return 0
         
-        # 二分查找最大可买手数
-        left, right = 0, int(self.current_capital / (self.current_price * 100))
-        max_quantity = 0
-        
-        while left <= right:
-            mid = (left + right) // 2
-            shares = mid * 100
-            amount = shares * self.current_price
-            commission = self._calculate_commission(amount)
-            total_cost = amount + commission
-            
-            if total_cost <= self.current_capital:
-                max_quantity = mid
-                left = mid + 1
-            else:
-                right = mid - 1
+        lot_value = self.current_price * 100
+        by_min_commission = int((self.current_capital - self.min_commission) // lot_value)
+        by_rate = int(self.current_capital // (lot_value * (1 + self.commission_rate)))
+        max_quantity = max(0, min(by_min_commission, by_rate))
         
+        if self._buy_cost(max_quantity + 1) <= self.current_capital:
+            max_quantity += 1
+        while max_quantity > 0 and self._buy_cost(max_quantity) > self.current_capital:
+            max_quantity -= 1
         return max_quantity
     
+    def _buy_cost(self, quantity: int) -> float:
+        amount = quantity * 100 * self.current_price
+        return amount + self._calculate_commission(amount)
+    
     def buy(self, quantity: int, price: float, trade_date: str) -> Dict:
         """买入股票（quantity为手数）"""
         try:
@@ -245,6 +371,7 @@ class TradeSimulatorEnhanced:
             
             # 执行买入
             self.current_capital -= total_cost
+            self.traded_amount += amount
             
             # 更新持仓汇总
             if self.total_shares > 0:
@@ -261,17 +388,21 @@ class TradeSimulatorEnhanced:
                 self.total_shares = total_shares
             
             # 添加持仓批次（T+1规则，次日才能卖出）
-            next_day = (pd.to_datetime(trade_date) + timedelta(days=1)).strftime('%Y-%m-%d')
+            available_bar_index = self._settle_locked_shares(trade_date) + 1
             position_lot = {
+                'lot_no': len(self.position_lots),  # 本局内的批次序号，同一根K线多次买入时用于区分批次
                 'stock_code': self.stock_code,
                 'quantity': total_shares,
                 'cost_price': price,
                 'buy_date': trade_date,
                 'buy_bar_id': self.current_bar_id,
-                'available_date': next_day,
+                'available_date': self.calendar.date_at(available_bar_index),
+                'available_bar_index': available_bar_index,
                 'status': 'active'
             }
             self.position_lots.append(position_lot)
+            self.locked_shares += total_shares
+            self._locked_by_index[available_bar_index] = self._locked_by_index.get(available_bar_index, 0) + total_shares
             
             # 记录交易 (检查是否同日有相同的买入操作，如果有则合并)
             merged = False
@@ -354,9 +485,11 @@ class TradeSimulatorEnhanced:
             
             # 执行卖出
             self.current_capital += net_amount
+            self.traded_amount += amount
             
             # 更新持仓汇总（FIFO原则）
-            self._reduce_positions(total_shares, trade_date)
+            sold_cost = self._reduce_positions(total_shares, trade_date)
+            self.realized_pnl += net_amount - sold_cost
             
             # 记录交易 (检查是否同日有相同的卖出操作，如果有则合并)
             merged = False
@@ -407,63 +540,51 @@ class TradeSimulatorEnhanced:
     
     def _get_available_shares(self, current_date: str) -> int:
         """获取可卖出股数（考虑T+1规则）"""
-        current_dt = pd.to_datetime(current_date)
-        available = 0
-        
-        for lot in self.position_lots:
-            if lot['status'] == 'active':
-                available_dt = pd.to_datetime(lot['available_date'])
-                if current_dt >= available_dt:
-                    available += lot['quantity']
-        
-        return available
+        self._settle_locked_shares(current_date)
+        return self.available_shares
     
-    def _reduce_positions(self, sell_shares: int, trade_date: str):
-        """减少持仓（FIFO原则）"""
+    def _reduce_positions(self, sell_shares: int, trade_date: str) -> float:
+        """减少持仓（FIFO原则），返回卖出部分的持仓成本"""
         remaining_shares = sell_shares
-        current_dt = pd.to_datetime(trade_date)
+        current_index = self._settle_locked_shares(trade_date)
+        sold_cost = 0.0
         
-        # 按买入时间排序（FIFO）
-        active_lots = [lot for lot in self.position_lots if lot['status'] == 'active']
-        active_lots.sort(key=lambda x: x['buy_bar_id'])
-        
-        for lot in active_lots:
-            if remaining_shares <= 0:
+        # 批次按买入顺序追加且解禁日单调不减，已卖完的批次都在 _lot_head 之前
+        changed_lots = []
+        index = self._lot_head
+        while remaining_shares > 0 and index < len(self.position_lots):
+            lot = self.position_lots[index]
+            if current_index < lot['available_bar_index']:
                 break
-                
-            available_dt = pd.to_datetime(lot['available_date'])
-            if current_dt >= available_dt:
-                if lot['quantity'] <= remaining_shares:
-                    # 完全卖出这个批次
-                    remaining_shares -= lot['quantity']
-                    lot['status'] = 'sold'
-                else:
-                    # 部分卖出
-                    lot['quantity'] -= remaining_shares
-                    remaining_shares = 0
-        
-        # 重新计算持仓汇总
-        self._recalculate_position_summary()
-        
-        # 更新数据库中的持仓状态
-        self._update_position_lots_in_db()
-    
-    def _recalculate_position_summary(self):
-        """重新计算持仓汇总"""
-        active_lots = [lot for lot in self.position_lots if lot['status'] == 'active']
+            
+            changed_lots.append(lot)
+            if lot['quantity'] <= remaining_shares:
+                # 完全卖出这个批次
+                remaining_shares -= lot['quantity']
+                sold_cost += lot['quantity'] * lot['cost_price']
+                lot['status'] = 'sold'
+                index += 1
+            else:
+                # 部分卖出
+                lot['quantity'] -= remaining_shares
+                sold_cost += remaining_shares * lot['cost_price']
+                remaining_shares = 0
+        self._lot_head = index
         
-        if not active_lots:
-            self.total_shares = 0
-            self.average_cost = 0.0
+        # 更新持仓汇总
+        sold_shares = sell_shares - remaining_shares
+        self.available_shares -= sold_shares
+        self.total_shares -= sold_shares
+        if self.total_shares > 0:
+            self.total_cost -= sold_cost
+            self.average_cost = self.total_cost / self.total_shares
+        else:
             self.total_cost = 0.0
-            return
-        
-        total_shares = sum(lot['quantity'] for lot in active_lots)
-        total_cost = sum(lot['quantity'] * lot['cost_price'] for lot in active_lots)
+            self.average_cost = 0.0
         
-        self.total_shares = total_shares
-        self.total_cost = total_cost
-        self.average_cost = total_cost / total_shares if total_shares > 0 else 0.0
+        # 更新数据库中的持仓状态
+        self._update_position_lots_in_db(changed_lots)
+        return sold_cost
     
     def _update_position_pnl(self):
         """更新持仓盈亏"""
@@ -491,11 +612,13 @@ class TradeSimulatorEnhanced:
             'floating_pnl': pnl_info['floating_pnl'],
             'initial_capital': self.initial_capital,
             'total_return': ((total_assets - self.initial_capital) / self.initial_capital) * 100,
+            'realized_pnl': self.realized_pnl,
             'current_bar_id': self.current_bar_id,
             'max_buyable_quantity': self.get_max_buyable_quantity(),
             'position_summary': {
                 'total_shares': self.total_shares,
                 'available_shares': available_shares,
+                'locked_shares': self.locked_shares,
                 'average_cost': self.average_cost,
                 'current_price': self.current_price,
                 'pnl_percent': pnl_info['pnl_percent']
@@ -506,9 +629,13 @@ class TradeSimulatorEnhanced:
         """获取包含bar ID的交易历史"""
         return self.trade_history.copy()
     
-    def generate_report(self, stock_code: str, start_date: str, end_date: str) -> Dict:
+    def generate_report(self, stock_code: str, start_date: str, end_date: str, period: str = 'daily') -> Dict:
         """生成复盘报告"""
         account_info = self.get_account_info(end_date)
+        self._sync_equity_tail()
+        
+        # 回撤、夏普/索提诺、持仓时间占比、换手率、持仓周期与 MAE/MFE 均由资金曲线向量化计算
+        analytics = PerformanceAnalyzer(self.equity_curve.rows, self.initial_capital, period).analyze(self.traded_amount)
         
         # 计算交易统计
         buy_trades = [t for t in self.trade_history if t['action'] == 'buy']
@@ -545,7 +672,7 @@ class TradeSimulatorEnhanced:
             })
         
         return {
-            'session_id': getattr(self, 'session_id', ''),
+            'session_id': self.session_id,
             'stock_code': stock_code,
             'stock_name': f'股票{stock_code}',
             'start_date': start_date,
@@ -553,6 +680,16 @@ class TradeSimulatorEnhanced:
             'initial_capital': self.initial_capital,
             'final_capital': account_info['total_assets'],
             'total_return': account_info['total_return'],
+            'max_drawdown': analytics['max_drawdown'],
+            'max_drawdown_duration': analytics['max_drawdown_duration'],
+            'sharpe_ratio': analytics['sharpe_ratio'],
+            'sortino_ratio': analytics['sortino_ratio'],
+            'exposure_time': analytics['exposure_time'],  # 持仓K线占比（%）
+            'turnover': analytics['turnover'],  # 累计成交额 / 平均总资产
+            'avg_holding_period': analytics['avg_holding_period'],  # 平均持仓K线数
+            'round_trips': analytics['round_trips'],
+            'equity_curve': self.equity_curve.to_series(),
+            'drawdown_series': analytics['drawdown_series'],
             'total_trades': total_trades,
             'trade_win_rate': trade_win_rate,  # 交易胜率
             'session_win_rate': session_win_rate,  # 局胜率
@@ -573,88 +710,90 @@ class TradeSimulatorEnhanced:
         self.current_capital = self.initial_capital
         self.total_shares = 0
         self.available_shares = 0
+        self.locked_shares = 0
         self.average_cost = 0.0
         self.total_cost = 0.0
+        self.realized_pnl = 0.0
+        self.traded_amount = 0.0
         self.position_lots = []
+        self._lot_head = 0
+        self._locked_by_index = {}
+        self._settled_index = None
         self.trade_history = []
+        self.equity_curve.reset()
         self.current_bar_id = 0
         
         # 清空数据库记录
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM trades')
-        cursor.execute('DELETE FROM position_lots')
-        cursor.execute('DELETE FROM account_history')
-        conn.commit()
-        conn.close()
+        # 只清空本局的记录，其他训练会话的历史保留
+        self.store.execute('DELETE FROM trades WHERE session_id = ?', (self.session_id,))
+        self.store.execute('DELETE FROM position_lots WHERE session_id = ?', (self.session_id,))
+        self.store.execute('DELETE FROM account_history WHERE session_id = ?', (self.session_id,))
+        if not self.flush():
+            print(f"重置交易记录超时: {self.db_path}")
+
+    def flush(self, timeout: Optional[float] = FLUSH_TIMEOUT) -> bool:
+        """等待已入队的交易记录全部写入数据库，超时或写入线程不可用时返回 False"""
+        return self.store.flush(timeout)
     
     def _save_trade_to_db(self, trade: Dict, update: bool = False):
         """保存交易记录到数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            if update:
-                # 如果是更新，根据trade_date和action更新最后一条记录
-                cursor.execute('''
-                    UPDATE trades 
-                    SET quantity = ?, price = ?, amount = ?, commission = ?, stamp_tax = ?, net_amount = ?, created_at = ?
-                    WHERE id = (
-                        SELECT id FROM trades 
-                        WHERE stock_code = ? AND trade_date = ? AND action = ? 
-                        ORDER BY id DESC LIMIT 1
-                    )
-                ''', (
-                    trade['quantity'], trade['price'], trade['amount'], trade['commission'], 
-                    trade['stamp_tax'], trade['net_amount'], trade['timestamp'],
-                    trade['stock_code'], trade['trade_date'], trade['action']
-                ))
-            else:
-                cursor.execute('''
-                    INSERT INTO trades (stock_code, action, quantity, price, amount, commission, stamp_tax, net_amount, trade_date, bar_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    trade['stock_code'],
-                    trade['action'],
-                    trade['quantity'],
-                    trade['price'],
-                    trade['amount'],
-                    trade['commission'],
-                    trade['stamp_tax'],
-                    trade['net_amount'],
-                    trade['trade_date'],
-                    trade['bar_id']
-                ))
-            conn.commit()
+        if update:
+            # 如果是更新，根据trade_date和action更新最后一条记录
+            self.store.execute('''
+                UPDATE trades 
+                SET quantity = ?, price = ?, amount = ?, commission = ?, stamp_tax = ?, net_amount = ?, created_at = ?
+                WHERE id = (
+                    SELECT id FROM trades 
+                    WHERE session_id = ? AND bar_id = ? AND action = ? 
+                    ORDER BY id DESC LIMIT 1
+                )
+            ''', (
+                trade['quantity'], trade['price'], trade['amount'], trade['commission'], 
+                trade['stamp_tax'], trade['net_amount'], trade['timestamp'],
+                self.session_id, trade['bar_id'], trade['action']
+            ))
+        else:
+            self.store.execute('''
+                INSERT INTO trades (session_id, stock_code, action, quantity, price, amount, commission, stamp_tax, net_amount, trade_date, bar_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                self.session_id,
+                trade['stock_code'],
+                trade['action'],
+                trade['quantity'],
+                trade['price'],
+                trade['amount'],
+                trade['commission'],
+                trade['stamp_tax'],
+                trade['net_amount'],
+                trade['trade_date'],
+                trade['bar_id']
+            ))
     
     def _save_position_lot_to_db(self, lot: Dict):
         """保存持仓批次到数据库"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO position_lots (stock_code, quantity, cost_price, buy_date, buy_bar_id, available_date, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                lot['stock_code'],
-                lot['quantity'],
-                lot['cost_price'],
-                lot['buy_date'],
-                lot['buy_bar_id'],
-                lot['available_date'],
-                lot['status']
-            ))
-            conn.commit()
+        self.store.execute('''
+            INSERT INTO position_lots (session_id, lot_no, stock_code, quantity, cost_price, buy_date, buy_bar_id, available_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            self.session_id,
+            lot['lot_no'],
+            lot['stock_code'],
+            lot['quantity'],
+            lot['cost_price'],
+            lot['buy_date'],
+            lot['buy_bar_id'],
+            lot['available_date'],
+            lot['status']
+        ))
     
-    def _update_position_lots_in_db(self):
-        """更新数据库中的持仓批次状态"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            for lot in self.position_lots:
-                cursor.execute('''
-                    UPDATE position_lots 
-                    SET quantity = ?, status = ?
-                    WHERE stock_code = ? AND buy_bar_id = ? AND status = 'active'
-                ''', (lot['quantity'], lot['status'], lot['stock_code'], lot['buy_bar_id']))
-            conn.commit()
-
+    def _update_position_lots_in_db(self, lots: List[Dict]):
+        """更新数据库中的持仓批次状态（只写本次变动的批次）"""
+        self.store.executemany('''
+            UPDATE position_lots 
+            SET quantity = ?, status = ?
+            WHERE session_id = ? AND buy_bar_id = ? AND lot_no = ?
+        ''', [
+            (lot['quantity'], lot['status'], self.session_id, lot['buy_bar_id'], lot['lot_no'])
+            for lot in lots
+        ])
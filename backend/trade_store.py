@@ -0,0 +1,154 @@
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class TradeStore:
+    """用户交易库的异步写入器：每个数据库一条长连接，写操作入队后由后台线程批量提交。
+
+    连接开启 WAL 与 synchronous=NORMAL，交易请求只负责入队，不再等待磁盘同步；
+    队列按提交顺序执行，同一批写操作在一个事务内完成。需要落盘的时机（结束训练、
+    重置、进程退出）调用 flush 等待队列清空。
+    """
+
+    BATCH_SIZE = 256
+    FLUSH_POLL_INTERVAL = 0.5  # flush 等待期间检查写入线程是否存活的间隔（秒）
+
+    _registry: Dict[str, "TradeStore"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._writer = threading.Thread(target=self._run_writer, daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def for_path(cls, db_path: str) -> "TradeStore":
+        """同一个数据库文件在进程内共用一个写入器；写入线程已退出（打不开数据库）时重新创建。"""
+        key = os.path.abspath(db_path)
+        with cls._registry_lock:
+            store = cls._registry.get(key)
+            if store is None or not store.alive:
+                store = cls(db_path)
+                cls._registry[key] = store
+            return store
+
+    @classmethod
+    def flush_all(cls, timeout: Optional[float] = None):
+        with cls._registry_lock:
+            stores = list(cls._registry.values())
+        for store in stores:
+            store.flush(timeout)
+
+    def execute(self, sql: str, params: Sequence = ()):
+        self._queue.put(("execute", sql, tuple(params)))
+
+    def executemany(self, sql: str, rows: Iterable[Sequence]):
+        rows = [tuple(row) for row in rows]
+        if rows:
+            self._queue.put(("executemany", sql, rows))
+
+    def run(self, func: Callable[[sqlite3.Connection], None]):
+        """在写入线程的连接上按队列顺序执行 func(conn)；整批失败时会逐条重试，func 需可重复执行。"""
+        self._queue.put(("call", func, None))
+
+    @property
+    def alive(self) -> bool:
+        return self._writer.is_alive()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待此前入队的写操作全部提交，超时或写入线程已退出时返回 False。"""
+        if not self.alive:
+            return False
+        done = threading.Event()
+        self._queue.put(("flush", done, None))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.FLUSH_POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+            if done.wait(wait):
+                return True
+            if not self.alive:
+                return False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _run_writer(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            self.errors += 1
+            print(f"打开交易数据库失败: {e}")
+            return
+        while True:
+            batch: List[Tuple] = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(conn, batch)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple]):
+        waiters = [target for kind, target, _ in batch if kind == "flush"]
+        writes = [op for op in batch if op[0] != "flush"]
+        try:
+            written = self._apply(conn, writes)
+            conn.commit()
+            self.written += written
+            self.batches += 1
+        except Exception:
+            # 整批失败时逐条重试，避免一条坏记录拖累同批其他写入
+            conn.rollback()
+            for op in writes:
+                try:
+                    written = self._apply(conn, [op])
+                    conn.commit()
+                    self.written += written
+                except Exception as e:
+                    conn.rollback()
+                    self.errors += 1
+                    print(f"写入交易记录失败: {e}")
+        finally:
+            for waiter in waiters:
+                waiter.set()
+
+    def _apply(self, conn: sqlite3.Connection, writes: List[Tuple]) -> int:
+        written = 0
+        for kind, target, params in writes:
+            if kind == "call":
+                target(conn)
+            elif kind == "executemany":
+                conn.executemany(target, params)
+                written += len(params)
+            else:
+                conn.execute(target, params)
+                written += 1
+        return written
+
+    def stats(self) -> Dict:
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+
+atexit.register(TradeStore.flush_all, 10)
@@ -135,6 +135,14 @@ class UserManagerEnhanced:
         """记录每个bar的状态"""
         return self.history_manager.record_bar_state(username, session_id, bar_data)
     
+    def record_bar_states(self, username: str, session_id: str, rows: List[tuple]) -> bool:
+        """批量记录bar状态"""
+        return self.history_manager.record_bar_states(username, session_id, rows)
+    
+    def clear_bar_states(self, username: str, session_id: str) -> bool:
+        """删除会话已记录的bar状态"""
+        return self.history_manager.clear_bar_states(username, session_id)
+    
     def record_trade(self, username: str, session_id: str, trade_data: Dict) -> bool:
         """记录交易"""
         return self.history_manager.record_trade(username, session_id, trade_data)
@@ -17,6 +17,7 @@ let bollSeries = {}; // 用于存储BOLL指标线
 let autoSyncInterval = null;
 let lastKnownBarId = null;
 let lastKnownTradeCount = null;
+let lastTickTradeCount = null;
 let maPeriods = [5, 10, 20]; // 默认MA周期
 let isShiftClicked = false;
 let isShiftKeyPressed = false;
@@ -68,11 +69,18 @@ function updateThemeButton() {
     }
 }
 
+const VIEW_PERIOD_LABELS = {
+    daily: '日K',
+    weekly: '周K',
+    monthly: '月K',
+    quarterly: '季K'
+};
+
 function updatePeriodBadge(period) {
     currentPeriod = period || 'daily';
     const badge = document.getElementById('current-period');
     if (badge) {
-        badge.textContent = currentPeriod === 'weekly' ? '周K' : '日K';
+        badge.textContent = VIEW_PERIOD_LABELS[currentPeriod] || currentPeriod.toUpperCase();
     }
     document.querySelectorAll('.view-period-btn').forEach((button) => {
         button.classList.toggle('active', button.dataset.period === currentPeriod);
@@ -279,7 +287,10 @@ function getChipPriceCoordinate(price, containerHeight) {
     return ((maxPrice - clampedPrice) / (maxPrice - minPrice)) * containerHeight;
 }
 
-async function updateChipDistribution() {
+// options.asOfBarId：查看历史某根日K线时的筹码分布（事件监听调用时 options 为 Event）
+async function updateChipDistribution(options = {}) {
+    const asOfBarId = Number.isInteger(options?.asOfBarId) ? options.asOfBarId : null;
+    if (asOfBarId === null) chipHoverBarId = null;
     const toggleCb = document.getElementById('toggle-chip-distribution');
     const profitRatioContainer = document.getElementById('profit-ratio-container');
     
@@ -301,7 +312,8 @@ async function updateChipDistribution() {
     if (!currentTraining || !currentTraining.id) return;
 
     try {
-        const response = await fetch(`${API_BASE}/training/${currentTraining.id}/chip_distribution?bins=80&${getViewPeriodQuery()}`);
+        const asOfQuery = asOfBarId !== null ? `&as_of_bar_id=${asOfBarId}` : '';
+        const response = await fetch(`${API_BASE}/training/${currentTraining.id}/chip_distribution?bins=80&${getViewPeriodQuery()}${asOfQuery}`);
         if (response.ok) {
             chipDistributionData = await response.json();
             scheduleChipDistributionRender();
@@ -315,6 +327,23 @@ async function updateChipDistribution() {
     }
 }
 
+// 鼠标悬停在历史K线上时，防抖后展示该K线收盘时的筹码分布
+let chipHoverTimer = null;
+let chipHoverBarId = null;
+
+function scheduleChipHover(barId) {
+    const toggleCb = document.getElementById('toggle-chip-distribution');
+    if (!toggleCb || !toggleCb.checked || currentPeriod !== 'daily' || isPlaying) return;
+    if (barId === chipHoverBarId) return;
+    chipHoverBarId = barId;
+
+    if (chipHoverTimer) clearTimeout(chipHoverTimer);
+    chipHoverTimer = setTimeout(() => {
+        chipHoverTimer = null;
+        updateChipDistribution(barId === null ? {} : { asOfBarId: barId });
+    }, 150);
+}
+
 function renderChipDistribution() {
     try {
         const toggleCb = document.getElementById('toggle-chip-distribution');
@@ -672,6 +701,7 @@ function setupEventListeners() {
     });
     document.getElementById('data-sync-btn')?.addEventListener('click', showDataSyncModal);
     document.getElementById('confirm-sync-btn')?.addEventListener('click', syncOfflineData);
+    document.getElementById('stop-sync-job-btn')?.addEventListener('click', cancelSyncJob);
     document.getElementById('cancel-sync-btn')?.addEventListener('click', hideDataSyncModal);
     document.getElementById('sync-scope')?.addEventListener('change', updateSyncScopeUI);
     document.querySelectorAll('.view-period-btn').forEach((button) => {
@@ -1202,6 +1232,7 @@ function showDataSyncModal() {
 
     updateSyncScopeUI();
     modal.classList.remove('hidden');
+    resumeWatchingSyncJob();
 }
 
 function hideDataSyncModal() {
@@ -1229,12 +1260,6 @@ function updateSyncProgress(completed, total, label = '') {
     progressText.textContent = label || `${completed}/${total}`;
 }
 
-function getSyncThrottleMs(source) {
-    if (source === 'xtdata') return 40;
-    if (source === 'mootdx') return 240;
-    return 260;
-}
-
 function getSyncScopeLabel(scope) {
     if (scope === 'sh') return '全沪市';
     if (scope === 'sz') return '全深市';
@@ -1276,6 +1301,109 @@ async function syncSingleStock(stockCode, source, startDate, endDate, forceFull)
     return result;
 }
 
+async function createSyncJob(scope, source, startDate, endDate, forceFull) {
+    const response = await fetch(`${API_BASE}/data/sync_jobs`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            scope,
+            source,
+            start_date: startDate || null,
+            end_date: endDate || null,
+            force_full: forceFull,
+        }),
+    });
+    const result = await response.json();
+    if (!response.ok) {
+        throw new Error(result.error || '创建补数任务失败');
+    }
+    return result;
+}
+
+function renderSyncJob(job) {
+    const resultBox = document.getElementById('sync-result');
+    const stopBtn = document.getElementById('stop-sync-job-btn');
+    const running = job.status === 'pending' || job.status === 'running';
+    const scopeLabel = getSyncScopeLabel(job.scope);
+    const rangeLabel = describeSyncRange(job.start_date, job.end_date);
+
+    if (stopBtn) {
+        stopBtn.classList.toggle('hidden', !running);
+        stopBtn.dataset.jobId = job.job_id;
+    }
+
+    if (running) {
+        updateSyncProgress(job.completed, job.total, `正在补数 ${job.completed}/${job.total}（并发 ${job.concurrency}）${job.last_stock_code ? `：${job.last_stock_code}` : ''}`);
+        return;
+    }
+
+    updateSyncProgress(job.completed, job.total, `批量补数${job.status === 'completed' ? '完成' : '已停止'} ${job.completed}/${job.total}`);
+    if (resultBox) {
+        resultBox.classList.remove('hidden');
+        const statusText = job.status === 'completed' ? '完成' : (job.status === 'cancelled' ? '已取消' : '失败');
+        const errorText = job.recent_errors && job.recent_errors.length > 0
+            ? ` 最近失败：${job.recent_errors.map(item => item.stock_code).join('、')}。`
+            : '';
+        resultBox.textContent = `${statusText}: ${scopeLabel}区间 ${rangeLabel}，共 ${job.total} 只，成功 ${job.succeeded}，失败 ${job.failed}，累计新增 ${job.added_rows} 条。${job.last_stock_code ? ` 最近处理股票 ${job.last_stock_code}。` : ''}${errorText}`;
+    }
+}
+
+async function watchSyncJob(jobId) {
+    // 任务在服务端执行，关闭窗口后重新打开仍可通过任务 ID 继续查看进度
+    while (true) {
+        const response = await fetch(`${API_BASE}/data/sync_jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            localStorage.removeItem('offlineSyncJobId');
+            throw new Error(job.error || '获取补数任务进度失败');
+        }
+
+        renderSyncJob(job);
+        if (job.status !== 'pending' && job.status !== 'running') {
+            localStorage.removeItem('offlineSyncJobId');
+            return job;
+        }
+        await sleep(1000);
+    }
+}
+
+async function cancelSyncJob() {
+    const stopBtn = document.getElementById('stop-sync-job-btn');
+    const jobId = stopBtn?.dataset.jobId;
+    if (!jobId) return;
+
+    try {
+        stopBtn.disabled = true;
+        const response = await fetch(`${API_BASE}/data/sync_jobs/${jobId}/cancel`, { method: 'POST' });
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || '取消补数任务失败');
+        }
+        renderSyncJob(job);
+    } catch (error) {
+        console.error('取消补数任务失败:', error);
+    } finally {
+        stopBtn.disabled = false;
+    }
+}
+
+async function resumeWatchingSyncJob() {
+    const jobId = localStorage.getItem('offlineSyncJobId');
+    const btn = document.getElementById('confirm-sync-btn');
+    if (!jobId) return;
+
+    if (btn) btn.disabled = true;
+    try {
+        await watchSyncJob(jobId);
+    } catch (error) {
+        console.error('获取补数任务进度失败:', error);
+    } finally {
+        if (btn) btn.disabled = false;
+    }
+}
+
 async function syncOfflineData() {
     const scope = document.getElementById('sync-scope')?.value || 'single';
     const stockCode = document.getElementById('sync-stock-code')?.value.trim();
@@ -1325,46 +1453,9 @@ async function syncOfflineData() {
                 resultBox.textContent = `完成: ${result.message} 请求区间 ${describeSyncRange(startDate, endDate)}，本地范围 ${beforeRange} -> ${afterRange}，新增 ${result.added_rows || 0} 条，抓取 ${result.fetched_rows || 0} 条。${plannedRangeText}${fetchedRangeText}${missingRangeText}${fileStateText}`;
             }
         } else {
-            const universeResponse = await fetch(`${API_BASE}/data/stock_universe?market=${scope}`);
-            const universePayload = await universeResponse.json();
-            if (!universeResponse.ok) {
-                throw new Error(universePayload.error || '获取股票列表失败');
-            }
-
-            const stockCodes = universePayload.stock_codes || [];
-            if (stockCodes.length === 0) {
-                throw new Error('当前市场没有可补数的股票列表');
-            }
-
-            let successCount = 0;
-            let failureCount = 0;
-            let addedRows = 0;
-            let latestSuccessCode = '';
-            const throttleMs = getSyncThrottleMs(source);
-
-            for (let index = 0; index < stockCodes.length; index += 1) {
-                const code = stockCodes[index];
-                updateSyncProgress(index, stockCodes.length, `正在补数 ${index + 1}/${stockCodes.length}：${code}`);
-                try {
-                    const result = await syncSingleStock(code, source, startDate, endDate, forceFull);
-                    successCount += 1;
-                    addedRows += result.added_rows || 0;
-                    latestSuccessCode = code;
-                } catch (error) {
-                    failureCount += 1;
-                    console.error(`批量补数失败 ${code}:`, error);
-                }
-
-                if (index < stockCodes.length - 1) {
-                    await sleep(throttleMs);
-                }
-            }
-
-            updateSyncProgress(stockCodes.length, stockCodes.length, `批量补数完成 ${stockCodes.length}/${stockCodes.length}`);
-            if (resultBox) {
-                resultBox.classList.remove('hidden');
-                resultBox.textContent = `完成: ${getSyncScopeLabel(scope)}区间 ${describeSyncRange(startDate, endDate)}，共 ${stockCodes.length} 只，成功 ${successCount}，失败 ${failureCount}，累计新增 ${addedRows} 条。${latestSuccessCode ? ` 最近成功股票 ${latestSuccessCode}。` : ''}`;
-            }
+            const job = await createSyncJob(scope, source, startDate, endDate, forceFull);
+            localStorage.setItem('offlineSyncJobId', job.job_id);
+            await watchSyncJob(job.job_id);
         }
     } catch (error) {
         console.error('离线数据补充失败:', error);
@@ -1621,6 +1712,8 @@ function applyTrainingSnapshot(data, options = {}) {
     if (currentTraining) {
         currentTraining.latestProgress = data.progress || null;
         currentTraining.tradeMarkers = data.trade_markers || [];
+        currentTraining.dataVersion = data.version ?? null;
+        currentTraining.adjustFactor = data.factor ?? null;
     }
 
     candlestickSeries.setData(data.kline_data);
@@ -1644,6 +1737,122 @@ function applyTrainingSnapshot(data, options = {}) {
     }
 }
 
+// 合并K线、成交量、均线的尾部增量，返回新增的K线根数
+function applySeriesTail(data) {
+    const lastRenderedBar = latestRenderedKlineData[latestRenderedKlineData.length - 1];
+    const klineTail = data.kline_data || [];
+    const appendedBars = klineTail.filter(bar => !lastRenderedBar || bar.time > lastRenderedBar.time).length;
+
+    klineTail.forEach(bar => {
+        candlestickSeries.update(bar);
+        upsertRenderedBar(bar);
+    });
+    (data.volume_data || []).forEach(bar => volumeSeries.update(bar));
+
+    if (data.ma_data) {
+        maPeriods.forEach(p => {
+            const mData = data.ma_data[p];
+            if (maSeries[p] && mData) {
+                mData.forEach(point => maSeries[p].update(point));
+            }
+        });
+    }
+    return appendedBars;
+}
+
+// 动态前复权因子变化时，按比例缩放已绘制的价格类序列，再合并尾部增量
+function applyRescalePatch(data) {
+    const ratio = data.ratio;
+    const scalePrice = value => Math.round(value * ratio * 100) / 100;
+    const scaleSeries = series => {
+        if (!series) return;
+        series.setData(series.data().map(point => (
+            point.value === undefined ? point : { ...point, value: point.value * ratio }
+        )));
+    };
+
+    replaceRenderedKlineData(latestRenderedKlineData.map(bar => ({
+        ...bar,
+        open: scalePrice(bar.open),
+        high: scalePrice(bar.high),
+        low: scalePrice(bar.low),
+        close: scalePrice(bar.close)
+    })));
+    candlestickSeries.setData(latestRenderedKlineData);
+    maPeriods.forEach(p => scaleSeries(maSeries[p]));
+
+    // MACD 与 BOLL 随价格线性缩放，KDJ、RSI 与价格尺度无关
+    if (currentIndicatorType === 'MACD') {
+        currentIndicatorSeries.forEach(scaleSeries);
+    } else if (currentIndicatorType === 'BOLL') {
+        [bollSeries.upper, bollSeries.middle, bollSeries.lower].forEach(scaleSeries);
+    }
+
+    applySeriesTail(data);
+    applyIndicatorTail(data.indicator);
+
+    if (currentTraining) {
+        currentTraining.adjustFactor = data.factor ?? null;
+        currentTraining.dataVersion = data.version ?? null;
+    }
+    updateCurrentInfo(latestRenderedKlineData[latestRenderedKlineData.length - 1], currentTraining?.latestProgress || null);
+}
+
+// 将 /data 返回的增量合并到当前图表，返回新增的K线根数
+function applyTrainingDelta(data) {
+    const appendedBars = applySeriesTail(data);
+
+    if (currentTraining) {
+        currentTraining.latestProgress = data.progress || null;
+        currentTraining.tradeMarkers = data.trade_markers || [];
+        currentTraining.dataVersion = data.version ?? null;
+        currentTraining.adjustFactor = data.factor ?? null;
+    }
+
+    const currentBar = latestRenderedKlineData[latestRenderedKlineData.length - 1];
+    updateCurrentInfo(currentBar, data.progress);
+    updateTradeMarkers(data.trade_markers || []);
+    return appendedBars;
+}
+
+// 按版本号增量同步训练数据，版本未变化时服务端返回 304
+async function syncTrainingData() {
+    if (!currentTraining || !currentTraining.id) return;
+    const lastBar = latestRenderedKlineData[latestRenderedKlineData.length - 1];
+    const version = currentTraining.dataVersion;
+    if (isViewOnlyMode || !lastBar || version === null || version === undefined) {
+        await loadInitialData();
+        return;
+    }
+
+    const maQuery = maPeriods.join(',');
+    const response = await fetch(`${API_BASE}/training/${currentTraining.id}/data?ma_periods=${maQuery}&${getViewPeriodQuery()}&since_bar_id=${lastBar.bar_id}&version=${encodeURIComponent(version)}`);
+    if (response.status === 304) return;
+    if (!response.ok) {
+        throw new Error(`同步训练数据失败: ${response.status}`);
+    }
+
+    const data = await response.json();
+    if (!data.delta) {
+        applyTrainingSnapshot(data);
+        await loadTechnicalIndicator(currentIndicatorType);
+    } else {
+        const previousLogicalRange = chart?.timeScale().getVisibleLogicalRange();
+        const appendedBars = applyTrainingDelta(data);
+
+        const indicatorResponse = await fetch(`${API_BASE}/training/${currentTraining.id}/indicators/${currentIndicatorType}?${getViewPeriodQuery()}&since_bar_id=${data.since_bar_id}`);
+        if (indicatorResponse.ok) {
+            applyIndicatorTail(await indicatorResponse.json());
+        }
+        if (appendedBars > 0) {
+            setVisibleRangeAll(shiftLogicalRange(previousLogicalRange, appendedBars));
+        }
+    }
+
+    await updateChipDistribution();
+    updateAccountInfo();
+}
+
 async function refreshTrainingView(options = {}) {
     if (!currentTraining || !currentTraining.id) return;
     const { preserveRange = true, fitContent = false } = options;
@@ -1668,7 +1877,7 @@ async function refreshTrainingView(options = {}) {
 }
 
 async function switchViewPeriod(period) {
-    const nextPeriod = period === 'weekly' ? 'weekly' : 'daily';
+    const nextPeriod = VIEW_PERIOD_LABELS[period] ? period : 'daily';
     if (currentPeriod === nextPeriod) {
         updatePeriodBadge(nextPeriod);
         return;
@@ -1679,7 +1888,7 @@ async function switchViewPeriod(period) {
         return;
     }
 
-    showLoading(nextPeriod === 'weekly' ? '正在切换周K视图' : '正在切换日K视图');
+    showLoading(`正在切换${VIEW_PERIOD_LABELS[nextPeriod]}视图`);
     try {
         await refreshTrainingView({ preserveRange: false, fitContent: true });
     } catch (error) {
@@ -2014,6 +2223,7 @@ function initializeChart() {
         const infoEl = document.getElementById('chart-info-display');
         if (!param.time || param.point.x < 0 || param.point.y < 0) {
             infoEl.style.display = 'none';
+            scheduleChipHover(null);
             // 同步其他图表的十字准星
             syncCrosshair(volumeChart, volumeSeries, null);
             if (currentIndicatorSeries.length > 0) {
@@ -2040,6 +2250,7 @@ function initializeChart() {
         if (!currentDataPoint) {
             return;
         }
+        scheduleChipHover(currentDataPoint.bar_id === lastKnownBarId ? null : currentDataPoint.bar_id);
 
         let previousDataPoint = null;
         // 检查是否存在前一个数据点
@@ -2453,8 +2664,17 @@ function updatePlaybackSpeed() {
 async function nextBar() {
     try {
         const previousLogicalRange = chart?.timeScale().getVisibleLogicalRange();
-        const response = await fetch(`${API_BASE}/training/${currentTraining.id}/next`, {
-            method: 'POST'
+        const chipToggle = document.getElementById('toggle-chip-distribution');
+        const response = await fetch(`${API_BASE}/training/${currentTraining.id}/tick`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                steps: 1,
+                view_period: currentPeriod,
+                ma_periods: maPeriods.join(','),
+                indicator: currentIndicatorType,
+                include_chip: Boolean(chipToggle && chipToggle.checked)
+            })
         });
 
         if (response.ok) {
@@ -2468,31 +2688,30 @@ async function nextBar() {
             } else {
                 // 更新图表数据
                 if (data.new_bar) {
-                    if (currentPeriod === 'weekly') {
-                        await refreshTrainingView({ preserveRange: true });
+                    if (data.requires_full_refresh) {
+                        if (currentTraining) {
+                            currentTraining.latestProgress = data.progress || null;
+                        }
+                        await updateAdjustment(shiftLogicalRange(previousLogicalRange, data.steps || 1), { rescale: true });
                     } else {
-                        candlestickSeries.update(data.new_bar);
-                        upsertRenderedBar(data.new_bar);
+                        const klineTail = data.kline_data || [];
+                        const appendedBars = applySeriesTail(data);
+                        applyIndicatorTail(data.indicator);
+
+                        updateCurrentInfo(currentPeriod !== 'daily' && klineTail.length > 0 ? klineTail[klineTail.length - 1] : data.new_bar, data.progress);
+                        if (currentTraining) {
+                            currentTraining.latestProgress = data.progress || null;
+                            currentTraining.dataVersion = data.version ?? currentTraining.dataVersion;
+                        }
+
+                        if (appendedBars > 0) {
+                            setVisibleRangeAll(shiftLogicalRange(previousLogicalRange, appendedBars));
+                        }
 
-                        if (data.requires_full_refresh) {
-                            await updateAdjustment(shiftLogicalRange(previousLogicalRange, 1));
+                        if (data.chip_distribution) {
+                            chipDistributionData = data.chip_distribution;
+                            scheduleChipDistributionRender();
                         } else {
-                            if (data.new_volume) {
-                                volumeSeries.update(data.new_volume);
-                            }
-
-                            updateCurrentInfo(data.new_bar, data.progress);
-                            if (currentTraining) {
-                                currentTraining.latestProgress = data.progress || null;
-                            }
-
-                            if (data.progress && data.progress.current_bar_id !== undefined) {
-                                lastKnownBarId = data.progress.current_bar_id;
-                            }
-
-                            await updateMovingAverages();
-                            await loadTechnicalIndicator(currentIndicatorType);
-                            setVisibleRangeAll(shiftLogicalRange(previousLogicalRange, 1));
                             await updateChipDistribution();
                         }
                     }
@@ -2502,7 +2721,15 @@ async function nextBar() {
                     }
                 }
 
-                updateAccountInfo();
+                if (data.account) {
+                    renderAccountInfo(data.account);
+                    if (data.trade_count !== lastTickTradeCount) {
+                        lastTickTradeCount = data.trade_count;
+                        await updateTradeHistory();
+                    }
+                } else {
+                    updateAccountInfo();
+                }
                 return true;
             }
         } else {
@@ -2516,23 +2743,32 @@ async function nextBar() {
     }
 }
 
-async function updateMovingAverages() {
-    try {
-        const response = await fetch(`${API_BASE}/training/${currentTraining.id}/data?${getViewPeriodQuery()}`);
-        const data = await response.json();
+// 将 tick 返回的指标尾部数据合并到当前指标系列
+function applyIndicatorTail(indicator) {
+    if (!indicator || !Array.isArray(indicator.data) || indicator.type !== currentIndicatorType) return;
 
-        if (data.ma_data) {
-            // 只更新最新的数据点
-            maPeriods.forEach(p => {
-                const mData = data.ma_data[p];
-                if (maSeries[p] && mData && mData.length > 0) {
-                    maSeries[p].update(mData[mData.length - 1]);
-                }
-            });
-        }
-    } catch (error) {
-        console.error('更新移动平均线失败:', error);
+    let targets = [];
+    if (indicator.type === 'BOLL') {
+        if (!bollSeries.upper) return;
+        targets = [[bollSeries.upper, 'upper'], [bollSeries.middle, 'middle'], [bollSeries.lower, 'lower']];
+    } else if (indicator.type === 'MACD') {
+        targets = [[currentIndicatorSeries[0], 'dif'], [currentIndicatorSeries[1], 'dea'], [currentIndicatorSeries[2], 'histogram']];
+    } else if (indicator.type === 'KDJ') {
+        targets = [[currentIndicatorSeries[0], 'k'], [currentIndicatorSeries[1], 'd'], [currentIndicatorSeries[2], 'j']];
+    } else if (indicator.type === 'RSI' && indicator.periods) {
+        targets = indicator.periods.map((period, index) => [currentIndicatorSeries[index], `rsi${period}`]);
     }
+
+    indicator.data.forEach(item => {
+        targets.forEach(([series, key]) => {
+            if (!series || item[key] === undefined || item[key] === null) return;
+            if (key === 'histogram') {
+                series.update({ time: item.time, value: item[key], color: item[key] >= 0 ? '#ff4d4f' : '#008000' });
+            } else {
+                series.update({ time: item.time, value: item[key] });
+            }
+        });
+    });
 }
 
 async function loadTechnicalIndicator(indicatorType) {
@@ -2725,24 +2961,41 @@ function changeIndicator() {
 }
 
 // 复权设置
-async function updateAdjustment(targetRange = null) {
+async function updateAdjustment(targetRange = null, options = {}) {
+    const { rescale = false } = options;
     const checkedAdjustment = document.querySelector('input[name="adjustment"]:checked');
     const adjustment = checkedAdjustment ? checkedAdjustment.value : 'forward';
 
     const maQuery = maPeriods.join(',');
     try {
         const visibleRange = targetRange || chart.timeScale().getVisibleLogicalRange();
+        const payload = { adjustment };
+        const lastBar = latestRenderedKlineData[latestRenderedKlineData.length - 1];
+        // 复权因子变化时只请求缩放比例与尾部增量
+        if (rescale && adjustment === 'dynamic_forward' && currentTraining?.adjustFactor && lastBar) {
+            payload.rescale_from = currentTraining.adjustFactor;
+            payload.since_bar_id = lastBar.bar_id;
+            payload.indicator = currentIndicatorType;
+        }
         
         const response = await fetch(`${API_BASE}/training/${currentTraining.id}/adjustment?ma_periods=${maQuery}&${getViewPeriodQuery()}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ adjustment })
+            body: JSON.stringify(payload)
         });
 
         if (response.ok) {
             const data = await response.json();
+            if (data.rescale) {
+                applyRescalePatch(data);
+                if (visibleRange !== null) {
+                    setVisibleRangeAll(visibleRange);
+                }
+                await updateChipDistribution();
+                return;
+            }
             applyTrainingSnapshot({
                 ...data,
                 progress: currentTraining?.latestProgress || null,
@@ -2867,26 +3120,7 @@ async function updateAccountInfo() {
         const response = await fetch(`${API_BASE}/training/${currentTraining.id}/account`);
         const account = await response.json();
 
-        document.getElementById('total-assets').textContent = `¥${account.total_assets.toLocaleString()}`;
-        document.getElementById('available-cash').textContent = `¥${account.available_cash.toLocaleString()}`;
-        document.getElementById('position-value').textContent = `¥${account.position_value.toLocaleString()}`;
-        document.getElementById('floating-pnl').textContent = `¥${account.floating_pnl.toLocaleString()}`;
-        document.getElementById('floating-pnl').style.color = account.floating_pnl > 0 ? '#ff4d4f' : account.floating_pnl < 0 ? '#008000' : '#000000';
-
-        // 更新最大可交易数量
-        document.getElementById('max-buy-quantity').textContent = account.max_buyable_quantity;
-        if (account.position_summary) {
-            let max_sell_qty = account.position_summary.available_shares / 100
-            document.getElementById('max-sell-quantity').textContent = max_sell_qty;
-            document.getElementById('trade-quantity').max = Math.max(account.max_buyable_quantity, max_sell_qty);
-        }
-        else {
-            document.getElementById('max-sell-quantity').textContent = '0';
-            document.getElementById('trade-quantity').max = account.max_buyable_quantity;
-        }
-
-        // 更新持仓信息
-        updatePositionInfo(account.position_summary);
+        renderAccountInfo(account);
 
         // 同步拉取交易记录（解决 AI / 后台自动交易所缺失的面板历史记录）
         await updateTradeHistory();
@@ -2896,6 +3130,29 @@ async function updateAccountInfo() {
     }
 }
 
+function renderAccountInfo(account) {
+    document.getElementById('total-assets').textContent = `¥${account.total_assets.toLocaleString()}`;
+    document.getElementById('available-cash').textContent = `¥${account.available_cash.toLocaleString()}`;
+    document.getElementById('position-value').textContent = `¥${account.position_value.toLocaleString()}`;
+    document.getElementById('floating-pnl').textContent = `¥${account.floating_pnl.toLocaleString()}`;
+    document.getElementById('floating-pnl').style.color = account.floating_pnl > 0 ? '#ff4d4f' : account.floating_pnl < 0 ? '#008000' : '#000000';
+
+    // 更新最大可交易数量
+    document.getElementById('max-buy-quantity').textContent = account.max_buyable_quantity;
+    if (account.position_summary) {
+        let max_sell_qty = account.position_summary.available_shares / 100
+        document.getElementById('max-sell-quantity').textContent = max_sell_qty;
+        document.getElementById('trade-quantity').max = Math.max(account.max_buyable_quantity, max_sell_qty);
+    }
+    else {
+        document.getElementById('max-sell-quantity').textContent = '0';
+        document.getElementById('trade-quantity').max = account.max_buyable_quantity;
+    }
+
+    // 更新持仓信息
+    updatePositionInfo(account.position_summary);
+}
+
 // 获取并刷新整个交易历史列表
 async function updateTradeHistory() {
     try {
@@ -2965,7 +3222,7 @@ function startAutoSync() {
                 }
 
                 if (needsRefresh) {
-                    await loadInitialData();
+                    await syncTrainingData();
                 }
 
                 lastKnownBarId = data.current_bar_id;
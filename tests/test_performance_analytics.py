@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.equity_curve import EquityCurve
+from backend.performance_analytics import PerformanceAnalyzer
+
+
+class RoundTripWindowTest(unittest.TestCase):
+    """成交在收盘价：建仓K线的高低点不计入 MAE/MFE，清仓K线的高低点计入。"""
+
+    def _curve(self, bars, shares):
+        curve = EquityCurve()
+        cash = 100000.0
+        for bar_id, ((high, low, close), held) in enumerate(zip(bars, shares)):
+            position_value = held * close
+            curve.append(
+                bar_id=bar_id,
+                date=f"2024-01-{bar_id + 1:02d}",
+                bar={"open": close, "high": high, "low": low, "close": close, "volume": 1.0},
+                total_assets=cash + position_value,
+                available_cash=cash,
+                position_value=position_value,
+                floating_pnl=0.0,
+                total_shares=held,
+                average_cost=10.0 if held else 0.0,
+            )
+        return curve
+
+    def test_window_excludes_entry_bar_and_includes_exit_bar(self):
+        bars = [
+            (10.0, 10.0, 10.0),
+            (10.0, 10.0, 10.0),
+            (100.0, 1.0, 10.0),  # 建仓K线：收盘买入，之前的高低点不属于持仓
+            (11.0, 9.5, 10.5),
+            (12.0, 9.0, 11.0),
+            (10.5, 8.0, 10.0),  # 清仓K线：收盘卖出，盘中仍持有
+            (50.0, 2.0, 10.0),
+        ]
+        shares = [0, 0, 100, 100, 100, 0, 0]
+        rows = self._curve(bars, shares).rows
+        trip = PerformanceAnalyzer(rows, 100000.0).analyze()["round_trips"][0]
+
+        self.assertEqual((trip["start_bar_id"], trip["bars"]), (2, 3))
+        self.assertFalse(trip["open"])
+        self.assertAlmostEqual(trip["mfe"], 20.0)
+        self.assertAlmostEqual(trip["mae"], -20.0)
+
+    def test_position_opened_on_last_bar_has_empty_window(self):
+        bars = [(10.0, 10.0, 10.0), (20.0, 5.0, 10.0)]
+        rows = self._curve(bars, [0, 100]).rows
+        trip = PerformanceAnalyzer(rows, 100000.0).analyze()["round_trips"][0]
+
+        self.assertTrue(trip["open"])
+        self.assertEqual((trip["mae"], trip["mfe"]), (0.0, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()